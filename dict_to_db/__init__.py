@@ -1,4 +1,6 @@
 from dict_to_db._sqlite import DictToDb
+from dict_to_db._shard import ShardedDictToDb
+from dict_to_db._writer import QueuedWriter
 
 name = "dict_to_db"
-__all__ = ['DictToDb']
+__all__ = ['DictToDb', 'ShardedDictToDb', 'QueuedWriter']
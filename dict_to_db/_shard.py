@@ -0,0 +1,237 @@
+import zlib
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union, Iterable, Callable, Generator, Tuple, Dict
+
+from dict_to_db._sqlite import DictToDb, get_column_name_by_key, get_filter_item
+
+
+class ShardedDictToDb(object):
+    def __init__(self, databases: List[str], shard_key: Union[str, Dict[str, str]], max_workers: int = None,
+                 chunk_size: int = 10000, **kwargs):
+        """
+        将表按分片字段的hash值分散存储到多个SQLite数据库文件中，每个数据库文件对应一个DictToDb实例，
+        写入按分片字段路由到对应的数据库，查询在线程池中并发查询所有数据库后合并结果
+        :param databases: 数据库路径的list，每个数据库为一个分片，分片数量确定后不能再改变
+        :param shard_key: 分片字段名，所有表使用相同的分片字段；也可以是dict，为每个表指定分片字段，如 {'user':'user_id'}
+        :param max_workers: 并发查询和写入的线程数，默认为分片数量
+        :param chunk_size: 插入可迭代对象或生成器时，每次分发到各个分片的数据条数
+        :param kwargs: 创建每个分片DictToDb实例的其他参数，check_same_thread 固定为False
+        """
+        kwargs['check_same_thread'] = False
+        self.shards = [DictToDb(database, **kwargs) for database in databases]
+        self._shard_key = shard_key
+        self._chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards))
+
+    def insert(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str,
+               commit: bool = None, insert_time: bool = None, update_time: bool = None, export: bool = None,
+               auto_alter: bool = None):
+        """
+        按分片字段将数据插入到对应分片，参数同 DictToDb.insert，表名必须指定，建表和alter表结构在所有分片上执行
+        """
+        self._write("insert", data, table_name, commit=commit, insert_time=insert_time, update_time=update_time,
+                    export=export, auto_alter=auto_alter)
+
+    def insert_or_update(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str,
+                         commit: bool = None, insert_time: bool = None, update_time: bool = None,
+                         export: bool = None, auto_alter: bool = None, ignore_error=None, skip_unchanged: bool = None):
+        """
+        按分片字段将数据插入或更新到对应分片，参数同 DictToDb.insert_or_update
+        """
+        self._write("insert_or_update", data, table_name, commit=commit, insert_time=insert_time,
+                    update_time=update_time, export=export, auto_alter=auto_alter, ignore_error=ignore_error,
+                    skip_unchanged=skip_unchanged)
+
+    def insert_or_replace(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str,
+                          commit: bool = None, insert_time: bool = None, update_time: bool = None,
+                          export: bool = None, auto_alter: bool = True):
+        """
+        按分片字段将数据插入或替换到对应分片，参数同 DictToDb.insert_or_replace
+        """
+        self._write("insert_or_replace", data, table_name, commit=commit, insert_time=insert_time,
+                    update_time=update_time, export=export, auto_alter=auto_alter)
+
+    def update(self, update: Union[dict, List[dict], Tuple[dict]], where: Union[dict, List[dict], Tuple[dict]],
+               table_name: str, commit: bool = None, update_time: bool = None, auto_alter: bool = True,
+               skip_unchanged: bool = None) -> int:
+        """
+        更新数据，where 条件包含分片字段时只更新对应分片，否则在所有分片上执行，参数同 DictToDb.update
+        :return: 所有分片实际更新的数据条数之和
+        """
+        if isinstance(update, dict):
+            update, where = [update], [where]
+        if len(update) != len(where):
+            raise Exception(f"update 和 where参数值不匹配")
+        shard_key = self._get_shard_key(table_name)
+        for _update, _where in zip(update, where):
+            # 修改分片字段会使数据不在新值对应的分片上，之后按分片字段查询不到，只允许修改后仍在原分片的值
+            if any(get_column_name_by_key(key) == shard_key for key in _update):
+                new_index = self._get_shard_index(_update, table_name)
+                if list(self._get_shard_indexes(_where, table_name)) != [new_index]:
+                    raise Exception(f"不支持修改分片字段{shard_key}的值，请删除后重新插入数据")
+        if auto_alter:
+            for data in {tuple(u): u for u in update}.values():
+                self._ensure_columns(data, table_name)
+        shard_pairs = {}
+        for _update, _where in zip(update, where):
+            for index in self._get_shard_indexes(_where, table_name):
+                shard_pairs.setdefault(index, ([], []))
+                shard_pairs[index][0].append(_update)
+                shard_pairs[index][1].append(_where)
+        return sum(self._map(lambda index, pairs: self.shards[index].update(
+            pairs[0], pairs[1], table_name=table_name, commit=commit, update_time=update_time, auto_alter=auto_alter,
+            skip_unchanged=skip_unchanged), shard_pairs.items()))
+
+    def delete(self, where: Union[dict, List[dict], Tuple[dict]], table_name: str, commit: bool = None):
+        """
+        删除数据，where 条件包含分片字段时只删除对应分片的数据，否则在所有分片上执行，参数同 DictToDb.delete
+        """
+        if isinstance(where, dict):
+            where = [where]
+        shard_wheres = {}
+        for _where in where:
+            for index in self._get_shard_indexes(_where, table_name):
+                shard_wheres.setdefault(index, []).append(_where)
+        self._map(lambda index, wheres: self.shards[index].delete(wheres, table_name=table_name, commit=commit),
+                  shard_wheres.items())
+
+    def select(self, table_name: str, select: List[str] = None, where: dict = None, select_all: bool = True):
+        """
+        查询数据，where 条件包含分片字段时只查询对应分片，否则并发查询所有分片并合并结果，参数同 DictToDb.select
+        """
+        indexes = self._get_shard_indexes(where, table_name) if where else range(len(self.shards))
+        results = self._map(lambda index, _: self.shards[index].select(table_name, select=select, where=where,
+                                                                       select_all=select_all),
+                            [(index, None) for index in indexes])
+        if select_all:
+            return [row for rows in results for row in rows]
+        return next((row for row in results if row is not None), None)
+
+    def execute(self, sql: str, *args, **kwargs) -> list:
+        """
+        在所有分片上并发执行SQL语句，并返回合并后的查询结果list，注：排序，聚合，limit 等只在每个分片内部生效
+        :param sql:sql
+        """
+        return [row for rows in self._map(
+            lambda index, _: self.shards[index].execute(sql, *args, **kwargs).fetchall(),
+            [(index, None) for index in range(len(self.shards))]) for row in rows]
+
+    def executescript(self, sql: str):
+        """
+        在所有分片上执行SQL脚本，可用于在所有分片上创建索引等
+        """
+        self._map(lambda index, _: self.shards[index].executescript(sql),
+                  [(index, None) for index in range(len(self.shards))])
+
+    def create_function(self, name: str, num_params: int, func: Callable, deterministic: bool = False,
+                        memoize: int = 0):
+        """
+        在所有分片上注册用户自定义函数，参数同 DictToDb.create_function，每个分片单独缓存调用结果
+        """
+        for shard in self.shards:
+            shard.create_function(name, num_params, func, deterministic=deterministic, memoize=memoize)
+
+    def create_aggregate(self, name: str, num_params: int, aggregate_class):
+        """
+        在所有分片上注册用户自定义聚合函数，注：聚合只在每个分片内部进行
+        """
+        for shard in self.shards:
+            shard.create_aggregate(name, num_params, aggregate_class)
+
+    def commit(self):
+        for shard in self.shards:
+            shard.commit()
+
+    def close(self):
+        """
+        关闭所有分片的数据库连接及线程池
+        """
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown()
+
+    def _write(self, execute_func: str, data: Union[dict, Iterable[dict], Generator[dict, None, None]],
+               table_name: str, insert_time: bool = None, update_time: bool = None, export: bool = None,
+               auto_alter: bool = None, **kwargs):
+        """insert，insert_or_update，insert_or_replace 的执行逻辑，分批将数据按分片分组后并发写入"""
+        if table_name is None:
+            raise Exception("分片存储必须指定表名")
+        shard = self.shards[0]
+        insert_time = shard._insert_time if insert_time is None else insert_time
+        update_time = shard._update_time if update_time is None else update_time
+        export = shard._export if export is None else export
+        auto_alter = shard._auto_alter if auto_alter is None else auto_alter
+        if isinstance(data, dict):
+            data = [data]
+        data = iter(data)
+        while True:
+            chunk = list(islice(data, self._chunk_size))
+            if not chunk:
+                break
+            for sample in {tuple(d): d for d in chunk}.values():
+                self._ensure_table(sample, table_name, insert_time, update_time, export, auto_alter)
+            shard_data = {}
+            for d in chunk:
+                shard_data.setdefault(self._get_shard_index(d, table_name), []).append(d)
+            self._map(lambda index, rows: getattr(self.shards[index], execute_func)(
+                rows, table_name=table_name, insert_time=insert_time, update_time=update_time, export=export,
+                auto_alter=False, **kwargs), shard_data.items())
+
+    def _ensure_table(self, data: dict, table_name: str, insert_time: bool, update_time: bool, export: bool,
+                      auto_alter: bool):
+        """保证所有分片上都存在该表，且包含data中的所有字段"""
+        for shard in self.shards:
+            if table_name not in shard._tables:
+                shard._create_table_by_dict(data, table_name, insert_time, update_time, export)
+        if auto_alter:
+            self._ensure_columns(data, table_name)
+
+    def _ensure_columns(self, data: dict, table_name: str):
+        """在所有缺少data中字段的分片上执行alter表结构"""
+        for shard in self.shards:
+            if table_name in shard._tables and any(
+                    get_column_name_by_key(key) not in shard._tables[table_name] for key in data):
+                shard._alter_table_add_column_by_dict(data, table_name=table_name)
+
+    def _get_shard_key(self, table_name: str) -> str:
+        if isinstance(self._shard_key, dict):
+            try:
+                return self._shard_key[table_name]
+            except KeyError:
+                raise Exception(f"没有指定表{table_name}的分片字段")
+        return self._shard_key
+
+    def _get_shard_index(self, data: dict, table_name: str) -> int:
+        """根据数据中分片字段的值计算数据所在的分片"""
+        shard_key = self._get_shard_key(table_name)
+        for key, value in data.items():
+            if get_column_name_by_key(key) == shard_key:
+                return self._hash_shard_value(value)
+        raise Exception(f"数据中缺少分片字段：{shard_key}")
+
+    def _get_shard_indexes(self, where: dict, table_name: str) -> Iterable[int]:
+        """where 条件包含分片字段的等于条件时返回对应的分片，否则返回所有分片"""
+        shard_key = self._get_shard_key(table_name)
+        for key, value in where.items():
+            column, operator, operands = get_filter_item(key, value)
+            if get_column_name_by_key(column) == shard_key and operator == '=':
+                return [self._hash_shard_value(operands[0])]
+        return range(len(self.shards))
+
+    def _hash_shard_value(self, value) -> int:
+        """
+        计算分片字段值所在的分片，使用crc32保证不同进程中计算结果一致，
+        SQLite中相等的值(如 1，1.0，True)先统一为int，保证路由到同一个分片
+        """
+        if isinstance(value, bool) or (isinstance(value, float) and value.is_integer()):
+            value = int(value)
+        return zlib.crc32(str(value).encode('utf8')) % len(self.shards)
+
+    def _map(self, func: Callable, items: Iterable[tuple]) -> list:
+        """在线程池中并发执行func(分片index, 参数)，并按顺序返回结果"""
+        futures = [self._executor.submit(func, index, args) for index, args in items]
+        return [future.result() for future in futures]
+
+
+__all__ = ['ShardedDictToDb']
@@ -1,32 +1,182 @@
+import os
 import re
 import sys
 import time
+import random
+import csv
+import gzip
 import json
+import base64
 import copy
+import hashlib
 import pickle
+import array
+import struct
 import logging
 import sqlite3
+import threading
 import datetime
+import operator
+import dataclasses
 from pathlib import Path
-from threading import Lock
-from typing import List, Union, Iterable, Callable, Generator, Tuple, Dict
-
-from openpyxl import load_workbook, Workbook
+from functools import partial, lru_cache
+from itertools import groupby, count, islice, chain
+from collections import deque, OrderedDict
+from typing import List, Union, Iterable, Callable, Generator, Tuple, Dict, get_type_hints
 
 CREATE_TABLE_SQL_TEMPLATE = f"create table{' '}[{{table_name}}] ({{column_info}});"
 INSERT_SQL_TEMPLATE = f"insert into{' '}[{{table_name}}]({{columns}}) values({{values}});"
 UPDATE_SQL_TEMPLATE = f"update{' '}[{{table_name}}] set {{update_column}} where {{where}};"
 DELETE_SQL_TEMPLATE = f"delete from{' '}[{{table_name}}] where {{where}};"
 SELECT_SQL_TEMPLATE = f"select {{select_column}} from{' '}[{{table_name}}] where {{where}};"
+INSERT_OR_IGNORE_SQL_TEMPLATE = f"insert or ignore into{' '}[{{table_name}}]({{columns}}) values({{values}});"
 REPLACE_SQL_TEMPLATE = f"replace into{' '}[{{table_name}}]({{columns}}) values({{values}});"
 INSERT_OR_UPDATE_SQL_TEMPLATE = f"replace into{' '}[{{table_name}}]({{columns}}) values({{values}});"
 ADD_COLUMN_SQL_TEMPLATE = f"alter table{' '}[{{table_name}}] add {{column_info}};"
+CREATE_TEMP_KEY_TABLE_SQL_TEMPLATE = f"create temp table{' '}[{{table_name}}] ({{column_info}});"
+DROP_TEMP_TABLE_SQL_TEMPLATE = f"drop table if exists temp.[{{table_name}}];"
+SELECT_JOIN_KEY_TABLE_SQL_TEMPLATE = f"select {{select_column}} from{' '}[{{table_name}}] as t " \
+                                     f"join temp.[{{key_table_name}}] as k on {{on}};"
+EXPLAIN_SQL_TEMPLATE = "/* dict_to_db {count} */ explain {sql}"
+READ_ONLY_SQL_PATTERN = re.compile(r"^\s*select\b", re.IGNORECASE)
+WRITE_TABLE_SQL_PATTERN = re.compile(
+    r"^\s*(?:insert(?:\s+or\s+\w+)?\s+into|replace\s+into|update(?:\s+or\s+\w+)?|delete\s+from)\s+"
+    r"(?:\w+\.)?(?:\[([^\]]+)]|\"([^\"]+)\"|`([^`]+)`|(\w+))", re.IGNORECASE)
+SCHEMA_CHANGE_SQL_PATTERN = re.compile(r"^\s*(?:create|alter|drop|attach|detach|vacuum)\b", re.IGNORECASE)
+# 创建/删除临时表只影响该临时表，不作为表结构变动使所有查询结果缓存失效
+TEMP_TABLE_DDL_SQL_PATTERN = re.compile(
+    r"^\s*(?:create\s+temp(?:orary)?\s+table|drop\s+table(?:\s+if\s+exists)?\s+temp\.)\s*"
+    r"(?:\[([^\]]+)]|\"([^\"]+)\"|`([^`]+)`|(\w+))", re.IGNORECASE)
+DATA_VERSION_SQL = "PRAGMA data_version;"
+# 查询结果缓存命中时，不是这些不可变类型的字段值(list，dict，obj等)需要深拷贝，避免调用方修改影响缓存
+IMMUTABLE_VALUE_TYPES = (str, int, float, bool, bytes, type(None), datetime.date, datetime.datetime)
+# 不会修改表数据的语句，不需要使查询结果缓存失效(rollback会撤销写入，不在其中)
+NO_DATA_CHANGE_SQL_PATTERN = re.compile(r"^\s*(?:begin|commit|end|savepoint|release|explain|analyze)\b",
+                                        re.IGNORECASE)
+SELECT_TRIGGER_TABLE_NAMES_SQL = "select lower(tbl_name) from sqlite_master where type='trigger' union " \
+                                 "select lower(tbl_name) from sqlite_temp_master where type='trigger';"
+CHECKPOINT_TABLE_NAME = "dict_to_db_checkpoint"
+CREATE_CHECKPOINT_TABLE_SQL = f"create table if not exists [{CHECKPOINT_TABLE_NAME}] (job_name text primary key, " \
+                              f"table_name text, row_count integer, cursor_token text, finished boolean default false, " \
+                              f"update_time timestamp);"
+SELECT_CHECKPOINT_SQL = f"select job_name, table_name, row_count, cursor_token, finished, update_time " \
+                        f"from [{CHECKPOINT_TABLE_NAME}] where job_name=?;"
+WATERMARK_TABLE_NAME = "dict_to_db_watermark"
+CREATE_WATERMARK_TABLE_SQL = f"create table if not exists [{WATERMARK_TABLE_NAME}] (table_name text, consumer text, " \
+                             f"watermark_column text, watermark, watermark_rowid integer, update_time timestamp, " \
+                             f"primary key (table_name, consumer));"
+SELECT_WATERMARK_SQL = f"select table_name, consumer, watermark_column, watermark, watermark_rowid, update_time " \
+                       f"from [{WATERMARK_TABLE_NAME}] where table_name=? and consumer=?;"
+CREATE_WATERMARK_INDEX_SQL_TEMPLATE = f"create index if not exists [{{table_name}}_{{column}}_watermark] " \
+                                      f"on [{{table_name}}]({{expression}});"
+# select_incremental 按 insert_time/update_time 查询时，使用 enable_incremental 安装的触发器维护的严格递增变更序号
+# 作为水位，序号保存在以(表名, rowid)为主键的变更记录表中，不修改源数据表的字段和数据，
+# 避免 insert_time(秒级) 和 update_time(微秒级) 精度不同，以及同一时间内写入多条数据导致漏查
+SEQUENCE_TABLE_NAME = "dict_to_db_sequence"
+CREATE_SEQUENCE_TABLE_SQL = f"create table if not exists [{SEQUENCE_TABLE_NAME}] (table_name text primary key, " \
+                            f"seq integer not null default 0);"
+INSERT_SEQUENCE_SQL = f"insert or ignore into [{SEQUENCE_TABLE_NAME}](table_name, seq) values(?, 0);"
+CHANGE_LOG_TABLE_NAME = "dict_to_db_change_log"
+CREATE_CHANGE_LOG_TABLE_SQL = f"create table if not exists [{CHANGE_LOG_TABLE_NAME}] (table_name text, " \
+                              f"row_id integer, insert_seq integer, change_seq integer, " \
+                              f"primary key (table_name, row_id)) without rowid;"
+CREATE_CHANGE_LOG_INDEX_SQLS = tuple(
+    f"create index if not exists [{CHANGE_LOG_TABLE_NAME}_{column}] on [{CHANGE_LOG_TABLE_NAME}](table_name, {column});"
+    for column in ("insert_seq", "change_seq"))
+CHANGE_LOG_SEQ_COLUMNS = {"insert_time": "insert_seq", "update_time": "change_seq"}
+# 已有数据按rowid顺序回填变更序号，序号从计数器当前值之后开始
+BACKFILL_CHANGE_LOG_SQL_TEMPLATE = f"insert or ignore into [{CHANGE_LOG_TABLE_NAME}]" \
+                                   f"(table_name, row_id, insert_seq, change_seq) " \
+                                   f"select ?, rowid, ? + rowid - ?, ? + rowid - ? from [{{table_name}}];"
+CHANGE_LOG_BUMP_SQL = f"update [{SEQUENCE_TABLE_NAME}] set seq=seq+1 where table_name='{{name}}';"
+CHANGE_LOG_SEQ_SQL = f"(select seq from [{SEQUENCE_TABLE_NAME}] where table_name='{{name}}')"
+CHANGE_LOG_TRIGGER_NAME_TEMPLATE = "{table_name}_change_log_ai"
+CREATE_CHANGE_LOG_TRIGGER_SQL_TEMPLATES = (
+    f"create trigger if not exists [{{table_name}}_change_log_ai] after insert on [{{table_name}}] begin "
+    f"{CHANGE_LOG_BUMP_SQL} delete from [{CHANGE_LOG_TABLE_NAME}] where table_name='{{name}}' and row_id=new.rowid; "
+    f"insert into [{CHANGE_LOG_TABLE_NAME}](table_name, row_id, insert_seq, change_seq) "
+    f"values('{{name}}', new.rowid, {CHANGE_LOG_SEQ_SQL}, {CHANGE_LOG_SEQ_SQL}); end;",
+    f"create trigger if not exists [{{table_name}}_change_log_au] after update on [{{table_name}}] begin "
+    f"{CHANGE_LOG_BUMP_SQL} update [{CHANGE_LOG_TABLE_NAME}] set row_id=new.rowid, change_seq={CHANGE_LOG_SEQ_SQL} "
+    f"where table_name='{{name}}' and row_id=old.rowid; end;",
+    f"create trigger if not exists [{{table_name}}_change_log_ad] after delete on [{{table_name}}] begin "
+    f"delete from [{CHANGE_LOG_TABLE_NAME}] where table_name='{{name}}' and row_id=old.rowid; end;")
+SELECT_TRIGGER_SQL = "select name from sqlite_master where type='trigger' and name=?;"
+CHANGE_LOG_UPPER_SQL_TEMPLATE = f"select {{seq_column}}, row_id from [{CHANGE_LOG_TABLE_NAME}] " \
+                                f"where table_name=? and {{seq_column}}>? order by {{seq_column}} {{order}} " \
+                                f"limit 1 offset {{offset}};"
+SELECT_BY_CHANGE_LOG_SQL_TEMPLATE = f"select {{select_column}} from [{CHANGE_LOG_TABLE_NAME}] as c " \
+                                    f"join [{{table_name}}] as t on t.rowid=c.row_id where c.table_name=? " \
+                                    f"and c.{{seq_column}}>? and c.{{seq_column}}<=? order by c.{{seq_column}};"
+PARTITION_PERIOD_FORMAT = {'day': '%Y%m%d', 'week': '%Gw%V', 'month': '%Y%m'}
+PARTITION_TABLE_NAME_TEMPLATE = "{table_name}_p{partition}"
+PARTITION_TABLE_NAME_PATTERN_TEMPLATE = r"^{table_name}_p(\d{{8}}|\d{{4}}w\d{{2}}|\d{{6}})$"
+CREATE_PARTITION_VIEW_SQL_TEMPLATE = f"drop view if exists [{{table_name}}];\n" \
+                                     f"create view [{{table_name}}] as {{select_sql}};"
+DROP_TABLE_SQL_TEMPLATE = f"drop table if exists [{{table_name}}];"
+FTS_TABLE_NAME_TEMPLATE = "{table_name}_fts"
+# FTS5 虚拟表在数据库中自动创建的影子表后缀，影子表和虚拟表不作为普通数据表处理
+FTS_SHADOW_TABLE_SUFFIXES = ("_data", "_idx", "_docsize", "_config", "_content")
+CREATE_FTS_TABLE_SQL_TEMPLATE = f"create virtual table{' '}[{{fts_table_name}}] using fts5({{columns}}, " \
+                                f"content='{{table_name}}', content_rowid='rowid');\n" \
+                                f"create trigger [{{fts_table_name}}_ai] after insert on [{{table_name}}] begin " \
+                                f"insert into [{{fts_table_name}}](rowid, {{columns}}) values (new.rowid, {{new_values}}); " \
+                                f"end;\n" \
+                                f"create trigger [{{fts_table_name}}_ad] after delete on [{{table_name}}] begin " \
+                                f"insert into [{{fts_table_name}}]([{{fts_table_name}}], rowid, {{columns}}) " \
+                                f"values ('delete', old.rowid, {{old_values}}); end;\n" \
+                                f"create trigger [{{fts_table_name}}_au] after update on [{{table_name}}] begin " \
+                                f"insert into [{{fts_table_name}}]([{{fts_table_name}}], rowid, {{columns}}) " \
+                                f"values ('delete', old.rowid, {{old_values}}); " \
+                                f"insert into [{{fts_table_name}}](rowid, {{columns}}) values (new.rowid, {{new_values}}); " \
+                                f"end;\n"
+SEARCH_SQL_TEMPLATE = f"select {{select_column}} from [{{fts_table_name}}] as f join{' '}[{{table_name}}] as t " \
+                      f"on t.rowid=f.rowid where [{{fts_table_name}}] match ? order by f.rank limit ?;"
+# insert_or_replace 替换数据时，需要开启递归触发器才会触发删除全文索引的触发器
+RECURSIVE_TRIGGERS_SQL = "PRAGMA recursive_triggers = ON;"
+EXCEL_TITLE_PATTERN = re.compile(r'^[a-zA-Z]+$')
+EXCEL_COLUMN_LETTER_PATTERN = re.compile(r'^[A-Z]{1,3}$')
+CONTENT_HASH_COLUMN = "_content_hash"
+SELECT_CONTENT_HASH_SQL_TEMPLATE = f"select [{CONTENT_HASH_COLUMN}] from [{{table_name}}] " \
+                                   f"where [{CONTENT_HASH_COLUMN}] in ({{values}});"
+CREATE_CONTENT_HASH_INDEX_SQL_TEMPLATE = f"create unique index if not exists [{{table_name}}{CONTENT_HASH_COLUMN}] " \
+                                         f"on [{{table_name}}]([{CONTENT_HASH_COLUMN}]);"
+# obj字段使用pickle protocol 5 带外缓冲区保存时的数据格式：
+# 标识(8字节) + pickle数据长度(8字节) + 缓冲区个数(4字节) + 每个缓冲区的长度(8字节) + pickle数据 + 缓冲区原始数据
+OBJ_OUT_OF_BAND_MAGIC = b"DTDBOOB5"
+OBJ_OUT_OF_BAND_HEADER = struct.Struct("<QI")
+OBJ_OUT_OF_BAND_BUFFER_LENGTH = struct.Struct("<Q")
+DEFAULT_BLOB_CHUNK_SIZE = 1024 * 1024
+BEGIN_SQL = "begin;"
+BEGIN_IMMEDIATE_SQL = "begin immediate;"
+BUSY_TIMEOUT_SQL = "PRAGMA busy_timeout;"
+SCHEMA_VERSION_SQL = "PRAGMA schema_version;"
+# 查询条件支持的运算符，可以写在key中如 {'age>':18}，或者写在value中如 {'age':('>', 18)}
+FILTER_OPERATORS = ('=', '!=', '<>', '>', '>=', '<', '<=', 'in', 'not in', 'like', 'not like', 'glob', 'between',
+                    'not between', 'is null', 'is not null', 'is', 'is not')
+FILTER_KEY_PATTERN = re.compile(r"^(.*?)\s*(>=|<=|!=|<>|=|>|<)$|^(.*?)\s+(not\s+in|in|not\s+like|like|glob|"
+                                r"not\s+between|between|is\s+not\s+null|is\s+null|is\s+not|is)$", re.IGNORECASE)
+SINGLE_EQUAL_FILTER_PATTERN = re.compile(r"^(\[[^\]]+])=\?$")
+SELECT_AGGREGATE_PATTERN = re.compile(r"^\s*(count|sum|total|avg|min|max|group_concat)\s*\(\s*(distinct\s+)?"
+                                      r"(\*|[^()]+?)\s*\)(?:\s+as\s+(.+?))?\s*$", re.IGNORECASE)
+DEFAULT_MAX_VARIABLE_NUMBER = 999  # 无法读取SQLite变量个数上限时(Python<3.11)使用的保守值
 SELECT_TABLE_INDEX_NAMES = f"{'select'} name from MAIN.[sqlite_master] where type='index' and tbl_name=:table_name;"
 PRAGMA_INDEX = "PRAGMA index_info({index_name});"
 TABLE_TYPE_INFO = {str: 'text', int: 'integer', float: 'double', bool: 'boolean', datetime.date: 'date',
                    datetime.datetime: "timestamp", list: 'json_text', dict: 'json_text', tuple: 'tuple_text',
                    set: 'set_text'}
 TABLE_COLUMN_SHORTHAND = {'pk': 'primary key', 'uq': 'unique'}
+# 数值类型字段按列读取时使用的array.array typecode，及对应的numpy dtype
+COLUMN_ARRAY_TYPECODE = {'integer': 'q', 'int': 'q', 'bigint': 'q', 'double': 'd', 'real': 'd', 'float': 'd',
+                         'boolean': 'b', 'bool': 'b'}
+ARRAY_TYPECODE_NUMPY_DTYPE = {'q': 'int64', 'd': 'float64', 'b': 'bool'}
+# 按列读取时空值在数组中的占位值，double字段为NaN，integer和boolean字段另外记录空值的位置
+ARRAY_TYPECODE_NULL_VALUE = {'q': 0, 'd': float('nan'), 'b': 0}
+EXPLAIN_QUERY_PLAN_SQL_TEMPLATE = "explain query plan {sql}"
+SQL_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER_LITERAL_PATTERN = re.compile(r"(?<![\w\]])-?\d+(?:\.\d+)?\b")
+SQL_PLACEHOLDER_PATTERN = re.compile(r"\?\d*|[:@$][a-zA-Z_]\w*")
+SQL_EXPLAIN_SUPPORT_PATTERN = re.compile(r"^\s*(select|insert|update|delete|replace|with)\b", re.IGNORECASE)
 
 
 def get_excel_title_by_index(index):
@@ -59,14 +209,286 @@ def dict_factory(cursor, row):
     return d
 
 
+def import_numpy():
+    """导入numpy，未安装numpy时返回None"""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def copy_cached_row(row):
+    """复制查询结果缓存中的一行数据，可变的字段值深拷贝，不可变的字段值直接引用"""
+    if isinstance(row, dict):
+        return {key: value if isinstance(value, IMMUTABLE_VALUE_TYPES) else copy.deepcopy(value)
+                for key, value in row.items()}
+    if isinstance(row, tuple) and not all(isinstance(value, IMMUTABLE_VALUE_TYPES) for value in row):
+        return tuple(value if isinstance(value, IMMUTABLE_VALUE_TYPES) else copy.deepcopy(value) for value in row)
+    return row
+
+
+def normalize_sql(sql: str) -> str:
+    """将SQL中的字符串和数字字面量替换为?，并合并多余的空白，便于慢SQL归类"""
+    sql = SQL_STRING_LITERAL_PATTERN.sub("?", sql)
+    sql = SQL_NUMBER_LITERAL_PATTERN.sub("?", sql)
+    return " ".join(sql.split())
+
+
+def get_sql_param_count(sql: str) -> int:
+    """统计SQL语句中占位符参数的个数"""
+    return len(SQL_PLACEHOLDER_PATTERN.findall(SQL_STRING_LITERAL_PATTERN.sub("", sql)))
+
+
+def get_column_name_by_key(key: str) -> str:
+    """根据 字段名@字段类型#字段描述信息 格式的key获取字段名"""
+    if '@' in key:
+        return key.split('@')[0]
+    elif '#' in key:
+        return key.split('#')[0]
+    return key
+
+
+@lru_cache(maxsize=1024)
+def parse_filter_key(key: str) -> Tuple[str, Union[str, None]]:
+    """解析查询条件的key，返回(字段key，key中的运算符)，如 'age>=' 返回 ('age', '>=')，没有运算符时运算符为None"""
+    match = FILTER_KEY_PATTERN.match(key)
+    if match is None:
+        return key, None
+    column, operator = (match.group(1), match.group(2)) if match.group(2) else (match.group(3), match.group(4))
+    return column, " ".join(operator.lower().split())
+
+
+def get_filter_item(key: str, value) -> Tuple[str, str, tuple]:
+    """
+    解析一个查询条件，返回(字段key，运算符，运算符的参数tuple)
+    运算符可以写在key中，如 {'age>':18, 'name like':'张%', 'id in':[1,2], 'age between':(18,30), 'phone is null':True}，
+    也可以写在值为tuple的value中，如 {'age':('>',18), 'age':('between',18,30)}；
+    没有运算符时按 = 处理，值为None时与SQL一致不匹配任何数据，查询空值需要明确写为 {'phone':('is', None)}，
+    {'phone is':None} 或 {'phone is null':True}
+    """
+    column, operator = parse_filter_key(key)
+    if operator is None and isinstance(value, tuple) and value and isinstance(value[0], str) and \
+            " ".join(value[0].lower().split()) in FILTER_OPERATORS:
+        operator = " ".join(value[0].lower().split())
+        value = value[1] if len(value) == 2 else value[1:]
+    if operator is None:
+        return column, '=', (value,)
+    if operator in ('is null', 'is not null'):
+        if value is False:  # {'phone is null': False} 等价于 is not null
+            operator = 'is not null' if operator == 'is null' else 'is null'
+        return column, operator, ()
+    if operator.endswith('in'):
+        return column, operator, tuple(value)
+    if operator.endswith('between'):
+        if len(value) != 2:
+            raise Exception(f"between 条件需要两个值：{key}")
+        return column, operator, tuple(value)
+    return column, operator, (value,)
+
+
+def get_select_column_sql(column: str) -> str:
+    """拼接查询的字段，count(*)，sum(字段) as 别名 等聚合函数按表达式查询，其他字段加上[]"""
+    match = SELECT_AGGREGATE_PATTERN.match(column)
+    if match is None:
+        return f"[{column}]"
+    function, distinct, argument, alias = match.groups()
+    argument = argument if argument == '*' else f"[{argument}]"
+    return f"{function}({distinct or ''}{argument}) as [{alias or column.strip()}]"
+
+
+def get_order_by_sql(order_by: Union[str, List[str]]) -> str:
+    """拼接排序语句，支持 'age'，'-age'(倒序)，'age desc' 等写法"""
+    order_by_list = []
+    for column in [order_by] if isinstance(order_by, str) else order_by:
+        column = column.strip()
+        direction = ""
+        if column.startswith('-'):
+            column, direction = column[1:], " desc"
+        elif column.lower().endswith((' desc', ' asc')):
+            column, direction = column.rsplit(None, 1)
+            direction = f" {direction.lower()}"
+        order_by_list.append(f"[{column}]{direction}")
+    return ",".join(order_by_list)
+
+
+def encode_export_value(value):
+    """将查询结果中的值转为导出到CSV的文本，结构化字段的编码方式与保存到数据库时一致"""
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    return str(value)
+
+
+def encode_json_value(value):
+    """json.dumps 的default函数，处理json不支持的时间，set，bytes等类型"""
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    return str(value)
+
+
+def is_busy_error(e: Exception) -> bool:
+    """判断是否为其他连接持有写锁导致的 SQLITE_BUSY(database is locked) 异常"""
+    if not isinstance(e, sqlite3.OperationalError):
+        return False
+    error_code = getattr(e, 'sqlite_errorcode', None)  # Python3.11及以上才有该属性
+    if error_code is not None:
+        return error_code & 0xff == sqlite3.SQLITE_BUSY
+    return 'database is locked' in str(e) or 'database is busy' in str(e)
+
+
+def is_record(obj) -> bool:
+    """判断是否为可以直接插入的 dataclass，NamedTuple 或者定义了 __slots__ 的对象"""
+    record_type = type(obj)
+    return dataclasses.is_dataclass(record_type) or (isinstance(obj, tuple) and hasattr(record_type, '_fields')) or (
+            not isinstance(obj, (dict, str, bytes)) and hasattr(record_type, '__slots__'))
+
+
+def get_record_column_type(annotation) -> Union[str, None]:
+    """
+    根据字段的类型注解获取字段类型，Optional[X] 按X处理，List[X]等泛型按list等原始类型处理，Any等其他类型按obj处理，
+    没有注解时返回None，由插入的第一个对象的字段值推断类型
+    """
+    if annotation is None:
+        return None
+    args = getattr(annotation, '__args__', None)
+    if getattr(annotation, '__origin__', None) is Union and args:
+        not_none_args = [arg for arg in args if arg is not type(None)]
+        if len(not_none_args) == 1:
+            annotation = not_none_args[0]
+    annotation = getattr(annotation, '__origin__', None) or annotation
+    if annotation in (bytes, bytearray):
+        return 'blob'
+    return TABLE_TYPE_INFO.get(annotation, 'obj')
+
+
+@lru_cache(maxsize=None)
+def get_record_fields(record_type: type) -> Dict[str, str]:
+    """获取 dataclass，NamedTuple 或 __slots__ 类的字段名及根据类型注解推断的字段类型(没有可用注解时为None)，按类缓存"""
+    if dataclasses.is_dataclass(record_type):
+        names = [field.name for field in dataclasses.fields(record_type)]
+    elif hasattr(record_type, '_fields'):
+        names = list(record_type._fields)
+    elif hasattr(record_type, '__slots__'):
+        names = []
+        for cls in reversed(record_type.__mro__):
+            slots = cls.__dict__.get('__slots__', ())
+            for name in [slots] if isinstance(slots, str) else slots:
+                if name not in ('__dict__', '__weakref__') and name not in names:
+                    names.append(name)
+    else:
+        raise Exception(f"不支持的类型 Unsupported type：{record_type}")
+    try:
+        annotations = get_type_hints(record_type)
+    except Exception:  # 无法解析的前向引用等注解，直接使用原始注解
+        annotations = {}
+        for cls in reversed(record_type.__mro__):
+            annotations.update(cls.__dict__.get('__annotations__', {}))
+    return {name: get_record_column_type(annotations.get(name)) for name in names}
+
+
+@lru_cache(maxsize=None)
+def get_record_getter(record_type: type) -> Callable:
+    """获取按字段顺序返回对象所有字段值tuple的函数，NamedTuple本身即为tuple，其他类使用operator.attrgetter"""
+    if hasattr(record_type, '_fields') and issubclass(record_type, tuple):
+        return tuple
+    names = list(get_record_fields(record_type))
+    if len(names) == 1:
+        getter = operator.attrgetter(names[0])
+        return lambda obj: (getter(obj),)
+    return operator.attrgetter(*names)
+
+
+@lru_cache(maxsize=None)
+def get_record_factory(record_type: type) -> Callable:
+    """获取根据按字段顺序排列的值tuple创建对象的函数"""
+    if hasattr(record_type, '_fields') and issubclass(record_type, tuple):
+        return record_type._make
+    if dataclasses.is_dataclass(record_type) and all(field.init for field in dataclasses.fields(record_type)):
+        return lambda row: record_type(*row)
+    names = list(get_record_fields(record_type))
+    new, set_attr = object.__new__, object.__setattr__
+
+    def factory(row):
+        obj = new(record_type)
+        for name, value in zip(names, row):
+            set_attr(obj, name, value)
+        return obj
+
+    return factory
+
+
 def adapt_obj(obj):
     return pickle.dumps(obj)
 
 
 def convert_obj(obj_byte):
+    if obj_byte[:len(OBJ_OUT_OF_BAND_MAGIC)] == OBJ_OUT_OF_BAND_MAGIC:
+        return load_obj_out_of_band(obj_byte)
     return pickle.loads(obj_byte)
 
 
+def dump_obj_out_of_band(obj) -> List[memoryview]:
+    """
+    使用pickle protocol 5 序列化对象，bytearray，numpy数组等大块数据作为带外缓冲区直接引用，不复制到pickle数据中
+    :return: 按顺序拼接后即为完整存储数据的memoryview list，第一个为标识和长度信息
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    try:
+        raws = [buffer.raw() for buffer in buffers]
+    except BufferError:  # 非连续内存的缓冲区无法直接引用，改为保存在pickle数据中
+        data, raws = pickle.dumps(obj, protocol=5), []
+    header = OBJ_OUT_OF_BAND_MAGIC + OBJ_OUT_OF_BAND_HEADER.pack(len(data), len(raws)) + b"".join(
+        OBJ_OUT_OF_BAND_BUFFER_LENGTH.pack(raw.nbytes) for raw in raws)
+    return [memoryview(header), memoryview(data)] + raws
+
+
+def load_obj_out_of_band(obj_byte: Union[bytes, bytearray, memoryview]):
+    """反序列化 dump_obj_out_of_band 保存的数据，带外缓冲区为obj_byte上的memoryview切片，不会复制数据"""
+    view = memoryview(obj_byte)
+    position = len(OBJ_OUT_OF_BAND_MAGIC)
+    data_length, buffer_count = OBJ_OUT_OF_BAND_HEADER.unpack_from(view, position)
+    position += OBJ_OUT_OF_BAND_HEADER.size
+    buffer_lengths = []
+    for _ in range(buffer_count):
+        buffer_lengths.append(OBJ_OUT_OF_BAND_BUFFER_LENGTH.unpack_from(view, position)[0])
+        position += OBJ_OUT_OF_BAND_BUFFER_LENGTH.size
+    data = view[position:position + data_length]
+    position += data_length
+    buffers = []
+    for buffer_length in buffer_lengths:
+        buffers.append(view[position:position + buffer_length])
+        position += buffer_length
+    return pickle.loads(data, buffers=buffers)
+
+
+def canonical_hash_value(value, adapted_value):
+    """
+    insert_dedup 计算hash时使用的值，set的字符串按元素排序，dict转json时按key排序，
+    不受set的hash顺序和dict插入顺序影响，其他值直接使用转为SQLite存储的值
+    :param value: 原始值
+    :param adapted_value: 转为SQLite存储的值
+    """
+    if not isinstance(adapted_value, str) or not value:
+        return adapted_value
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(map(repr, value))) + "}"
+    if isinstance(value, (dict, list)):
+        try:
+            return json.dumps(value, ensure_ascii=False, sort_keys=True)
+        except TypeError:  # key类型不同无法排序
+            return adapted_value
+    return adapted_value
+
+
 def convert_json_text(text):
     return json.loads(text)
 
@@ -79,6 +501,283 @@ def convert_set_text(text):
     return eval(text)
 
 
+class LruCache(object):
+    """有容量上限的LRU缓存，超过容量时淘汰最久未使用的项，并记录命中与未命中次数"""
+
+    def __init__(self, max_size: int = 100):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None, is_valid: Callable = None):
+        """
+        :param is_valid: 校验缓存值是否仍然有效的函数，无效的缓存值会被删除并按未命中处理
+        """
+        try:
+            value = self._data[key]
+            if is_valid is not None and not is_valid(value):
+                del self._data[key]
+                raise KeyError(key)
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "max_size": self.max_size}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqlCache(object):
+    """
+    拼接好的SQL语句缓存，按key的第一项(操作，如insert，update，filter，read_tables)分别使用容量为max_size的LruCache，
+    查询条件，查询语句读取的表等变化较多的缓存项不会把insert，update等语句挤出缓存
+    """
+
+    def __init__(self, max_size: int = 100):
+        self.max_size = max_size
+        self._caches = {}
+
+    def get(self, key: tuple, default=None):
+        cache = self._caches.get(key[0])
+        if cache is None:
+            self._caches[key[0]] = cache = LruCache(self.max_size)
+        return cache.get(key, default)
+
+    def set(self, key: tuple, value):
+        cache = self._caches.get(key[0])
+        if cache is None:
+            self._caches[key[0]] = cache = LruCache(self.max_size)
+        cache.set(key, value)
+
+    def clear(self):
+        self._caches.clear()
+
+    def info(self) -> dict:
+        kinds = {kind: cache.info() for kind, cache in self._caches.items()}
+        return {"hits": sum(info["hits"] for info in kinds.values()),
+                "misses": sum(info["misses"] for info in kinds.values()),
+                "size": sum(info["size"] for info in kinds.values()), "max_size": self.max_size, "kinds": kinds}
+
+    def __len__(self):
+        return sum(len(cache) for cache in self._caches.values())
+
+
+class CachedCursor(object):
+    """查询结果缓存返回的游标，提供与sqlite3.Cursor一致的fetch方法"""
+
+    def __init__(self, rows: list, description, cursor: sqlite3.Cursor = None):
+        """
+        :param rows: 已经读取的查询结果
+        :param description: 查询结果的字段描述，同sqlite3.Cursor.description
+        :param cursor: 查询结果超出缓存行数限制时，剩余的数据从该游标继续读取
+        """
+        self.description = description
+        self.rowcount = -1
+        self._rows = iter(rows)
+        self._cursor = cursor
+
+    def fetchone(self):
+        for row in self._rows:
+            return row
+        if self._cursor is not None:
+            return self._cursor.fetchone()
+        return None
+
+    def fetchmany(self, size: int = 1):
+        rows = list(islice(self._rows, size))
+        if len(rows) < size and self._cursor is not None:
+            rows.extend(self._cursor.fetchmany(size - len(rows)))
+        return rows
+
+    def fetchall(self):
+        rows = list(self._rows)
+        if self._cursor is not None:
+            rows.extend(self._cursor.fetchall())
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class ExcelPatchSession(object):
+    """加载一次Excel，批量修改多个sheet的数据后只保存一次，通过 DictToDb.excel_patch_session 创建"""
+
+    def __init__(self, excel: Union[str, Path], title_row_index: Union[Dict[str, int], List[int], int] = None,
+                 data_row_start_index: Union[Dict[str, int], List[int], int] = None, log: logging.Logger = None):
+        from openpyxl import load_workbook
+        self.excel = excel
+        self.wb = load_workbook(excel)
+        self.change_count = 0
+        self._title_row_index = title_row_index
+        self._data_row_start_index = data_row_start_index
+        self._log = log or logging.getLogger("dict_to_db")
+        self._title_index = {}  # {sheet_name: {title: column index}}
+        self._key_index = {}  # {(sheet_name, key_column): {str(key值): row index}}
+
+    def change(self, change_data: Union[List[dict], dict], sheet_name: str, key_column: str = None) -> int:
+        """
+        修改一个sheet的数据，修改只在内存中进行，调用save后才写入Excel文件
+        :param change_data: 需要改动的数据，可以是dict，也可以是dict的list，每个dict的key为标题名或Excel列名(如A,B,AA)
+        :param sheet_name: 需要改动的sheet_name
+        :param key_column: 根据该列的值查找需要改动的行，为None时每个dict都必须包含字段excel_row_index
+        :return: 本次改动的单元格数量
+        """
+        if isinstance(change_data, dict):
+            change_data = [change_data]
+        ws = self.wb[sheet_name]
+        title_index = self._get_title_index(sheet_name)
+        change_count = 0
+        for data in change_data:
+            if key_column is None:
+                row_index = data['excel_row_index']
+            else:
+                key_index = self._get_key_index(sheet_name, key_column)
+                try:
+                    row_index = key_index[str(data[key_column])]
+                except KeyError:
+                    raise Exception(f"sheet:{sheet_name} 中找不到{key_column}为{data[key_column]}的数据")
+            for k, value in data.items():
+                if k == 'excel_row_index' or k == key_column:
+                    continue
+                if k in title_index:
+                    column_index = title_index[k]
+                elif EXCEL_TITLE_PATTERN.match(k):
+                    column_index = get_index_by_excel_title(k)
+                else:
+                    raise Exception("无法准确找到Excel 值的 column index")
+                ws.cell(column=int(column_index), row=int(row_index), value=value)
+                change_count += 1
+        self.change_count += change_count
+        return change_count
+
+    def save(self):
+        """将所有改动保存到Excel文件"""
+        self.wb.save(self.excel)
+        self._log.debug(f"保存Excel：{self.excel}，共改动{self.change_count}个单元格")
+
+    def close(self):
+        self.wb.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.save()
+        finally:
+            self.close()
+
+    def _get_sheet_row_index(self, row_index_info, sheet_name: str, default: int) -> int:
+        if row_index_info is None:
+            return default
+        elif isinstance(row_index_info, int):
+            return row_index_info
+        elif isinstance(row_index_info, dict):
+            return row_index_info.get(sheet_name, default)
+        try:
+            return row_index_info[self.wb.sheetnames.index(sheet_name)]
+        except IndexError:
+            return default
+
+    def _get_title_index(self, sheet_name: str) -> dict:
+        """获取sheet标题名和列index的对应关系，没有标题的列使用Excel列名"""
+        if sheet_name not in self._title_index:
+            title_row = self._get_sheet_row_index(self._title_row_index, sheet_name, 1)
+            title_index = {}
+            for row in self.wb[sheet_name].iter_rows(min_row=title_row, max_row=title_row, values_only=True):
+                for cell_count, title in enumerate(row):
+                    title = str(title) if title is not None else get_excel_title_by_index(cell_count + 1)
+                    title_index.setdefault(title, cell_count + 1)
+            self._title_index[sheet_name] = title_index
+        return self._title_index[sheet_name]
+
+    def _get_key_index(self, sheet_name: str, key_column: str) -> dict:
+        """建立key列的值和行index的对应关系，每个sheet的每个key列只建立一次"""
+        if (sheet_name, key_column) not in self._key_index:
+            title_index = self._get_title_index(sheet_name)
+            if key_column in title_index:
+                column_index = title_index[key_column]
+            elif EXCEL_TITLE_PATTERN.match(key_column):
+                column_index = get_index_by_excel_title(key_column)
+            else:
+                raise Exception(f"sheet:{sheet_name} 中找不到key列：{key_column}")
+            title_row = self._get_sheet_row_index(self._title_row_index, sheet_name, 1)
+            data_row_start = self._get_sheet_row_index(self._data_row_start_index, sheet_name, title_row + 1)
+            key_index = {}
+            for row_count, (value,) in enumerate(self.wb[sheet_name].iter_rows(
+                    min_row=data_row_start, min_col=column_index, max_col=column_index, values_only=True)):
+                if value is not None:
+                    key_index.setdefault(str(value), data_row_start + row_count)
+            self._key_index[(sheet_name, key_column)] = key_index
+        return self._key_index[(sheet_name, key_column)]
+
+
+class LazyTableInfo(dict):
+    """
+    数据库的表结构信息 {表名: {字段名: PRAGMA table_info 的结果}}，创建时只需要表名，
+    每个表的字段信息在第一次使用该表时才通过 PRAGMA table_info 读取
+    """
+
+    def __init__(self, db: sqlite3.Connection, table_names: Iterable[str], loaded_tables: dict = None):
+        super().__init__(loaded_tables or {})
+        self._db = db
+        self._table_names = dict.fromkeys(table_names)
+
+    def __missing__(self, table_name):
+        if table_name not in self._table_names:
+            raise KeyError(table_name)
+        # 下面这条语句不支持？占位符和命名占位符   不知道原因
+        table_info = self._db.execute(f"PRAGMA table_info([{table_name}]);").fetchall()
+        table_info_dict = {column_info['name']: column_info for column_info in table_info}
+        self[table_name] = table_info_dict
+        return table_info_dict
+
+    def __contains__(self, table_name):
+        return table_name in self._table_names
+
+    def __iter__(self):
+        return iter(self._table_names)
+
+    def __len__(self):
+        return len(self._table_names)
+
+    def keys(self):
+        return self._table_names.keys()
+
+    def values(self):
+        return [self[table_name] for table_name in self._table_names]
+
+    def items(self):
+        return [(table_name, self[table_name]) for table_name in self._table_names]
+
+    def get(self, table_name, default=None):
+        return self[table_name] if table_name in self._table_names else default
+
+
 # sqlite3.register_adapter(object, adapt_obj)
 sqlite3.register_converter("obj", convert_obj)
 sqlite3.register_converter("json_text", convert_json_text)
@@ -91,14 +790,18 @@ class DictToDb(object):
                  isolation_level: str = "DEFERRED", check_same_thread: bool = True,
                  cached_statements: int = 100, uri=False, row_factory: Callable = dict_factory,
                  insert_time: bool = True, update_time: bool = True, export: bool = False, auto_commit: bool = True,
-                 auto_alter: bool = True, logger_level=logging.INFO):
+                 auto_alter: bool = True, logger_level=logging.INFO, slow_sql_threshold: float = None,
+                 slow_sql_log_size: int = 100, slow_sql_explain: bool = True, result_cache_size: int = 0,
+                 result_cache_ttl: float = None, result_cache_max_rows: int = 10000, snapshot: str = None,
+                 snapshot_interval: float = None, snapshot_pages: int = -1, skip_unchanged: bool = False):
         """
         :param database:数据库路径，也可以是 :memory: 表示这是一个内存数据库
         :param timeout:连接超时时间
         :param detect_types:默认为 0 (即关闭，不进行类型检测)，你可以将其设为任意的 PARSE_DECLTYPES 和 PARSE_COLNAMES 组合来启用类型检测
         :param isolation_level:事务隔离级别 可选值为 None(autocommit),"DEFERRED","IMMEDIATE","EXCLUSIVE"
         :param check_same_thread:是否只在一个线程中运行，默认为TRUE，若要多线程运行，请设置为FALSE
-        :param cached_statements:缓存SQL语句的条数 默认100条
+        :param cached_statements:缓存SQL语句的条数 默认100条，同时也是程序内部每种操作(insert，update，查询条件等)
+        拼接SQL语句的LRU缓存容量
         :param uri:如果 uri 为真，则 database 被解释为 URI,它允许您指定选项。 例如，以只读模式打开数据库
          sqlite3.connect('file:path/to/database?mode=ro', uri =True)
         :param row_factory:指定row_factory回调函数，默认的回调函数，会将查询出的结果行转换为dict,
@@ -109,29 +812,69 @@ class DictToDb(object):
         :param auto_commit 是否自动执行commit语句，这里是全局设置，可以被方法内的commit参数局部覆盖
         :param auto_alter 是否自动执行alter 表结构，这里是全局设置，可以被方法内的auto_alter参数局部覆盖
         :param logger_level  可以输出的日志级别
+        :param slow_sql_threshold 慢SQL阈值(秒)，execute/executemany/executescript 执行耗时超过该值的语句会被记录，
+        默认为None 不记录慢SQL
+        :param slow_sql_log_size 慢SQL记录最多保留的条数，超过后丢弃最早的记录
+        :param slow_sql_explain 记录慢SQL时是否同时记录 EXPLAIN QUERY PLAN 执行计划
+        :param result_cache_size select/execute 查询结果缓存的条数，默认为0 不缓存，缓存的结果在其依赖的表被
+        insert/update/delete/alter 等写入，rollback，或其他连接提交写入(PRAGMA data_version 变化)后自动失效，
+        注：外键级联造成的数据变动无法感知，需调用 clear_result_cache 清空缓存
+        :param result_cache_ttl 查询结果缓存的有效时间(秒)，默认为None 不过期
+        :param result_cache_max_rows 单条查询结果最多缓存的行数，超过该行数的查询结果不缓存
+        :param snapshot 内存数据库的快照文件路径，设置后database必须为:memory:，启动时从快照文件加载数据，
+        close 时以及每隔snapshot_interval秒通过SQLite online backup 将内存数据库保存到快照文件，
+        程序异常退出时最多丢失snapshot_interval秒内的数据
+        :param snapshot_interval 后台定时保存快照的间隔(秒)，默认为None 只在close或调用snapshot函数时保存，
+        设置后check_same_thread 会被设置为False，以便后台线程使用数据库连接
+        :param snapshot_pages 每次backup复制的页数，默认-1 一次复制所有页
+        :param skip_unchanged update/insert_or_update 是否跳过值没有变化的数据，跳过的数据不会写入，update_time也保持不变，
+        这里是全局设置，可以被方法内的skip_unchanged参数局部覆盖
         """
+        if snapshot is not None and database != ":memory:":
+            raise Exception("设置snapshot参数时，database必须为:memory:")
+        if snapshot_interval:
+            check_same_thread = False
         self.db = sqlite3.connect(database, timeout=timeout, detect_types=detect_types, isolation_level=isolation_level,
                                   check_same_thread=check_same_thread, cached_statements=cached_statements,
                                   uri=uri)
+        self._snapshot = snapshot
+        self._snapshot_pages = snapshot_pages
         self._tables = {}
-        self._insert_sql = {}
-        self._insert_or_update_sql = {}
-        self._update_sql = {}
-        self._delete_sql = {}
-        self._replace_sql = {}
-        self._select_sql = {}
+        self._tables_loaded_in_transaction = False  # 是否在未提交的事务中读取过表结构(建表或alter后)，回滚时需要重新读取
+        self._virtual_tables = set()  # FTS5等虚拟表的表名，虚拟表及其影子表不包含在_tables中
+        self._sql_cache = SqlCache(cached_statements)  # 拼接好的SQL语句缓存，key为(操作, 表名, 字段tuple)，每种操作分别缓存
+        self._max_variable_number = self._get_max_variable_number()
+        self._unique_count = count(1)  # 生成不重复的临时表名及SQL注释
+        self._function_caches = {}  # create_function 设置了memoize的函数的结果缓存 {函数名: LruCache}
+        self._write_batch_depth = 0  # 当前嵌套执行的write_batch层数，大于0时commit不生效
+        self._loaded_schema_version = None  # write_batch 开始时读取的数据库schema_version，变化时重新读取表结构
+        self._created_indexes = set()  # 本实例已经创建过的索引/序号字段 {(表名, 字段名)}，避免每次调用都执行DDL
+        self._write_contention = {"transactions": 0, "busy": 0, "retries": 0, "failed": 0, "wait_time": 0.0,
+                                  "lock_time": 0.0}
         self.lock = None
         self._insert_time = insert_time
         self._update_time = update_time
         self._export = export
         self._auto_commit = auto_commit
         self._auto_alter = auto_alter
+        self._skip_unchanged = skip_unchanged
         self._check_same_thread = check_same_thread
         self._re_pattern = {
             "pk": re.compile(r'primary\s+key$'),
-            "excel_title_str": re.compile(r'^[a-zA-Z]+$')
+            "excel_title_str": EXCEL_TITLE_PATTERN
         }
         self._excel_title_index = {}  # 缓存Excel表结构里面的title和对应的index关系，避免改动Excel内容时需要循环
+        self._slow_sql_threshold = slow_sql_threshold
+        self._slow_sql_explain = slow_sql_explain
+        self._slow_sql_log = deque(maxlen=slow_sql_log_size)
+        self._last_trace_sql = None  # 最近一条由SQLite实际执行的语句(参数已展开)，用于获取慢SQL的执行计划
+        self._result_cache = LruCache(result_cache_size) if result_cache_size else None
+        self._result_cache_ttl = result_cache_ttl
+        self._result_cache_max_rows = result_cache_max_rows
+        self._table_versions = {}  # 每个表(表名小写)的写入版本号，表被写入后加1，用于判断查询结果缓存是否失效
+        # 表结构变动，无法确定写入的表(如CTE写入，rollback)，或写入的表上有触发器时加1，使所有查询结果缓存失效
+        self._schema_version = 0
+        self._trigger_tables = None  # (读取时的_schema_version, 定义了触发器的表名小写set)，表结构变动后重新读取
         self.log = logging.getLogger("dict_to_db")
         formatter = logging.Formatter('%(asctime)s %(levelname)-5s: %(message)s')
         console_handler = logging.StreamHandler(sys.stdout)
@@ -139,18 +882,30 @@ class DictToDb(object):
         self.log.addHandler(console_handler)
         self.log.setLevel(logger_level)
         if not check_same_thread:
-            self.lock = Lock()
+            # 可重入锁：write_batch 持有锁执行func时，func中的insert，commit等方法会再次获取同一把锁
+            self.lock = threading.RLock()
         if row_factory:
             self.db.row_factory = row_factory
+        if slow_sql_threshold is not None:
+            self.db.set_trace_callback(self._trace_sql)
+        if snapshot is not None and os.path.exists(snapshot):
+            self._load_snapshot(snapshot)
         self.cursor = self.db.cursor()
         self._load_db_tables()
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread = None
+        if snapshot is not None and snapshot_interval:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, args=(snapshot_interval,),
+                                                     name="dict_to_db_snapshot", daemon=True)
+            self._snapshot_thread.start()
 
     def insert(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
                commit: bool = None, insert_time: bool = None, update_time: bool = None, export: bool = None,
                auto_alter: bool = None):
         """
         根据dict插入数据的函数，如果当前dict数据结构没有在数据库中建表，此函数则会自动建表
-        :param data: 需要插入的dict 或者可迭代对象，且这个可迭代对象的子元素为dict
+        :param data: 需要插入的dict 或者可迭代对象，且这个可迭代对象的子元素为dict，
+        也可以是 dataclass，NamedTuple，定义了__slots__的对象，直接读取对象属性插入，根据类型注解建表
         :param table_name: 用户自定义表名，如果没有填写，则表名为t1,t2.....tn规则，依次递增
         :param commit: 是否插入一条语句后立即执行commit
         :param insert_time: 是否给数据加入一列插入时间列
@@ -168,7 +923,7 @@ class DictToDb(object):
             commit = self._auto_commit
         if auto_alter is None:
             auto_alter = self._auto_alter
-        if isinstance(data, dict):
+        if isinstance(data, dict) or is_record(data):
             insert_data = data
         elif isinstance(data, Generator):
             insert_data = next(data)
@@ -178,6 +933,10 @@ class DictToDb(object):
                 break
         else:
             raise Exception("不支持的类型 Unsupported type")
+        if is_record(insert_data):
+            self._insert_records(data, insert_data, table_name, insert_time, update_time, export, auto_alter)
+            self._commit(commit)
+            return
         if table_name is None:
             table_name = self._get_table_name_by_dict_keys(insert_data, insert_time, update_time, export)
         if table_name not in self._tables.keys():
@@ -195,7 +954,7 @@ class DictToDb(object):
 
     def insert_or_update(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
                          commit: bool = None, insert_time: bool = None, update_time: bool = None, export: bool = None,
-                         auto_alter: bool = None, ignore_error=None):
+                         auto_alter: bool = None, ignore_error=None, skip_unchanged: bool = None) -> int:
         """
         不存在则插入，存在则更新的方法 【此方法性能略差于 insert 和insert_replace】
         根据dict插入数据的函数，如果当前dict数据结构没有在数据库中建表，此函数则会自动建表
@@ -207,16 +966,18 @@ class DictToDb(object):
         :param export: 是否给数据加入一列导出数据列
         :param auto_alter: 是否自动alter表结构
         :param ignore_error: 是否在单次保存或更新中忽略某些异常以保证，数据大部分都插入到数据库中
+        :param skip_unchanged: 数据已存在且值没有变化时是否跳过更新，跳过的数据update_time保持不变
+        :return: 插入和更新的数据条数，跳过的数据不计算在内
         """
         if isinstance(data, dict):
-            self._insert_or_update(data=data, table_name=table_name, commit=commit, insert_time=insert_time,
-                                   update_time=update_time, export=export, auto_alter=auto_alter,
-                                   ignore_error=ignore_error)
+            return self._insert_or_update(data=data, table_name=table_name, commit=commit, insert_time=insert_time,
+                                          update_time=update_time, export=export, auto_alter=auto_alter,
+                                          ignore_error=ignore_error, skip_unchanged=skip_unchanged)
         elif isinstance(data, (Generator, Iterable)):
-            for d in data:
-                self._insert_or_update(data=d, table_name=table_name, commit=commit, insert_time=insert_time,
-                                       update_time=update_time, export=export, auto_alter=auto_alter,
-                                       ignore_error=ignore_error)
+            return sum(self._insert_or_update(data=d, table_name=table_name, commit=commit, insert_time=insert_time,
+                                              update_time=update_time, export=export, auto_alter=auto_alter,
+                                              ignore_error=ignore_error, skip_unchanged=skip_unchanged)
+                       for d in data)
         else:
             raise Exception("不支持的类型 Unsupported type")
 
@@ -269,16 +1030,604 @@ class DictToDb(object):
                 raise e
         self._commit(commit)
 
+    def insert_columns(self, columns: Dict[str, Iterable], table_name: str = None, commit: bool = None,
+                       insert_time: bool = None, update_time: bool = None, export: bool = None,
+                       auto_alter: bool = None, chunk_size: int = 10000) -> int:
+        """
+        按列插入数据，不需要为每行数据创建dict，如果表不存在则根据每列第一个值的类型自动建表
+        :param columns: {字段名: 该字段的所有值}，值可以是长度相同的list，tuple，array.array 或numpy数组，
+        字段名同样支持 字段名@字段类型#字段描述信息 的格式
+        :param table_name: 用户自定义表名，如果没有填写，则表名为t1,t2.....tn规则，依次递增
+        :param commit: 是否插入后立即执行commit
+        :param insert_time: 是否给数据加入一列插入时间列
+        :param update_time: 是否给数据加入一列更新时间列
+        :param export: 是否给数据加入一列导出数据列
+        :param auto_alter: 是否自动alter表结构
+        :param chunk_size: 每次转换并插入的行数
+        :return: 插入的行数
+        """
+        if insert_time is None:
+            insert_time = self._insert_time
+        if update_time is None:
+            update_time = self._update_time
+        if export is None:
+            export = self._export
+        if commit is None:
+            commit = self._auto_commit
+        if auto_alter is None:
+            auto_alter = self._auto_alter
+        row_count = len(next(iter(columns.values()))) if columns else 0
+        if any(len(values) != row_count for values in columns.values()):
+            raise Exception("columns 中每列数据的长度必须相同")
+        if row_count == 0:
+            return 0
+        first_data = {key: self._to_python_values(values[0:1])[0] for key, values in columns.items()}
+        if table_name is None:
+            table_name = self._get_table_name_by_dict_keys(first_data, insert_time, update_time, export)
+        if table_name not in self._tables.keys():
+            self._create_table_by_dict(first_data, table_name, insert_time, update_time, export)
+        elif auto_alter and any(get_column_name_by_key(key) not in self._tables[table_name] for key in columns):
+            self._alter_table_add_column_by_dict(first_data, table_name=table_name)
+        insert_sql = self._get_insert_sql_by_dict(first_data, table_name)
+        column_types = [self._tables[table_name][get_column_name_by_key(key)]['type'] for key in columns]
+        for start in range(0, row_count, chunk_size):
+            chunk_columns = []
+            for values, column_type in zip(columns.values(), column_types):
+                chunk_values = self._to_python_values(values[start:start + chunk_size])
+                chunk_columns.append(self._adapt_column_values(chunk_values, column_type))
+            self.executemany(insert_sql, zip(*chunk_columns))
+        self._commit(commit)
+        return row_count
+
+    def insert_dedup(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
+                     commit: bool = None, insert_time: bool = None, update_time: bool = None, export: bool = None,
+                     auto_alter: bool = None, chunk_size: int = 10000) -> dict:
+        """
+        去重插入，计算每条数据内容(转为SQLite存储值后)的hash值，保存到有唯一索引的 _content_hash 字段中，
+        每批数据按hash批量查询已存在的内容，内容完全相同的数据跳过，不会重复插入，也不需要逐条查询或更新；
+        内容不同但与已有数据主键(或其他唯一约束)冲突的数据不会插入，单独计入 conflict_count
+        :param data: 需要插入的dict 或者可迭代对象，且这个可迭代对象的子元素为dict
+        :param table_name: 用户自定义表名，如果没有填写，则表名为t1,t2.....tn规则，依次递增
+        :param commit: 是否插入后立即执行commit
+        :param insert_time: 是否给数据加入一列插入时间列
+        :param update_time: 是否给数据加入一列更新时间列
+        :param export: 是否给数据加入一列导出数据列
+        :param auto_alter: 是否自动alter表结构
+        :param chunk_size: 每次批量插入的数据条数
+        :return: dict(insert_count：插入的条数，skip_count：内容重复跳过的条数，conflict_count：内容不同但主键冲突未插入的条数)
+        """
+        if insert_time is None:
+            insert_time = self._insert_time
+        if update_time is None:
+            update_time = self._update_time
+        if export is None:
+            export = self._export
+        if commit is None:
+            commit = self._auto_commit
+        if auto_alter is None:
+            auto_alter = self._auto_alter
+        if isinstance(data, dict):
+            data = [data]
+        data = iter(data)
+        insert_count = 0
+        skip_count = 0
+        total_count = 0
+        while True:
+            chunk = list(islice(data, chunk_size))
+            if not chunk:
+                break
+            key_groups = {}
+            for d in chunk:
+                key_groups.setdefault(tuple(d), []).append(d)
+            for rows in key_groups.values():
+                hash_data = dict(rows[0])
+                hash_data[CONTENT_HASH_COLUMN] = ""
+                if table_name is None:
+                    table_name = self._get_table_name_by_dict_keys(hash_data, insert_time, update_time, export)
+                if table_name not in self._tables:
+                    self._create_table_by_dict(hash_data, table_name, insert_time, update_time, export)
+                elif auto_alter and any(get_column_name_by_key(k) not in self._tables[table_name] for k in hash_data):
+                    self._alter_table_add_column_by_dict(hash_data, table_name=table_name)
+                if (table_name, CONTENT_HASH_COLUMN) not in self._created_indexes:
+                    # 建索引会使查询结果缓存失效，每个表只执行一次
+                    self.execute(CREATE_CONTENT_HASH_INDEX_SQL_TEMPLATE.format(table_name=table_name))
+                    self._created_indexes.add((table_name, CONTENT_HASH_COLUMN))
+                new_values = self._filter_existing_content_hash(
+                    list(self._adapt_dict_values_with_hash(rows, table_name)), table_name)
+                skip_count += len(rows) - len(new_values)
+                total_count += len(rows)
+                if new_values:
+                    # 剩下的数据hash都不重复，被ignore的只会是主键等其他唯一约束冲突的数据
+                    insert_sql = self._get_insert_or_ignore_sql_by_dict(hash_data, table_name)
+                    insert_count += self.executemany(insert_sql, new_values).rowcount
+        self._commit(commit)
+        return {"insert_count": insert_count, "skip_count": skip_count,
+                "conflict_count": total_count - insert_count - skip_count}
+
+    def _filter_existing_content_hash(self, values_list: List[list], table_name: str) -> List[list]:
+        """
+        去掉 _adapt_dict_values_with_hash 转换后的数据中，表中已经存在或本批中重复的内容(hash为最后一个值)
+        :param values_list: 转换后的数据
+        :param table_name: 表名
+        :return: 需要插入的数据
+        """
+        hashes = list({values[-1] for values in values_list})
+        existing_hashes = set()
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            for start in range(0, len(hashes), self._max_variable_number):
+                chunk_hashes = hashes[start:start + self._max_variable_number]
+                select_sql = SELECT_CONTENT_HASH_SQL_TEMPLATE.format(table_name=table_name,
+                                                                     values=",".join(['?'] * len(chunk_hashes)))
+                existing_hashes.update(row[0] for row in cursor.execute(select_sql, chunk_hashes))
+        finally:
+            cursor.close()
+        new_values = []
+        for values in values_list:
+            if values[-1] not in existing_hashes:
+                existing_hashes.add(values[-1])
+                new_values.append(values)
+        return new_values
+
+    def insert_resumable(self, data: Union[Iterable[dict], Generator[dict, None, None]], table_name: str,
+                         job_name: str, chunk_size: int = 1000, cursor_token: Callable[[dict], any] = None,
+                         resume: bool = True, execute_func: str = 'insert', insert_time: bool = None,
+                         update_time: bool = None, export: bool = None, auto_alter: bool = None) -> dict:
+        """
+        可断点续传的分批插入，每插入chunk_size条数据提交一次，并在同一事务中将进度保存到 dict_to_db_checkpoint 表，
+        程序中断后用相同的job_name重新执行，会跳过已经保存的数据继续插入
+        :param data: 需要插入的dict的可迭代对象或生成器
+        :param table_name: 表名
+        :param job_name: 任务名，断点进度按任务名保存
+        :param chunk_size: 每次提交的数据条数
+        :param cursor_token: 根据每批最后一条数据生成续传标记的函数，如 lambda d: d['id']，设置后续传时不再跳过已保存的
+        数据条数，需要调用方通过 get_checkpoint(job_name)['cursor_token'] 自行从标记处开始生成数据
+        :param resume: 是否从已保存的进度处续传，为False则从头开始插入并覆盖已保存的进度
+        :param execute_func: 执行的方法，可选的有insert，replace，insert_or_update
+        :param insert_time: 是否给数据加入一列插入时间列
+        :param update_time: 是否给数据加入一列更新时间列
+        :param export: 是否给数据加入一列导出数据列
+        :param auto_alter: 是否自动alter表结构
+        :return: dict(row_count：任务累计处理的数据条数，insert_count：本次执行插入的条数，cursor_token：续传标记)
+        """
+        execute_funcs = {"insert": self.insert, "replace": self.insert_or_replace,
+                         "insert_or_update": self.insert_or_update}
+        if execute_func not in execute_funcs:
+            raise Exception(f"不支持的execute_func：{execute_func}")
+        checkpoint = self.get_checkpoint(job_name) if resume else None
+        row_count = checkpoint['row_count'] if checkpoint else 0
+        token = checkpoint['cursor_token'] if checkpoint else None
+        data = iter(data)
+        if checkpoint and cursor_token is None:
+            for _ in islice(data, row_count):  # 跳过已经保存的数据
+                pass
+        insert_count = 0
+        while True:
+            chunk = list(islice(data, chunk_size))
+            if not chunk:
+                break
+            # 建表和alter与数据，进度在同一个事务中提交，失败时一起回滚
+            self._prepare_table(chunk, table_name, insert_time, update_time, export, auto_alter)
+            chunk_token = str(cursor_token(chunk[-1])) if cursor_token is not None else token
+            try:
+                execute_funcs[execute_func](chunk, table_name=table_name, commit=False, insert_time=insert_time,
+                                            update_time=update_time, export=export, auto_alter=auto_alter)
+                self._save_checkpoint(job_name, table_name, row_count + len(chunk), chunk_token, finished=False)
+                self.commit()
+            except BaseException:
+                # 回滚未提交的数据，进度停留在上一个已提交的chunk，重新执行时从该chunk开始续传
+                self._rollback()
+                raise
+            row_count += len(chunk)
+            insert_count += len(chunk)
+            token = chunk_token
+        self._save_checkpoint(job_name, table_name, row_count, token, finished=True)
+        self.commit()
+        self.log.info(f"任务{job_name} 本次插入{insert_count}条，累计{row_count}条")
+        return {"row_count": row_count, "insert_count": insert_count, "cursor_token": token}
+
+    def get_checkpoint(self, job_name: str) -> Union[dict, None]:
+        """
+        获取 insert_resumable 保存的任务进度
+        :param job_name: 任务名
+        :return: dict(job_name,table_name,row_count,cursor_token,finished,update_time)，没有进度时返回None
+        """
+        if CHECKPOINT_TABLE_NAME not in self._tables:
+            return None
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            row = cursor.execute(SELECT_CHECKPOINT_SQL, [job_name]).fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            return None
+        return dict(zip(["job_name", "table_name", "row_count", "cursor_token", "finished", "update_time"], row))
+
+    def delete_checkpoint(self, job_name: str, commit: bool = None):
+        """
+        删除 insert_resumable 保存的任务进度，下次执行该任务时从头开始插入
+        :param job_name: 任务名
+        :param commit: 是否立即提交
+        """
+        if CHECKPOINT_TABLE_NAME in self._tables:
+            self.delete({"job_name": job_name}, table_name=CHECKPOINT_TABLE_NAME, commit=commit)
+
+    def select_incremental(self, table_name: str, consumer: str, watermark_column: str = 'update_time',
+                           select: List[str] = None, limit: int = None, commit: bool = None) -> list:
+        """
+        增量查询，只返回上次查询之后新增或更新的数据，每个表每个消费者的水位保存在 dict_to_db_watermark 表中，
+        不需要像 export 字段一样回写源数据，查询也不会修改源数据表的数据和表结构
+        :param table_name: 表名
+        :param consumer: 消费者名称，不同的消费者分别记录水位
+        :param watermark_column: 水位字段，可选 insert_time(只查询新增数据)，update_time(查询新增和更新的数据)，
+        rowid 或其他递增字段。insert_time/update_time 使用 enable_incremental 维护的严格递增变更序号作为水位，
+        不受时间精度和时钟影响，需要先对该表调用一次 enable_incremental；rowid 只适用于rowid自动递增的表；
+        其他字段水位相同的数据按rowid区分，水位为Null的数据不会被查询出来，可以通过 enable_incremental 创建该字段的索引
+        :param select: 需要查询的列，默认查询所有列
+        :param limit: 本次最多查询的数据条数，默认查询所有增量数据
+        :param commit: 是否立即提交水位，为False时可以在导出成功后再调用commit，导出失败则rollback 下次重新查询该批数据
+        :return: 按水位字段排序的查询结果list
+        """
+        if commit is None:
+            commit = self._auto_commit
+        if table_name not in self._tables:
+            raise Exception(f"no table by table_name:{table_name}")
+        watermark = self.get_watermark(table_name, consumer)
+        if watermark is not None and watermark["watermark_column"] != watermark_column:
+            raise Exception(f"消费者{consumer}的水位字段为{watermark['watermark_column']}，"
+                            f"不能使用{watermark_column}查询，请先调用reset_watermark")
+        if watermark_column in CHANGE_LOG_SEQ_COLUMNS:
+            return self._select_incremental_by_change_log(table_name, consumer, watermark_column, watermark, select,
+                                                          limit, commit)
+        by_rowid = watermark_column.lower() == 'rowid'
+        watermark_expression = f"[{watermark_column}]"
+        if watermark is None:
+            where, where_values = "1=1", []
+        elif by_rowid:
+            where, where_values = "rowid>?", [watermark["watermark_rowid"]]
+        else:
+            # 单独的范围条件用于在索引上定位，行值比较用于区分水位相同的数据
+            where = f"{watermark_expression}>=? and ({watermark_expression},rowid)>(?,?)"
+            where_values = [watermark["watermark"], watermark["watermark"], watermark["watermark_rowid"]]
+        if by_rowid:
+            watermark_select, order_by, order_by_desc = "rowid", "rowid", "rowid desc"
+        else:
+            where += f" and {watermark_expression} is not null"
+            # 一元 + 运算去掉字段的声明类型，取出与数据库中存储值一致的原始值作为水位
+            watermark_select = f"+{watermark_expression}"
+            order_by = f"{watermark_expression},rowid"
+            order_by_desc = f"{watermark_expression} desc,rowid desc"
+        upper_sql = f"select {watermark_select}, rowid from [{table_name}] where {where} order by {{order_by}} " \
+                    f"limit 1 offset {{offset}};"
+        # 先确定本次查询的上界，再查询上界以内的数据，保证返回的数据和保存的水位一致
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            upper = None
+            if limit:
+                upper = cursor.execute(upper_sql.format(order_by=order_by, offset=int(limit) - 1),
+                                       where_values).fetchone()
+            if upper is None:
+                upper = cursor.execute(upper_sql.format(order_by=order_by_desc, offset=0), where_values).fetchone()
+        finally:
+            cursor.close()
+        if upper is None:
+            return []
+        upper_value, upper_rowid = upper
+        if by_rowid:
+            upper_where, upper_values = "rowid<=?", [upper_rowid]
+        else:
+            upper_where = f"{watermark_expression}<=? and ({watermark_expression},rowid)<=(?,?)"
+            upper_values = [upper_value, upper_value, upper_rowid]
+        select_sql = self._get_select_sql(table_name, select, f"{where} and {upper_where} order by {order_by}")
+        rows = self.execute(select_sql, where_values + upper_values).fetchall()
+        self._save_watermark(table_name, consumer, watermark_column, upper_value, upper_rowid)
+        self._commit(commit)
+        return rows
+
+    def enable_incremental(self, table_name: str, index_columns: List[str] = None, commit: bool = None):
+        """
+        为 select_incremental 按 insert_time/update_time 增量查询做准备：在表上安装触发器，新增，更新数据时
+        在 dict_to_db_change_log 表中记录该行(rowid)严格递增的变更序号，已有数据按rowid顺序回填，
+        不修改源数据表的字段和数据，重复调用不会重复安装
+        :param table_name: 表名
+        :param index_columns: 按其他字段增量查询时，需要创建索引的水位字段
+        :param commit: 是否立即提交
+        """
+        if commit is None:
+            commit = self._auto_commit
+        if table_name not in self._tables:
+            raise Exception(f"no table by table_name:{table_name}")
+        for column in index_columns or []:
+            self.execute(CREATE_WATERMARK_INDEX_SQL_TEMPLATE.format(table_name=table_name, column=column,
+                                                                    expression=f"[{column}]"))
+        if not self._is_incremental_enabled(table_name):
+            self.execute(CREATE_SEQUENCE_TABLE_SQL)
+            self.execute(CREATE_CHANGE_LOG_TABLE_SQL)
+            for index_sql in CREATE_CHANGE_LOG_INDEX_SQLS:
+                self.execute(index_sql)
+            self.execute(INSERT_SEQUENCE_SQL, [table_name])
+            cursor = self.db.cursor()
+            cursor.row_factory = None
+            try:
+                seq = cursor.execute(f"select seq from [{SEQUENCE_TABLE_NAME}] where table_name=?;",
+                                     [table_name]).fetchone()[0]
+                min_rowid, max_rowid = cursor.execute(f"select min(rowid), max(rowid) from [{table_name}];").fetchone()
+            finally:
+                cursor.close()
+            if min_rowid is not None:
+                start = seq + 1
+                self.execute(BACKFILL_CHANGE_LOG_SQL_TEMPLATE.format(table_name=table_name),
+                             [table_name, start, min_rowid, start, min_rowid])
+                self.execute(f"update [{SEQUENCE_TABLE_NAME}] set seq=? where table_name=?;",
+                             [start + max_rowid - min_rowid, table_name])
+            trigger_info = {"table_name": table_name, "name": table_name.replace("'", "''")}
+            for trigger_sql in CREATE_CHANGE_LOG_TRIGGER_SQL_TEMPLATES:
+                self.execute(trigger_sql.format(**trigger_info))
+            self._load_db_tables()
+        self._commit(commit)
+
+    def _is_incremental_enabled(self, table_name: str) -> bool:
+        """判断表是否已经通过 enable_incremental 安装了变更序号触发器"""
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            trigger_name = CHANGE_LOG_TRIGGER_NAME_TEMPLATE.format(table_name=table_name)
+            return cursor.execute(SELECT_TRIGGER_SQL, [trigger_name]).fetchone() is not None
+        finally:
+            cursor.close()
+
+    def _select_incremental_by_change_log(self, table_name: str, consumer: str, watermark_column: str,
+                                          watermark: Union[dict, None], select: Union[List[str], None],
+                                          limit: Union[int, None], commit: bool) -> list:
+        """select_incremental 按 insert_time/update_time 查询的部分，使用变更记录表中的序号作为水位"""
+        if not self._is_incremental_enabled(table_name):
+            raise Exception(f"按{watermark_column}增量查询前，需要先调用 enable_incremental('{table_name}')")
+        seq_column = CHANGE_LOG_SEQ_COLUMNS[watermark_column]
+        last_seq = watermark["watermark"] if watermark is not None else 0
+        # 先确定本次查询的上界，再查询上界以内的数据，保证返回的数据和保存的水位一致
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            upper = None
+            if limit:
+                upper = cursor.execute(CHANGE_LOG_UPPER_SQL_TEMPLATE.format(
+                    seq_column=seq_column, order="", offset=int(limit) - 1), [table_name, last_seq]).fetchone()
+            if upper is None:
+                upper = cursor.execute(CHANGE_LOG_UPPER_SQL_TEMPLATE.format(
+                    seq_column=seq_column, order="desc", offset=0), [table_name, last_seq]).fetchone()
+        finally:
+            cursor.close()
+        if upper is None:
+            return []
+        upper_seq, upper_rowid = upper
+        select_column = ",".join([f"t.[{column}]" for column in select]) if select else "t.*"
+        select_sql = SELECT_BY_CHANGE_LOG_SQL_TEMPLATE.format(select_column=select_column, table_name=table_name,
+                                                              seq_column=seq_column)
+        rows = self.execute(select_sql, [table_name, last_seq, upper_seq]).fetchall()
+        self._save_watermark(table_name, consumer, watermark_column, upper_seq, upper_rowid)
+        self._commit(commit)
+        return rows
+
+    def get_watermark(self, table_name: str, consumer: str) -> Union[dict, None]:
+        """
+        获取 select_incremental 保存的水位
+        :param table_name: 表名
+        :param consumer: 消费者名称
+        :return: dict(table_name,consumer,watermark_column,watermark,watermark_rowid,update_time)，没有水位时返回None
+        """
+        if WATERMARK_TABLE_NAME not in self._tables:
+            return None
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            row = cursor.execute(SELECT_WATERMARK_SQL, [table_name, consumer]).fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            return None
+        return dict(zip(["table_name", "consumer", "watermark_column", "watermark", "watermark_rowid", "update_time"],
+                        row))
+
+    def reset_watermark(self, table_name: str, consumer: str = None, commit: bool = None):
+        """
+        删除 select_incremental 保存的水位，下次增量查询时从头开始查询
+        :param table_name: 表名
+        :param consumer: 消费者名称，默认删除该表所有消费者的水位
+        :param commit: 是否立即提交
+        """
+        if WATERMARK_TABLE_NAME in self._tables:
+            where = {"table_name": table_name}
+            if consumer is not None:
+                where["consumer"] = consumer
+            self.delete(where, table_name=WATERMARK_TABLE_NAME, commit=commit)
+
+    def open_blob(self, table_name: str, column: str, row: Union[int, dict], readonly: bool = True):
+        """
+        打开一个字段的增量BLOB读写句柄(sqlite3.Blob，需要Python3.11及以上)，可以seek，read，write，不需要一次性加载整个字段，
+        注：不能改变BLOB的长度，写入前需要先通过 write_blob 或 zeroblob 分配长度
+        :param table_name: 表名
+        :param column: 字段名
+        :param row: 数据的rowid，或者用于查询rowid的where条件dict
+        :param readonly: 是否只读打开
+        """
+        if not hasattr(self.db, 'blobopen'):
+            raise Exception("增量BLOB读写需要Python3.11及以上版本")
+        return self.db.blobopen(table_name, get_column_name_by_key(column), self._get_rowid(table_name, row),
+                                readonly=readonly)
+
+    def write_blob(self, table_name: str, column: str, row: Union[int, dict], data, size: int = None,
+                   chunk_size: int = DEFAULT_BLOB_CHUNK_SIZE, commit: bool = None):
+        """
+        分块写入bytes字段，先用zeroblob分配字段长度，再通过增量BLOB句柄分块写入，适合写入大文件
+        :param table_name: 表名
+        :param column: 字段名，字段类型需要为blob，如建表时使用 'content@blob' 作为key
+        :param row: 数据的rowid，或者用于查询rowid的where条件dict
+        :param data: bytes，bytearray，memoryview等支持buffer协议的对象，或者有read方法的文件对象
+        :param size: data为文件对象时的数据长度，默认通过seek获取文件长度
+        :param chunk_size: 每次写入的字节数
+        :param commit: 是否立即提交
+        """
+        if hasattr(data, 'read'):
+            if size is None:
+                position = data.tell()
+                size = data.seek(0, os.SEEK_END) - position
+                data.seek(position)
+            chunks = iter(partial(data.read, chunk_size), b"")
+        else:
+            data = memoryview(data).cast('B')
+            size = data.nbytes
+            chunks = [data]
+        self._write_blob_chunks(table_name, column, row, size, chunks, chunk_size, commit)
+
+    def read_blob(self, table_name: str, column: str, row: Union[int, dict],
+                  chunk_size: int = DEFAULT_BLOB_CHUNK_SIZE) -> Generator[bytes, None, None]:
+        """
+        分块读取字段的原始数据，每次只加载chunk_size字节，适合将大字段写入文件或网络
+        :param table_name: 表名
+        :param column: 字段名
+        :param row: 数据的rowid，或者用于查询rowid的where条件dict
+        :param chunk_size: 每次读取的字节数
+        """
+        with self.open_blob(table_name, column, row) as blob:
+            yield from iter(partial(blob.read, chunk_size), b"")
+
+    def write_obj(self, table_name: str, column: str, row: Union[int, dict], obj,
+                  chunk_size: int = DEFAULT_BLOB_CHUNK_SIZE, commit: bool = None):
+        """
+        使用pickle protocol 5 带外缓冲区分块写入obj字段，bytearray，numpy数组等大块数据不会被复制到pickle数据中，
+        写入的数据仍可以通过 select/execute 正常读取
+        :param table_name: 表名
+        :param column: 字段名，字段类型需要为obj
+        :param row: 数据的rowid，或者用于查询rowid的where条件dict
+        :param obj: 需要保存的对象
+        :param chunk_size: 每次写入的字节数
+        :param commit: 是否立即提交
+        """
+        views = dump_obj_out_of_band(obj)
+        self._write_blob_chunks(table_name, column, row, sum(view.nbytes for view in views), views, chunk_size,
+                                commit)
+
+    def read_obj(self, table_name: str, column: str, row: Union[int, dict],
+                 chunk_size: int = DEFAULT_BLOB_CHUNK_SIZE):
+        """
+        分块读取obj字段到一块预先分配的内存中再反序列化，write_obj 保存的带外缓冲区(如numpy数组)直接引用该内存，不再复制
+        :param table_name: 表名
+        :param column: 字段名
+        :param row: 数据的rowid，或者用于查询rowid的where条件dict
+        :param chunk_size: 每次读取的字节数
+        """
+        with self.open_blob(table_name, column, row) as blob:
+            obj_byte = bytearray(len(blob))
+            view = memoryview(obj_byte)
+            for position in range(0, len(obj_byte), chunk_size):
+                view[position:position + chunk_size] = blob.read(chunk_size)
+        return convert_obj(obj_byte)
+
+    def insert_partitioned(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str,
+                           period: str = 'day', commit: bool = None, update_time: bool = None,
+                           export: bool = None, auto_alter: bool = None, chunk_size: int = 10000):
+        """
+        按insert_time将数据插入到按时间分区的表中，每个时间周期一个分区表，表名为 表名_p周期，如 log_p20210101，
+        并维护一个名为table_name的union all视图用于查询，过期数据通过 drop_partitions 整表删除
+        注：视图受SQLite compound select 数量限制(默认500)，分区数量不宜过多
+        :param data: 需要插入的dict 或者可迭代对象，没有insert_time值的数据按当前时间分区
+        :param table_name: 表名，同时也是查询所有分区数据的视图名
+        :param period: 分区周期，可选的有day，week，month
+        :param commit: 是否插入后立即执行commit
+        :param update_time: 是否给数据加入一列更新时间列
+        :param export: 是否给数据加入一列导出数据列
+        :param auto_alter: 是否自动alter表结构
+        :param chunk_size: 每次按分区分组插入的数据条数
+        """
+        if period not in PARTITION_PERIOD_FORMAT:
+            raise Exception(f"不支持的分区周期：{period}")
+        if commit is None:
+            commit = self._auto_commit
+        if isinstance(data, dict):
+            data = [data]
+        data = iter(data)
+        partitions = set(self.get_partitions(table_name))
+        new_partition = False
+        if not self.db.in_transaction:
+            # 显式开启事务，新建分区表，重建视图和写入的数据一起提交或回滚
+            self.cursor.execute(BEGIN_SQL)
+        while True:
+            chunk = list(islice(data, chunk_size))
+            if not chunk:
+                break
+            partition_data = {}
+            for d in chunk:
+                partition_data.setdefault(self._get_partition_by_dict(d, period), []).append(d)
+            for partition, rows in partition_data.items():
+                partition_table_name = PARTITION_TABLE_NAME_TEMPLATE.format(table_name=table_name,
+                                                                            partition=partition)
+                if partition_table_name not in partitions:
+                    partitions.add(partition_table_name)
+                    new_partition = True
+                columns = set(self._tables.get(partition_table_name, {}))
+                self.insert(rows, table_name=partition_table_name, commit=False, insert_time=True,
+                            update_time=update_time, export=export, auto_alter=auto_alter)
+                if columns and columns != set(self._tables[partition_table_name]):
+                    new_partition = True  # 分区表结构发生了变化，需要重建视图
+        if new_partition:
+            self._refresh_partition_view(table_name)
+        self._commit(commit)
+
+    def get_partitions(self, table_name: str) -> List[str]:
+        """
+        获取 insert_partitioned 创建的分区表名，按时间从早到晚排序
+        :param table_name: 分区视图名
+        """
+        pattern = re.compile(PARTITION_TABLE_NAME_PATTERN_TEMPLATE.format(table_name=re.escape(table_name)))
+        return sorted(name for name in self._tables if pattern.match(name))
+
+    def drop_partitions(self, table_name: str, before: Union[datetime.date, datetime.datetime] = None,
+                        keep: int = None) -> List[str]:
+        """
+        整表删除过期的分区，比逐行delete快得多且不会产生数据库文件碎片
+        :param table_name: 分区视图名
+        :param before: 删除该时间所在周期之前的所有分区
+        :param keep: 只保留最近的keep个分区
+        :return: 被删除的分区表名
+        """
+        pattern = re.compile(PARTITION_TABLE_NAME_PATTERN_TEMPLATE.format(table_name=re.escape(table_name)))
+        partitions = self.get_partitions(table_name)
+        drop_partitions = []
+        if before is not None:
+            for partition_table_name in partitions:
+                partition = pattern.match(partition_table_name).group(1)
+                period = next(p for p in ['day', 'week', 'month'] if len(
+                    before.strftime(PARTITION_PERIOD_FORMAT[p])) == len(partition))
+                if partition < before.strftime(PARTITION_PERIOD_FORMAT[period]):
+                    drop_partitions.append(partition_table_name)
+        if keep is not None:
+            drop_partitions.extend(p for p in partitions[:max(len(partitions) - keep, 0)] if p not in drop_partitions)
+        if drop_partitions:
+            for name in drop_partitions:  # 逐条execute，executescript会先提交调用方未提交的事务
+                self.execute(DROP_TABLE_SQL_TEMPLATE.format(table_name=name))
+            self.commit()
+            self._load_db_tables()
+            self._refresh_partition_view(table_name)
+            self.log.info(f"删除分区：{','.join(drop_partitions)}")
+        return drop_partitions
+
     def update(self, update: Union[dict, List[dict], Tuple[dict]], where: Union[dict, List[dict], Tuple[dict]],
-               table_name: str, commit: bool = None, update_time: bool = None, auto_alter: bool = True):
+               table_name: str, commit: bool = None, update_time: bool = None, auto_alter: bool = True,
+               skip_unchanged: bool = None) -> int:
         """
         简单的更新函数，根据传入的dict更新数据库的值，并可以选择自动填写update_time的值
-        :param update: 需要更新的字段
+        :param update: 需要更新的字段，为list时与where一一对应，字段结构相同的连续数据会合并为一次executemany执行
         :param where: 更新条件
         :param table_name: 需要更新的表名
         :param commit: 是否自动commit，可以覆盖全局的commit设置
         :param update_time: 是否自动填写更新时间，可以覆盖全局的更新时间配置
         :param auto_alter: 是否自动alter表结构
+        :param skip_unchanged: 是否跳过值没有变化的数据，通过在where中加入 [字段] is not ? 条件实现，
+        跳过的数据不会写入，update_time也保持不变，可以覆盖全局的skip_unchanged设置
+        :return: 实际更新的数据条数
         """
         if update_time is None:
             update_time = self._update_time
@@ -286,49 +1635,181 @@ class DictToDb(object):
             commit = self._auto_commit
         if auto_alter is None:
             auto_alter = self._auto_alter
+        if skip_unchanged is None:
+            skip_unchanged = self._skip_unchanged
         if table_name not in self._tables.keys():
             raise Exception(f"no table by table_name:{table_name}")
+        update_count = 0
         if isinstance(update, dict):
-            self._update(update, where, table_name=table_name, update_time=update_time,
-                         auto_alter=auto_alter)
+            update_count = self._update(update, where, table_name=table_name, update_time=update_time,
+                                        auto_alter=auto_alter, skip_unchanged=skip_unchanged)
         elif isinstance(update, (list, tuple)):
             if len(update) != len(where):
                 raise Exception(f"update 和 where参数值不匹配")
-            for count, data in enumerate(update):
-                _where = where[count]
-                self._update(data, _where, table_name=table_name, update_time=update_time,
-                             auto_alter=auto_alter)
+            update_count = self._update_many(update, where, table_name=table_name, update_time=update_time,
+                                             auto_alter=auto_alter, skip_unchanged=skip_unchanged)
         self._commit(commit)
+        return update_count
 
-    def select(self, table_name: str, select: List[str] = None, where: dict = None, select_all: bool = True):
+    def select(self, table_name: str, select: List[str] = None, where: dict = None, select_all: bool = True,
+               record_type: type = None, order_by: Union[str, List[str]] = None, group_by: Union[str, List[str]] = None,
+               limit: int = None, offset: int = None):
         """考虑到select 语句的方便程度，推荐使用 execute函数来执行查询语句,来实现更大的灵活性
-        :param select:需要查询的列
-        :param where: 查询条件
+        :param select:需要查询的列，也可以是 count(*)，sum(字段)，avg(字段) as 别名 等聚合函数，配合group_by使用
+        :param where: 查询条件，多个条件之间为and关系，运算符可以写在key中，如 {'age>':18, 'name like':'张%',
+        'id in':[1,2], 'age between':(18,30), 'phone is null':True}，也可以写在tuple类型的value中，如 {'age':('>',18)}，
+        值为None时与 = null 一致不匹配任何数据，查询空值使用 {'phone':('is', None)}，相同结构的查询条件只拼接一次SQL
         :param table_name:表名
         :param select_all:是否查询所有，若为TRUE则返回所有数据，若为False则返回一条数据
+        :param record_type: dataclass，NamedTuple 或定义了__slots__的类，设置后按类的字段查询，直接返回该类的对象
+        :param order_by: 排序字段，如 'age'，'-age'(倒序)，['age desc','name']
+        :param group_by: 分组字段
+        :param limit: 最多返回的条数
+        :param offset: 跳过的条数
         """
-        select_sql = self._get_select_sql(table_name, select, where)
-        if where:
-            select_value = self._adapt_dict_value(where, table_name)
-            result = self.execute(select_sql, select_value)
-        else:
-            result = self.execute(select_sql)
+        result = self._select_cursor(table_name, select, where, record_type, order_by=order_by, group_by=group_by,
+                                     limit=limit, offset=offset)
+        if record_type is not None:
+            factory = get_record_factory(record_type)
+            if select_all:
+                return [factory(row) for row in result.fetchall()]
+            row = result.fetchone()
+            return None if row is None else factory(row)
         if select_all:
             return result.fetchall()
         else:
             return result.fetchone()
 
-    def delete(self, where: dict, table_name: str, commit: bool = None):
+    def select_iter(self, table_name: str, select: List[str] = None, where: dict = None, chunk_size: int = 1000,
+                    record_type: type = None, order_by: Union[str, List[str]] = None,
+                    group_by: Union[str, List[str]] = None, limit: int = None, offset: int = None) -> Generator:
+        """
+        以生成器的方式逐条返回查询结果，每次从数据库读取chunk_size条，参数同select
+        :param chunk_size: 每次从数据库读取的条数
+        """
+        result = self._select_cursor(table_name, select, where, record_type, order_by=order_by, group_by=group_by,
+                                     limit=limit, offset=offset)
+        factory = get_record_factory(record_type) if record_type is not None else None
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            if factory is not None:
+                yield from map(factory, rows)
+            else:
+                yield from rows
+
+    def select_columns(self, table_name: str, select: List[str] = None, where: dict = None,
+                       chunk_size: int = 10000) -> dict:
+        """
+        按列返回查询结果，数值类型(integer,double,boolean)的字段根据建表时声明的类型返回numpy数组(需安装numpy)
+        或array.array，其他类型的字段返回list，避免每行数据都创建一个dict
+        :param table_name:表名
+        :param select:需要查询的列
+        :param where: 查询条件
+        :param chunk_size:每次从数据库读取的行数
+        :return: {字段名: 该字段的所有值}
+        """
+        select_sql, select_value = self._get_filter_select_sql(table_name, select, where)
+        column_types = {name: info['type'] for name, info in self._tables.get(table_name, {}).items()}
+        return self.execute_columns(select_sql, select_value, column_types=column_types, chunk_size=chunk_size)
+
+    def execute_columns(self, sql: str, parameters: Iterable = (), column_types: Dict[str, str] = None,
+                        chunk_size: int = 10000) -> dict:
+        """
+        执行查询SQL，并按列返回查询结果，数值类型的字段返回numpy数组(需安装numpy)或array.array，其他类型的字段返回list；
+        数值字段中的空值：double字段为NaN，integer和boolean字段返回空值位置被mask的numpy.ma.MaskedArray，
+        未安装numpy时返回空值为NaN的double类型array.array
+        :param sql: 查询的sql语句
+        :param parameters: sql 占位符参数的值
+        :param column_types: 指定字段的数据库类型，如{'age':'integer'}，没有指定的字段根据查询出的第一个非空值判断类型
+        :param chunk_size:每次从数据库读取的行数
+        :return: {字段名: 该字段的所有值}
+        """
+        if self._check_same_thread:
+            columns, null_masks = self._execute_columns(sql, parameters, column_types or {}, chunk_size)
+        else:
+            try:
+                self.lock.acquire(timeout=50)
+                columns, null_masks = self._execute_columns(sql, parameters, column_types or {}, chunk_size)
+            finally:
+                self.lock.release()
+        numpy = import_numpy()
+        for name, values in columns.items():
+            if not isinstance(values, array.array):
+                continue
+            null_mask = null_masks.get(name) if values.typecode != 'd' else None  # double字段的空值已经是NaN
+            if numpy is not None:
+                columns[name] = numpy.frombuffer(values, dtype=ARRAY_TYPECODE_NUMPY_DTYPE[values.typecode])
+                if null_mask is not None:
+                    columns[name] = numpy.ma.masked_array(columns[name], mask=numpy.frombuffer(null_mask, dtype=bool))
+            elif null_mask is not None:
+                nan = ARRAY_TYPECODE_NULL_VALUE['d']
+                columns[name] = array.array('d', [nan if is_null else value for value, is_null in zip(values, null_mask)])
+        return columns
+
+    def get_many(self, table_name: str, key_columns: Union[str, List[str]], keys: Iterable,
+                 select: List[str] = None, select_all: bool = False) -> dict:
+        """
+        根据多个key值批量查询数据，单字段key按 in 语句分批查询，联合key通过临时表join查询，避免逐个key调用select
+        :param table_name:表名
+        :param key_columns:key所在的字段名，多个字段组成的联合key用list表示
+        :param keys:需要查询的key值集合，联合key时每个key值为与key_columns顺序一致的tuple
+        :param select:需要查询的列，默认查询所有列，key_columns会自动加入查询列
+        :param select_all:每个key是否返回所有匹配的数据(list)，默认只返回第一条匹配的数据
+        :return: {key: 查询结果}，没有查询到数据的key不会出现在返回结果中
+        """
+        composite_key = not isinstance(key_columns, str)
+        key_columns = list(key_columns) if composite_key else [key_columns]
+        if select is not None:
+            select = list(select) + [column for column in key_columns if column not in select]
+        keys = list(dict.fromkeys(keys))
+        result = {}
+        if not keys:
+            return result
+        if composite_key:
+            self._get_many_by_temp_table(table_name, key_columns, keys, select, select_all, result)
+        else:
+            for start in range(0, len(keys), self._max_variable_number):
+                chunk_keys = keys[start:start + self._max_variable_number]
+                select_sql = self._get_select_in_sql(table_name, select, key_columns[0], len(chunk_keys))
+                cursor = self.execute(select_sql, chunk_keys)
+                self._group_rows_by_key(cursor.description, cursor.fetchall(), key_columns, composite_key,
+                                        select_all, result)
+        return result
+
+    def search(self, table_name: str, query: str, limit: int = 10, select: List[str] = None) -> list:
+        """
+        通过FTS5全文索引搜索数据，按相关度从高到低返回，需要建表时给字段加上#fts描述，如 {'content#fts':'...'}
+        :param table_name:表名
+        :param query:FTS5 全文搜索语句，如 'python AND sqlite'
+        :param limit:返回的最大条数
+        :param select:需要查询的列，默认查询所有列
+        """
+        fts_table_name = FTS_TABLE_NAME_TEMPLATE.format(table_name=table_name)
+        if fts_table_name not in self._virtual_tables:
+            raise Exception(f"表{table_name}没有全文索引字段")
+        select_column = ",".join([f"t.[{column}]" for column in select]) if select else "t.*"
+        search_sql = SEARCH_SQL_TEMPLATE.format(select_column=select_column, fts_table_name=fts_table_name,
+                                                table_name=table_name)
+        return self.execute(search_sql, [query, limit]).fetchall()
+
+    def delete(self, where: Union[dict, List[dict], Tuple[dict]], table_name: str, commit: bool = None):
         """考虑到 delete语句的方便程度，推荐使用 execute函数来执行查询语句
         :param table_name:表名
-        :param where:查询条件
+        :param where:查询条件，写法同select的where参数，也可以是查询条件的list，只有单个相同字段的等于条件时按 in 语句分批删除，
+        否则按查询条件结构分组executemany删除
         :param commit:是否立即提交
         """
         if commit is None:
             commit = self._auto_commit
-        delete_sql = self._get_delete_sql(table_name, where)
-        delete_value = self._adapt_dict_value(where, table_name)
-        self.execute(delete_sql, delete_value)
+        if isinstance(where, dict):
+            where_sql, delete_value = self._compile_filter(table_name, where)
+            self.execute(self._get_delete_sql(table_name, where_sql), delete_value)
+        elif isinstance(where, (list, tuple)):
+            self._delete_many(where, table_name)
+        else:
+            raise Exception("不支持的类型 Unsupported type")
         self._commit(commit)
 
     def _get_sheet_args(self, args_info, sheet_count, sheet_name, args_name, default_return=None):
@@ -382,6 +1863,7 @@ class DictToDb(object):
         """
         start_time = time.time()
         self.log.info(f"加载 {excel} 并保存到db中....")
+        from openpyxl import load_workbook  # 只在使用Excel相关函数时才导入openpyxl，加快导入速度
         wb = load_workbook(excel, read_only=True)
         try:
             sheet_names = wb.sheetnames
@@ -458,7 +1940,9 @@ class DictToDb(object):
                            data_row_start_index: Union[Dict[str, int], List[int]] = None,
                            columns_desc: Union[Dict[str, dict], List[dict]] = None,
                            columns_pretreatment_function: Dict[str, Dict[str, Callable]] = None,
-                           appends_data: Dict[str, dict] = None, ignore_error=None, export_sheet: List[str] = None):
+                           appends_data: Dict[str, dict] = None, ignore_error=None, export_sheet: List[str] = None,
+                           columns: List[str] = None, row_range: Tuple[int, int] = None, limit: int = None,
+                           predicate: Callable[[dict], bool] = None):
         """
         将结构比较单一Excel数据 转化为dict 格式返回，用生成器的方式
         每个sheet 内容行第一行为字段名，后续的[1:]行则会保存到数据库
@@ -474,9 +1958,15 @@ class DictToDb(object):
         :param appends_data: 插入Excel不包含的额外的数据列到数据库中，如给sheet1中的每行数据多插入一条 age数据：{'sheet1':{'age@text#pk':33}}
         :param ignore_error: 是否在单次保存中忽略某些异常以保证，文件数据全部保存到Excel中
         :param export_sheet:导出数据的Excel sheet 集合,默认导出所有sheet的数据
+        :param columns:只读取并返回这些列，值为标题名或大写的Excel列名(如A,B,AA)，默认返回所有列，
+        sheet中不存在的列会被忽略，一列都不存在的sheet不返回数据
+        :param row_range:只读取该范围内的Excel行(包含首尾)，如(2,1001)，默认读取到最后一行
+        :param limit:最多返回的数据条数(所有sheet合计)，达到后不再读取Excel
+        :param predicate:过滤函数，参数为每行返回的dict，返回False的数据不返回
         """
         start_time = time.time()
         self.log.info(f"加载 {excel} 并通过生成器方式返回 dict")
+        from openpyxl import load_workbook
         wb = load_workbook(excel, read_only=True)
         try:
             sheet_names = wb.sheetnames
@@ -500,38 +1990,58 @@ class DictToDb(object):
                                                                sheet_column_desc, sheet_append_data, sheet_name)
                 if not column_names:
                     continue
-                for count, row in enumerate(ws.rows):
+                if columns:
+                    column_indexes = self._get_excel_column_indexes(columns, first_column_names)
+                    if not column_indexes:
+                        continue
+                else:
+                    column_indexes = list(range(len(column_names)))
+                min_col = column_indexes[0] + 1
+                min_row = sheet_data_row_start_index
+                max_row = None
+                if row_range:
+                    min_row = max(min_row, row_range[0])
+                    max_row = row_range[1]
+                # 只读取需要的行和列，read_only模式下openpyxl不会解析范围外的单元格
+                rows = ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col,
+                                    max_col=column_indexes[-1] + 1, values_only=True)
+                for count, row in enumerate(rows, start=min_row - 1):
                     try:
                         total_count += 1
-                        if count >= sheet_data_row_start_index - 1:
-                            data = {}
-                            blank_line = True  # 判断数据是不是全空
-                            for cell_count, cell in enumerate(row):
-                                cell_value = cell.value
-                                first_column_name = first_column_names[cell_count]
-                                columns_func = sheet_columns_pretreatment_function.get(
-                                    first_column_name)
-                                if cell_value is None:
-                                    cell_value = ""
-                                if transform_string and columns_func is None:
-                                    cell_value = str(cell_value)
-                                if cell_value:
-                                    blank_line = False
-                                    if columns_func:
-                                        cell_value = columns_func(cell_value)
-                                data[column_names[cell_count]] = cell_value
-                            if not blank_line:
-                                if appends_data:
-                                    data.update(sheet_append_data)
-                                data['from_sheet'] = sheet_name
-                                data['excel_row_index'] = count + 1
-                                save_count += 1
-                                yield data
+                        data = {}
+                        blank_line = True  # 判断数据是不是全空
+                        for cell_count in column_indexes:
+                            cell_value = row[cell_count - min_col + 1] if cell_count - min_col + 1 < len(row) else None
+                            first_column_name = first_column_names[cell_count]
+                            columns_func = sheet_columns_pretreatment_function.get(
+                                first_column_name)
+                            if cell_value is None:
+                                cell_value = ""
+                            if transform_string and columns_func is None:
+                                cell_value = str(cell_value)
+                            if cell_value:
+                                blank_line = False
+                                if columns_func:
+                                    cell_value = columns_func(cell_value)
+                            data[column_names[cell_count]] = cell_value
+                        if not blank_line:
+                            if appends_data:
+                                data.update(sheet_append_data)
+                            data['from_sheet'] = sheet_name
+                            data['excel_row_index'] = count + 1
+                            if predicate and not predicate(data):
+                                continue
+                            save_count += 1
+                            yield data
+                            if limit is not None and save_count >= limit:
+                                break
                     except Exception as e:
                         if ignore_error and isinstance(e, ignore_error):
                             self.log.debug(e)
                         else:
                             raise e
+                if limit is not None and save_count >= limit:
+                    break
                 self._commit(commit=True)
             self.log.info(f"加载{total_count}条，返回{save_count}条，共耗时：{round((time.time() - start_time), 2)} S")
         finally:
@@ -540,7 +2050,7 @@ class DictToDb(object):
     def change_excel_data(self, excel: Union[str, Path], change_data: Union[List[dict], dict], sheet_name: str,
                           title_row_index: Union[Dict[str, int], List[int]] = None, ):
         """
-        修改Excel的数据
+        修改Excel的数据，需要多次修改同一个Excel时，推荐使用 excel_patch_session 只加载和保存一次Excel
         :param excel: 需要改动的Excel路径
         :param change_data:需要改动的数据，可以是dict，也可以是dict的list 但是其中的每个dict里面都必须包含字段excel_row_index，来描述要改动数据的位置
         :param sheet_name:需要改动的sheet_name
@@ -551,34 +2061,37 @@ class DictToDb(object):
             change_data = [change_data]
         if 'excel_row_index' not in change_data[0].keys():
             raise Exception("没有指定填写数据的row index 无法填写")
-        wb = load_workbook(excel)
-        change_count = 0
-        try:
-            for sheet_count, s_name in enumerate(wb.sheetnames):
-                ws = wb[sheet_name]
-                sheet_title_index = self._get_sheet_args(title_row_index, sheet_count, sheet_name, 'title_row_index', 1)
-                if excel not in self._excel_title_index.keys():
-                    self._get_create_table_dict_by_excel_sheet(excel, ws, True, sheet_title_index, 2, True, {}, {},
-                                                               sheet_name)
-                if s_name != sheet_name:
-                    continue
-                for data in change_data:
-                    row_index = data['excel_row_index']
-                    for k, value in data.items():
-                        if k == 'excel_row_index':
-                            continue
-                        if k in self._excel_title_index[excel][sheet_name].keys():
-                            column_index = self._excel_title_index[excel][sheet_name][k]
-                        elif self._re_pattern['excel_title_str'].match(k):
-                            column_index = get_index_by_excel_title(k)
-                        else:
-                            raise Exception("无法准确找到Excel 值的 column index")
-                        ws.cell(column=int(column_index), row=int(row_index), value=value)
-                        change_count += 1
-            wb.save(excel)
-            self.log.info(f"修改Excel数据成功！共改动{change_count}个单元格，耗时{time.time() - start_time}S 到Excel：{excel}")
-        finally:
-            wb.close()
+        with self.excel_patch_session(excel, title_row_index=title_row_index) as session:
+            change_count = session.change(change_data, sheet_name)
+        self.log.info(f"修改Excel数据成功！共改动{change_count}个单元格，耗时{time.time() - start_time}S 到Excel：{excel}")
+
+    def excel_patch_session(self, excel: Union[str, Path],
+                            title_row_index: Union[Dict[str, int], List[int], int] = None,
+                            data_row_start_index: Union[Dict[str, int], List[int], int] = None):
+        """
+        打开一次Excel，批量修改多个sheet的数据，最后只保存一次，用法：
+            with db.excel_patch_session('a.xlsx') as session:
+                session.change([{'excel_row_index': 2, 'name': '张三'}], 'sheet1')
+                session.change([{'user_id': 1, 'age': 18}], 'sheet2', key_column='user_id')
+        :param excel: 需要改动的Excel路径
+        :param title_row_index: 每个sheet标题列所在的位置，默认为Excel中的第一行 如：{"sheet1":3}，也可以为所有sheet指定同一个int值
+        :param data_row_start_index: 每个sheet数据列起始位置，默认为标题的下一行，按key_column查找数据时使用
+        """
+        return ExcelPatchSession(excel, title_row_index=title_row_index, data_row_start_index=data_row_start_index,
+                                 log=self.log)
+
+    @staticmethod
+    def _get_excel_column_indexes(columns: List[str], first_column_names: List[str]) -> List[int]:
+        """根据标题名或Excel列名(如A,B,AA)获取列的index(从0开始)，当前sheet中不存在的列会被忽略"""
+        column_indexes = set()
+        for column in columns:
+            if column in first_column_names:
+                column_indexes.add(first_column_names.index(column))
+            elif EXCEL_COLUMN_LETTER_PATTERN.match(column):
+                index = get_index_by_excel_title(column) - 1
+                if index < len(first_column_names):
+                    column_indexes.add(index)
+        return sorted(column_indexes)
 
     def select_and_save_excel(self, sql: str, excel: str = None, transform_string: bool = True,
                               sql_value: Iterable = None, not_save_column: list = None,
@@ -591,11 +2104,13 @@ class DictToDb(object):
         :param transform_string:是否将数据库中的值转化为字符串存储到Excel中
         :param sql_value:sql 位置参数的值
         :param not_save_column 查询出来字段中，不保存到Excel的字段
-        :param auto_update_export 【不常见使用方法，可以不了解】是否自动更新导出后数据的export字段的值
+        :param auto_update_export 【不常见使用方法，可以不了解】是否自动更新导出后数据的export字段的值，
+        增量导出推荐使用 select_incremental，不需要回写源数据
         :param update_export_by_column 【不常见使用方法，可以不了解】根据哪些字段做where条件自动更新export的值
         :param update_export_table_name 【不常见使用方法，可以不了解】根据自动更新哪个表 export的值
         """
         not_save_column = set(not_save_column) if not_save_column else set()
+        from openpyxl import Workbook
         wb = Workbook(write_only=True)
         ws = wb.create_sheet("sheet1")
         ws.freeze_panes = "A2"
@@ -625,6 +2140,56 @@ class DictToDb(object):
         else:
             print(f"当前查询无数据导出...")
 
+    def select_to_csv(self, sql: str, path: str = None, sql_value: Iterable = None, not_save_column: list = None,
+                      compress: bool = None, chunk_size: int = 10000, encoding: str = 'utf-8-sig') -> int:
+        """
+        从数据库流式导出数据到CSV文件，每次从游标读取chunk_size条写入文件，内存占用不随数据量增长，没有Excel的行数限制
+        list，dict 字段按json，tuple，set 字段按str，bytes 字段按base64编码，None 导出为空字符串
+        :param sql: 查询的sql语句
+        :param path: CSV文件路径，如果为None，则导出文件名格式为：f 'dict_to_db_export_{datetime.now()}.csv'
+        :param sql_value: sql 位置参数的值
+        :param not_save_column: 查询出来字段中，不保存到CSV的字段
+        :param compress: 是否使用gzip压缩，默认根据文件路径是否以.gz结尾判断
+        :param chunk_size: 每次从数据库读取的条数
+        :param encoding: 文件编码，默认带BOM的utf-8，以便Excel直接打开
+        :return: 导出的数据条数
+        """
+        if path is None:
+            path = f'dict_to_db_export_{datetime.datetime.now().strftime("%Y-%m-%d %H时%M点%S分")}.csv'
+
+        def write_rows(file, column_names, rows):
+            writer = csv.writer(file)
+            writer.writerow(column_names)
+            for row in rows:
+                writer.writerow([encode_export_value(value) for value in row])
+
+        return self._select_to_file(sql, path, sql_value, not_save_column, compress, chunk_size, encoding, write_rows)
+
+    def select_to_jsonl(self, sql: str, path: str = None, sql_value: Iterable = None, not_save_column: list = None,
+                        compress: bool = None, chunk_size: int = 10000, encoding: str = 'utf-8') -> int:
+        """
+        从数据库流式导出数据到JSON Lines文件，每行一条数据，每次从游标读取chunk_size条写入文件，内存占用不随数据量增长
+        时间字段按str，set 字段按list，bytes 字段按base64编码
+        :param sql: 查询的sql语句
+        :param path: 文件路径，如果为None，则导出文件名格式为：f 'dict_to_db_export_{datetime.now()}.jsonl'
+        :param sql_value: sql 位置参数的值
+        :param not_save_column: 查询出来字段中，不保存到文件的字段
+        :param compress: 是否使用gzip压缩，默认根据文件路径是否以.gz结尾判断
+        :param chunk_size: 每次从数据库读取的条数
+        :param encoding: 文件编码
+        :return: 导出的数据条数
+        """
+        if path is None:
+            path = f'dict_to_db_export_{datetime.datetime.now().strftime("%Y-%m-%d %H时%M点%S分")}.jsonl'
+        encoder = json.JSONEncoder(ensure_ascii=False, default=encode_json_value)
+
+        def write_rows(file, column_names, rows):
+            for row in rows:
+                file.write(encoder.encode(dict(zip(column_names, row))))
+                file.write('\n')
+
+        return self._select_to_file(sql, path, sql_value, not_save_column, compress, chunk_size, encoding, write_rows)
+
     def get_table_sql_by_dict(self, data: dict, table_name: str = None, insert_time: bool = False,
                               update_time: bool = False, export: bool = False):
         """
@@ -644,11 +2209,22 @@ class DictToDb(object):
         :param sql:sql
         """
         if self._check_same_thread:
-            return self.cursor.execute(sql, *args, **kwargs)
+            return self._execute(sql, *args, **kwargs)
         else:
             try:
                 self.lock.acquire(timeout=50)
-                return self.cursor.execute(sql, *args, **kwargs)
+                return self._execute(sql, *args, **kwargs)
+            finally:
+                self.lock.release()
+
+    def _execute_without_result_cache(self, sql: str, *args, **kwargs):
+        """执行SQL语句，查询语句也不经过查询结果缓存"""
+        if self._check_same_thread:
+            return self._timing_execute(self.cursor.execute, sql, *args, **kwargs)
+        else:
+            try:
+                self.lock.acquire(timeout=50)
+                return self._timing_execute(self.cursor.execute, sql, *args, **kwargs)
             finally:
                 self.lock.release()
 
@@ -659,15 +2235,16 @@ class DictToDb(object):
         :param sql:sql
         """
         if self._check_same_thread:
-            return self.cursor.executemany(sql, *args, **kwargs)
+            return self._timing_execute(self.cursor.executemany, sql, *args, **kwargs)
         else:
             try:
                 self.lock.acquire(timeout=50)
-                return self.cursor.executemany(sql, *args, **kwargs)
+                return self._timing_execute(self.cursor.executemany, sql, *args, **kwargs)
             finally:
                 self.lock.release()
 
-    def create_function(self, name: str, num_params: int, func: Callable, deterministic: bool = False):
+    def create_function(self, name: str, num_params: int, func: Callable, deterministic: bool = False,
+                        memoize: int = 0):
         """
         创建一个可以在 SQL 语句中使用的用户自定义函数
         :param name:函数名
@@ -675,7 +2252,13 @@ class DictToDb(object):
         :param func:func 是一个 Python 可调用对象，它将作为 SQL 函数被调用
         :param deterministic:如果 deterministic 为真值，则所创建的函数将被标记为 deterministic，这允许 SQLite 执行额外的优化。
          此旗标在 SQLite 3.8.3 或更高版本中受到支持，如果在旧版本中使用将引发 NotSupportedError
+        :param memoize:给deterministic函数缓存的最近调用结果的条数，相同参数的重复调用直接返回缓存结果，默认为0 不缓存，
+         缓存命中情况可以通过 get_function_cache_info 获取
         """
+        if memoize:
+            if not deterministic:
+                raise Exception("只有deterministic函数才能缓存调用结果")
+            func = self._memoize_function(name, func, memoize)
         if self._check_same_thread:
             self.db.create_function(name, num_params, func, deterministic=deterministic)
         else:
@@ -686,10 +2269,181 @@ class DictToDb(object):
                 self.lock.release()
         # self.cursor = self.db.cursor() #这里不用执行这行语句也能生效
 
+    def create_aggregate(self, name: str, num_params: int, aggregate_class):
+        """
+        创建一个可以在 SQL 语句中使用的用户自定义聚合函数
+        :param name:函数名
+        :param num_params:该函数所接受的形参个数（如果 num_params 为 -1，则该函数可接受任意数量的参数）
+        :param aggregate_class:聚合类，需要实现 step 方法(接受num_params个参数)和 finalize 方法(返回聚合结果)
+        """
+        if self._check_same_thread:
+            self.db.create_aggregate(name, num_params, aggregate_class)
+        else:
+            try:
+                self.lock.acquire(timeout=50)
+                self.db.create_aggregate(name, num_params, aggregate_class)
+            finally:
+                self.lock.release()
+
+    def create_window_function(self, name: str, num_params: int, aggregate_class):
+        """
+        创建一个可以在 SQL 语句中使用的用户自定义聚合窗口函数，需要 Python 3.11 及 SQLite 3.25.0 或更高版本
+        :param name:函数名
+        :param num_params:该函数所接受的形参个数（如果 num_params 为 -1，则该函数可接受任意数量的参数）
+        :param aggregate_class:聚合窗口类，需要实现 step，value，inverse，finalize 方法
+        """
+        if not hasattr(self.db, "create_window_function"):
+            raise sqlite3.NotSupportedError("当前Python版本不支持 create_window_function，需要Python 3.11及以上版本")
+        if self._check_same_thread:
+            self.db.create_window_function(name, num_params, aggregate_class)
+        else:
+            try:
+                self.lock.acquire(timeout=50)
+                self.db.create_window_function(name, num_params, aggregate_class)
+            finally:
+                self.lock.release()
+
+    def get_function_cache_info(self, name: str = None) -> dict:
+        """
+        获取create_function 设置了memoize的函数的调用结果缓存使用情况
+        :param name: 函数名，默认返回所有函数的缓存使用情况 {函数名: 缓存使用情况}
+        :return: hits(命中次数)，misses(未命中次数)，size(当前缓存条数)，max_size(缓存容量)
+        """
+        if name is not None:
+            return self._function_caches[name].info()
+        return {function_name: cache.info() for function_name, cache in self._function_caches.items()}
+
+    def write_batch(self, func: Callable, *args, max_retries: int = 10, base_delay: float = 0.01,
+                    max_delay: float = 1.0, **kwargs):
+        """
+        在一个 BEGIN IMMEDIATE 写事务中执行func(*args, **kwargs)，多个进程同时写入同一个数据库文件时，
+        先获取写锁再写入，避免读锁升级为写锁时的死锁，遇到SQLITE_BUSY(database is locked)时回滚并按带随机抖动的
+        指数退避时间重试整个func，func中的insert/update等方法不会单独commit，由write_batch统一提交，
+        自动建表和alter也在同一个事务中执行，回滚时一起撤销，获取写锁时不使用连接的busy timeout，等待时间只由重试参数决定
+        注：func需要可以安全地重复执行；调用前不能有未提交的事务(如commit=False写入的数据)，否则抛出异常
+        :param func: 需要在写事务中执行的函数
+        :param max_retries: 最多重试次数，超过后抛出最后一次的异常
+        :param base_delay: 第一次重试前等待的时间(秒)，之后每次翻倍
+        :param max_delay: 每次重试前最多等待的时间(秒)
+        :return: func的返回值
+        """
+        if self._write_batch_depth:  # 嵌套调用时直接在外层事务中执行
+            return func(*args, **kwargs)
+        if self.lock is not None:
+            self.lock.acquire(timeout=50)
+        try:
+            if self.db.in_transaction:
+                raise Exception("存在未提交的事务，请先commit或rollback后再调用write_batch")
+            for attempt in range(max_retries + 1):
+                start_time = time.perf_counter()
+                lock_start_time = None
+                self._write_batch_depth += 1
+                try:
+                    # 获取写锁时不使用连接的busy timeout阻塞等待，等待时间只由max_retries，base_delay控制
+                    busy_timeout = self._set_busy_timeout(0)
+                    try:
+                        self.cursor.execute(BEGIN_IMMEDIATE_SQL)
+                    finally:
+                        self._set_busy_timeout(busy_timeout)
+                    lock_start_time = time.perf_counter()
+                    self._write_contention["wait_time"] += lock_start_time - start_time
+                    self._reload_tables_if_schema_changed()  # 其他进程可能已经建表或alter
+                    result = func(*args, **kwargs)
+                    self.db.commit()
+                    self._tables_loaded_in_transaction = False
+                    self._write_contention["transactions"] += 1
+                    return result
+                except sqlite3.OperationalError as e:
+                    self._rollback()
+                    if not is_busy_error(e):
+                        raise e
+                    self._write_contention["busy"] += 1
+                    if attempt >= max_retries:
+                        self._write_contention["failed"] += 1
+                        raise e
+                    delay = min(max_delay, base_delay * 2 ** attempt)
+                    delay = random.uniform(delay / 2, delay)
+                    self._write_contention["retries"] += 1
+                    self._write_contention["wait_time"] += time.perf_counter() - start_time + delay
+                    self.log.debug(f"数据库被其他连接锁定，{delay:.3f}秒后第{attempt + 1}次重试")
+                    time.sleep(delay)
+                except BaseException:
+                    self._rollback()
+                    raise
+                finally:
+                    self._write_batch_depth -= 1
+                    if lock_start_time is not None:
+                        self._write_contention["lock_time"] += time.perf_counter() - lock_start_time
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def _set_busy_timeout(self, busy_timeout: int) -> int:
+        """设置连接的busy timeout(毫秒)，返回原来的值"""
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            old_busy_timeout = cursor.execute(BUSY_TIMEOUT_SQL).fetchone()[0]
+            cursor.execute(f"{BUSY_TIMEOUT_SQL[:-1]} = {int(busy_timeout)};")
+        finally:
+            cursor.close()
+        return old_busy_timeout
+
+    def _rollback(self):
+        """回滚当前事务，回滚会撤销事务中的写入，建表和alter，需要重新读取表结构并使查询结果缓存失效"""
+        if self.db.in_transaction:
+            self.db.rollback()
+        if self._tables_loaded_in_transaction:  # 事务中执行过建表或alter，回滚后表结构需要重新读取
+            self._tables_loaded_in_transaction = False
+            self._load_db_tables()
+            self._created_indexes.clear()
+        self._schema_version += 1
+
+    def _reload_tables_if_schema_changed(self):
+        """数据库的schema_version和上次读取时不一致时(如其他进程建表或alter)，重新读取表结构"""
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            schema_version = cursor.execute(SCHEMA_VERSION_SQL).fetchone()[0]
+        finally:
+            cursor.close()
+        if schema_version != self._loaded_schema_version:
+            self._load_db_tables()
+            self._loaded_schema_version = schema_version
+            self._schema_version += 1
+
+    def get_write_contention_info(self, reset: bool = False) -> dict:
+        """
+        获取 write_batch 的写锁竞争统计
+        :param reset: 是否在返回后清零统计
+        :return: transactions(成功提交的事务数)，busy(遇到SQLITE_BUSY的次数)，retries(重试次数)，
+        failed(重试次数用完仍失败的次数)，wait_time(等待写锁的总时间，秒)，lock_time(获取写锁后到提交或回滚的总时间，秒)
+        """
+        info = dict(self._write_contention)
+        if reset:
+            for key in self._write_contention:
+                self._write_contention[key] = 0 if isinstance(self._write_contention[key], int) else 0.0
+        return info
+
+    def rollback(self):
+        """
+        给外层用户使用的rollback函数，回滚后重新读取表结构，并使查询结果缓存失效
+        """
+        if self._check_same_thread:
+            self._rollback()
+        else:
+            try:
+                self.lock.acquire(timeout=50)
+                self._rollback()
+            finally:
+                self.lock.release()
+
     def commit(self):
         """
-        给外层用户使用的commit函数
+        给外层用户使用的commit函数，在write_batch中调用时不生效，由write_batch统一提交
         """
+        if self._write_batch_depth:
+            return
         if self._check_same_thread:
             self.db.commit()
         else:
@@ -698,33 +2452,462 @@ class DictToDb(object):
                 self.db.commit()
             finally:
                 self.lock.release()
+        self._tables_loaded_in_transaction = False
 
     def executescript(self, sql: str):
         if self._check_same_thread:
-            return self.cursor.executescript(sql)
+            return self._timing_execute(self.cursor.executescript, sql)
         else:
             try:
                 self.lock.acquire(timeout=50)
-                return self.cursor.executescript(sql)
+                return self._timing_execute(self.cursor.executescript, sql)
+            finally:
+                self.lock.release()
+
+    def get_sql_cache_info(self) -> dict:
+        """
+        获取内部SQL语句缓存的使用情况，返回 hits(命中次数)，misses(未命中次数)，size(当前缓存条数)，
+        max_size(每种操作的缓存容量)，kinds(每种操作各自的缓存使用情况)
+        """
+        return self._sql_cache.info()
+
+    def get_result_cache_info(self) -> dict:
+        """
+        获取查询结果缓存的使用情况，返回 hits(命中次数)，misses(未命中次数)，size(当前缓存条数)，max_size(缓存容量)
+        """
+        if self._result_cache is None:
+            return {"hits": 0, "misses": 0, "size": 0, "max_size": 0}
+        return self._result_cache.info()
+
+    def clear_result_cache(self):
+        """
+        清空查询结果缓存
+        """
+        if self._result_cache is not None:
+            self._result_cache.clear()
+
+    def get_slow_sql_log(self, clear: bool = False) -> List[dict]:
+        """
+        获取慢SQL记录，需要在初始化时设置 slow_sql_threshold 参数才会记录
+        每条记录包含：sql(归一化后的SQL)，param_count(参数个数)，duration(耗时 秒)，query_plan(执行计划)，
+        execute_time(执行时间)
+        :param clear: 获取后是否清空已有的慢SQL记录
+        """
+        slow_sql_log = list(self._slow_sql_log)
+        if clear:
+            self._slow_sql_log.clear()
+        return slow_sql_log
+
+    def snapshot(self, path: str = None, commit: bool = True) -> bool:
+        """
+        通过SQLite online backup 将当前数据库保存到快照文件，先写入临时文件再替换，保存过程中异常退出不会损坏已有的快照
+        注：连接上有未提交的写事务时backup会一直等待，因此有未提交的写入时先提交再保存，或者跳过本次快照
+        :param path: 快照文件路径，默认为初始化时设置的snapshot参数
+        :param commit: 有未提交的写入时是否先commit再保存快照，为False时跳过本次快照，write_batch执行中始终跳过
+        :return: 是否保存了快照
+        """
+        path = path or self._snapshot
+        if path is None:
+            raise Exception("没有指定快照文件路径")
+        if self.lock is not None and not self.lock.acquire(timeout=50):
+            raise Exception("获取数据库连接锁超时，无法保存快照")
+        try:
+            if self.db.in_transaction:
+                if not commit or self._write_batch_depth:
+                    self.log.info(f"有未提交的写入，跳过本次快照：{path}")
+                    return False
+                self.db.commit()
+            start_time = time.time()
+            temp_path = f"{path}.tmp"
+            target = sqlite3.connect(temp_path)
+            try:
+                self.db.backup(target, pages=self._snapshot_pages)
             finally:
+                target.close()
+        finally:
+            if self.lock is not None:
                 self.lock.release()
+        os.replace(temp_path, path)
+        self.log.debug(f"保存快照到：{path}，耗时{round(time.time() - start_time, 4)}S")
+        return True
 
     def close(self):
         """
-        执行commit后关闭数据库连接
+        执行commit后关闭数据库连接，设置了snapshot参数时，关闭前会保存一次快照
         """
-        if self._check_same_thread:
+        self._snapshot_stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        if self._snapshot is not None:
+            self.commit()
+            self.snapshot()
+        if self.lock is not None and not self.lock.acquire(timeout=50):
+            raise Exception("获取数据库连接锁超时，无法关闭数据库连接")
+        try:
             self.db.commit()
             self.cursor.close()
             self.db.close()
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def _load_snapshot(self, path: str):
+        """从快照文件加载数据到内存数据库"""
+        source = sqlite3.connect(path)
+        try:
+            source.backup(self.db)
+        finally:
+            source.close()
+        self.log.debug(f"从快照加载数据：{path}")
+
+    def _snapshot_loop(self, interval: float):
+        """后台线程定时保存快照，直到close被调用"""
+        while not self._snapshot_stop.wait(interval):
+            try:
+                self.snapshot(commit=False)  # 后台线程不提交用户未提交的写入，有未提交的写入时跳过本次快照
+            except Exception as e:
+                self.log.warning(f"保存快照失败：{e}")
+
+    def _memoize_function(self, name: str, func: Callable, max_size: int) -> Callable:
+        """给用户自定义函数加上LRU结果缓存"""
+        cache = LruCache(max_size)
+        self._function_caches[name] = cache
+        missing = object()
+
+        def memoized_func(*args):
+            value = cache.get(args, missing)
+            if value is missing:
+                value = func(*args)
+                cache.set(args, value)
+            return value
+
+        return memoized_func
+
+    def _trace_sql(self, sql: str):
+        """set_trace_callback 的回调函数，记录SQLite最近实际执行的语句"""
+        self._last_trace_sql = sql
+
+    def _execute(self, sql: str, *args, **kwargs):
+        """execute 函数的执行逻辑，开启查询结果缓存时，查询语句优先从缓存中获取结果"""
+        if self._result_cache is not None and READ_ONLY_SQL_PATTERN.match(sql):
+            return self._execute_by_result_cache(sql, *args, **kwargs)
+        return self._timing_execute(self.cursor.execute, sql, *args, **kwargs)
+
+    def _execute_by_result_cache(self, sql: str, *args, **kwargs):
+        """从查询结果缓存中获取结果，缓存不存在或已失效则执行查询并缓存结果"""
+        parameters = args[0] if args else kwargs.get("parameters", ())
+        if isinstance(parameters, dict):
+            parameters = tuple(sorted(parameters.items()))
+        cache_key = (sql, tuple(parameters))
+        try:
+            cache_value = self._result_cache.get(cache_key, is_valid=self._is_result_cache_valid)
+        except TypeError:  # 参数中存在不可hash的值，不使用缓存
+            return self._timing_execute(self.cursor.execute, sql, *args, **kwargs)
+        if cache_value is not None:
+            rows, description = cache_value[0], cache_value[1]
+            return CachedCursor([copy_cached_row(row) for row in rows], description)
+        read_tables = self._get_read_tables(sql, *args, **kwargs)
+        table_versions = tuple((table, self._table_versions.get(table, 0)) for table in read_tables)
+        schema_version = self._schema_version
+        data_version = self._get_data_version()
+        cursor = self._timing_execute(self.cursor.execute, sql, *args, **kwargs)
+        rows = cursor.fetchmany(self._result_cache_max_rows + 1)
+        if len(rows) > self._result_cache_max_rows:
+            return CachedCursor(rows, cursor.description, cursor)
+        expire_time = time.time() + self._result_cache_ttl if self._result_cache_ttl is not None else None
+        self._result_cache.set(cache_key, (rows, cursor.description, table_versions, schema_version, expire_time,
+                                           data_version, self.db.in_transaction))
+        return CachedCursor([copy_cached_row(row) for row in rows], cursor.description)
+
+    def _get_data_version(self) -> int:
+        """读取 PRAGMA data_version，其他连接(包括其他进程)提交写入后该值会变化"""
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            return cursor.execute(DATA_VERSION_SQL).fetchone()[0]
+        finally:
+            cursor.close()
+
+    def _is_result_cache_valid(self, cache_value: tuple) -> bool:
+        """
+        判断查询结果缓存是否仍然有效：未过期，依赖的表没有被写入，表结构没有变动，没有其他连接提交写入，
+        在事务中缓存的结果(可能包含未提交的数据)在事务结束(提交或直接通过db.rollback回滚)后失效
+        """
+        _, _, table_versions, schema_version, expire_time, data_version, in_transaction = cache_value
+        if expire_time is not None and time.time() > expire_time:
+            return False
+        if schema_version != self._schema_version:
+            return False
+        if in_transaction and not self.db.in_transaction:
+            return False
+        if data_version != self._get_data_version():
+            return False
+        for table, version in table_versions:
+            if self._table_versions.get(table, 0) != version:
+                return False
+        return True
+
+    def _get_read_tables(self, sql: str, *args, **kwargs) -> tuple:
+        """通过SQLite authorizer 获取查询语句读取的表(包括视图依赖的表)"""
+        read_tables_key = ("read_tables", sql)
+        read_tables = self._sql_cache.get(read_tables_key)
+        if read_tables is not None:
+            return read_tables
+        tables = set()
+
+        def authorizer(action, arg1, arg2, db_name, trigger_name):
+            if action == sqlite3.SQLITE_READ and arg1:
+                tables.add(arg1.lower())
+            return sqlite3.SQLITE_OK
+
+        # 加上不重复的注释，保证语句被重新编译，authorizer 只在编译SQL时被调用
+        explain_sql = EXPLAIN_SQL_TEMPLATE.format(count=next(self._unique_count), sql=sql)
+        self.db.set_authorizer(authorizer)
+        try:
+            self.db.execute(explain_sql, *args, **kwargs).fetchall()
+        finally:
+            self.db.set_authorizer(None)
+        read_tables = tuple(tables)
+        self._sql_cache.set(read_tables_key, read_tables)
+        return read_tables
+
+    def _bump_table_version(self, sql: str, script: bool = False):
+        """根据执行的写入语句更新表的写入版本号，使依赖该表的查询结果缓存失效"""
+        match = TEMP_TABLE_DDL_SQL_PATTERN.match(sql)
+        if match and not script:
+            table_name = next(name for name in match.groups() if name).lower()
+            self._table_versions[table_name] = self._table_versions.get(table_name, 0) + 1
+            return
+        if script or SCHEMA_CHANGE_SQL_PATTERN.match(sql):
+            self._schema_version += 1
+            return
+        match = WRITE_TABLE_SQL_PATTERN.match(sql)
+        if match:
+            table_name = next(name for name in match.groups() if name).lower()
+            self._table_versions[table_name] = self._table_versions.get(table_name, 0) + 1
+            if table_name in self._get_trigger_tables():  # 触发器可能写入其他表
+                self._schema_version += 1
+        elif not NO_DATA_CHANGE_SQL_PATTERN.match(sql):
+            self._schema_version += 1
+
+    def _get_trigger_tables(self) -> set:
+        """获取定义了触发器的表名，按_schema_version缓存，建表，删表等表结构变动后重新读取"""
+        if self._trigger_tables is None or self._trigger_tables[0] != self._schema_version:
+            cursor = self.db.cursor()
+            cursor.row_factory = None
+            try:
+                table_names = {row[0] for row in cursor.execute(SELECT_TRIGGER_TABLE_NAMES_SQL)}
+            finally:
+                cursor.close()
+            self._trigger_tables = (self._schema_version, table_names)
+        return self._trigger_tables[1]
+
+    def _timing_execute(self, execute_func: Callable, sql: str, *args, **kwargs):
+        """执行SQL并计时，耗时超过慢SQL阈值则记录该SQL"""
+        if self._result_cache is not None and not READ_ONLY_SQL_PATTERN.match(sql):
+            self._bump_table_version(sql, script=execute_func == self.cursor.executescript)
+        if self._slow_sql_threshold is None:
+            return execute_func(sql, *args, **kwargs)
+        self._last_trace_sql = None
+        start_time = time.perf_counter()
+        result = execute_func(sql, *args, **kwargs)
+        duration = time.perf_counter() - start_time
+        if duration >= self._slow_sql_threshold:
+            query_plan = None
+            if self._slow_sql_explain and execute_func != self.cursor.executescript:
+                query_plan = self._get_query_plan(self._last_trace_sql)
+            self._slow_sql_log.append({"sql": normalize_sql(sql), "param_count": get_sql_param_count(sql),
+                                       "duration": duration, "query_plan": query_plan,
+                                       "execute_time": datetime.datetime.now()})
+            self.log.warning(f"慢SQL 耗时{round(duration, 4)}S：{normalize_sql(sql)} 执行计划：{query_plan}")
+        return result
+
+    def _get_query_plan(self, sql: str) -> Union[List[str], None]:
+        """获取已展开参数的SQL语句的执行计划，不支持或获取失败时返回None"""
+        if not sql or not SQL_EXPLAIN_SUPPORT_PATTERN.match(sql):
+            return None
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            explain_sql = EXPLAIN_QUERY_PLAN_SQL_TEMPLATE.format(sql=sql)
+            return [row[3] for row in cursor.execute(explain_sql).fetchall()]
+        except sqlite3.Error as e:
+            self.log.debug(e)
+            return None
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _get_partition_by_dict(data: dict, period: str) -> str:
+        """根据数据中insert_time的值获取数据所在的分区"""
+        partition_time = None
+        for key, value in data.items():
+            if get_column_name_by_key(key) == 'insert_time':
+                partition_time = value
+                break
+        if isinstance(partition_time, str):
+            partition_time = datetime.datetime.fromisoformat(partition_time)
+        elif not isinstance(partition_time, datetime.date):
+            partition_time = datetime.datetime.now()
+        return partition_time.strftime(PARTITION_PERIOD_FORMAT[period])
+
+    def _refresh_partition_view(self, table_name: str):
+        """重建查询所有分区数据的union all视图，分区之间缺少的字段用null补齐"""
+        partitions = self.get_partitions(table_name)
+        if not partitions:
+            self.execute(f"drop view if exists [{table_name}];")
+            return
+        columns = []
+        for partition_table_name in partitions:
+            columns.extend(c for c in self._tables[partition_table_name] if c not in columns)
+        select_sqls = []
+        for partition_table_name in partitions:
+            partition_columns = self._tables[partition_table_name]
+            select_column = ",".join(f"[{c}]" if c in partition_columns else f"null as [{c}]" for c in columns)
+            select_sqls.append(f"select {select_column} from [{partition_table_name}]")
+        view_sql = CREATE_PARTITION_VIEW_SQL_TEMPLATE.format(table_name=table_name,
+                                                             select_sql=" union all ".join(select_sqls))
+        for sql in view_sql.splitlines():  # 每行一条语句，在当前事务中执行，回滚时和写入的数据一起撤销
+            self.execute(sql)
+
+    def _prepare_table(self, data: List[dict], table_name: str, insert_time: bool, update_time: bool, export: bool,
+                       auto_alter: bool):
+        """
+        在写入数据之前创建表，并alter出data中缺少的字段，建表和alter在当前事务中执行，
+        避免写入时因缺少字段失败后再alter重试
+        :param data: 需要写入的dict list，只检查每种key组合的第一条数据
+        :param table_name: 表名
+        :param insert_time: 是否创建插入时间数据列
+        :param update_time: 是否创建更新时间数据列
+        :param export: 是否创建export数据列
+        :param auto_alter: 是否自动alter表结构
+        """
+        if insert_time is None:
+            insert_time = self._insert_time
+        if update_time is None:
+            update_time = self._update_time
+        if export is None:
+            export = self._export
+        if auto_alter is None:
+            auto_alter = self._auto_alter
+        for sample in {tuple(d): d for d in data if isinstance(d, dict)}.values():
+            if table_name not in self._tables:
+                self._create_table_by_dict(sample, table_name, insert_time, update_time, export)
+            elif auto_alter and any(get_column_name_by_key(key) not in self._tables[table_name] for key in sample):
+                self._alter_table_add_column_by_dict(sample, table_name=table_name)
+
+    def _save_checkpoint(self, job_name: str, table_name: str, row_count: int, cursor_token: Union[str, None],
+                         finished: bool):
+        """保存 insert_resumable 的任务进度，不执行commit，以便与插入的数据在同一事务中提交"""
+        if CHECKPOINT_TABLE_NAME not in self._tables:
+            self.execute(CREATE_CHECKPOINT_TABLE_SQL)
+            self._load_db_tables(CHECKPOINT_TABLE_NAME)
+        checkpoint = {"job_name": job_name, "table_name": table_name, "row_count": row_count,
+                      "cursor_token": cursor_token, "finished": finished, "update_time": datetime.datetime.now()}
+        self.execute(self._get_replace_sql_by_dict(checkpoint, CHECKPOINT_TABLE_NAME), list(checkpoint.values()))
+
+    def _select_to_file(self, sql: str, path: str, sql_value: Iterable, not_save_column: list, compress: bool,
+                        chunk_size: int, encoding: str, write_rows: Callable) -> int:
+        """
+        select_to_csv，select_to_jsonl 的执行逻辑，使用单独的游标分块读取tuple格式的行，调用write_rows写入文件，
+        查询无数据时同样写入文件(CSV只有表头，JSON Lines为空文件)，以便下游按固定路径读取
+        """
+        if self._check_same_thread:
+            row_count = self._write_select_to_file(sql, path, sql_value, not_save_column, compress, chunk_size,
+                                                   encoding, write_rows)
         else:
             try:
                 self.lock.acquire(timeout=50)
-                self.db.commit()
-                self.cursor.close()
-                self.db.close()
+                row_count = self._write_select_to_file(sql, path, sql_value, not_save_column, compress, chunk_size,
+                                                       encoding, write_rows)
             finally:
                 self.lock.release()
+        if row_count:
+            self.log.info(f"导出{row_count}条数据：{path}")
+        else:
+            self.log.warning(f"当前查询无数据导出，只写入空文件：{path}")
+        return row_count
+
+    def _write_select_to_file(self, sql: str, path: str, sql_value: Iterable, not_save_column: list, compress: bool,
+                              chunk_size: int, encoding: str, write_rows: Callable) -> int:
+        """_select_to_file 中读取游标并写入文件的部分，返回写入的数据条数"""
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            cursor.execute(sql, sql_value or [])
+            rows = cursor.fetchmany(chunk_size)
+            not_save_column = set(not_save_column) if not_save_column else set()
+            indexes = [index for index, column in enumerate(cursor.description) if column[0] not in not_save_column]
+            column_names = [cursor.description[index][0] for index in indexes]
+            row_count = 0
+
+            def iter_rows():
+                nonlocal rows, row_count
+                while rows:
+                    row_count += len(rows)
+                    if len(indexes) == len(cursor.description):
+                        yield from rows
+                    else:
+                        for row in rows:
+                            yield [row[index] for index in indexes]
+                    rows = cursor.fetchmany(chunk_size)
+
+            if compress is None:
+                compress = str(path).endswith('.gz')
+            if compress:
+                file = gzip.open(path, 'wt', encoding=encoding, newline='')
+            else:
+                file = open(path, 'w', encoding=encoding, newline='')
+            with file:
+                write_rows(file, column_names, iter_rows())
+        finally:
+            cursor.close()
+        return row_count
+
+    def _get_rowid(self, table_name: str, row: Union[int, dict]) -> int:
+        """row 为where条件dict时查询出对应数据的rowid"""
+        if not isinstance(row, dict):
+            return row
+        where = " and ".join(f"[{get_column_name_by_key(column)}]=?" for column in row)
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        try:
+            result = cursor.execute(self._get_select_sql(table_name, ["rowid"], where),
+                                    self._adapt_dict_value(row, table_name)).fetchone()
+        finally:
+            cursor.close()
+        if result is None:
+            raise Exception(f"表{table_name}中没有满足条件的数据：{row}")
+        return result[0]
+
+    def _write_blob_chunks(self, table_name: str, column: str, row: Union[int, dict], size: int,
+                           chunks: Iterable, chunk_size: int, commit: bool):
+        """用zeroblob分配字段长度后，将chunks依次分块写入字段"""
+        if commit is None:
+            commit = self._auto_commit
+        rowid = self._get_rowid(table_name, row)
+        column = get_column_name_by_key(column)
+        update_sql = UPDATE_SQL_TEMPLATE.format(table_name=table_name, update_column=f"[{column}]=zeroblob(?)",
+                                                where="rowid=?")
+        if self.execute(update_sql, [size, rowid]).rowcount == 0:
+            raise Exception(f"表{table_name}中没有rowid为{rowid}的数据")
+        with self.open_blob(table_name, column, rowid, readonly=False) as blob:
+            for chunk in chunks:
+                chunk = memoryview(chunk).cast('B')
+                for position in range(0, chunk.nbytes, chunk_size):
+                    blob.write(chunk[position:position + chunk_size])
+        self._bump_table_version(update_sql)
+        self._commit(commit)
+
+    def _save_watermark(self, table_name: str, consumer: str, watermark_column: str, watermark, watermark_rowid: int):
+        """保存 select_incremental 的水位，不执行commit"""
+        if WATERMARK_TABLE_NAME not in self._tables:
+            self.execute(CREATE_WATERMARK_TABLE_SQL)
+            self._load_db_tables(WATERMARK_TABLE_NAME)
+        watermark = {"table_name": table_name, "consumer": consumer, "watermark_column": watermark_column,
+                     "watermark": watermark, "watermark_rowid": watermark_rowid,
+                     "update_time": datetime.datetime.now()}
+        self.execute(self._get_replace_sql_by_dict(watermark, WATERMARK_TABLE_NAME), list(watermark.values()))
 
     def _commit(self, commit: bool):
         """
@@ -733,37 +2916,45 @@ class DictToDb(object):
         if commit:
             self.commit()
 
-    def _load_db_tables(self):
+    def _load_db_tables(self, table_name: str = None):
         """
-        从数据库加载表结构
+        从数据库加载表名，表的字段信息在第一次使用该表时才加载
+        :param table_name: 只重新加载该表的字段信息，默认重新加载所有表的字段信息
         """
-        table_name_infos = self.db.execute("Select name From MAIN.[sqlite_master] where type='table';").fetchall()
-        table_names = [t['name'] for t in table_name_infos]
-        for table_name in table_names:
-            # 下面这条语句不支持？占位符和命名占位符   不知道原因
-            table_info_dict = {}
-            table_info = self.db.execute(f"PRAGMA table_info([{table_name}]);").fetchall()
-            for column_info in table_info:
-                table_info_dict[column_info['name']] = column_info
-            self._tables[table_name] = table_info_dict
+        if self.db.in_transaction:
+            self._tables_loaded_in_transaction = True
+        table_name_infos = self.db.execute("Select name, sql From MAIN.[sqlite_master] where type='table';").fetchall()
+        self._virtual_tables = {t['name'] for t in table_name_infos
+                                if t['sql'] and t['sql'].lower().startswith('create virtual table')}
+        shadow_tables = {f"{name}{suffix}" for name in self._virtual_tables for suffix in FTS_SHADOW_TABLE_SUFFIXES}
+        table_names = [t['name'] for t in table_name_infos
+                       if t['name'] not in self._virtual_tables and t['name'] not in shadow_tables]
+        if any(t['sql'] and 'using fts5' in t['sql'].lower() for t in table_name_infos):
+            self.db.execute(RECURSIVE_TRIGGERS_SQL)
+        loaded_tables = None
+        if table_name is not None and isinstance(self._tables, LazyTableInfo):
+            loaded_tables = {name: info for name, info in dict.items(self._tables)
+                             if name != table_name and name in table_names}
+        self._tables = LazyTableInfo(self.db, table_names, loaded_tables)
 
     def _alter_table_add_column_by_dict(self, data: dict, table_name: str):
-        self._load_db_tables()
-        alter_table_sql = ""
+        self._load_db_tables(table_name)
+        alter_table_sqls = []
         for key, value in data.items():
-            if "@" in key:
-                key = key.split("@")[0]
-            elif "#" in key:
-                key = key.split("#")[0]
-            if key not in self._tables[table_name].keys():
-                column_info_dict = self._get_column_info_by_key_value(key, value)
+            if key.split("#")[0].split("@")[0] not in self._tables[table_name].keys():
+                # 保留 字段名@字段类型 中指定的类型，#后的主键等描述信息不参与自动alter
+                column_info_dict = self._get_column_info_by_key_value(key.split("#")[0], value)
                 column_info, pk_column = column_info_dict['column_info'], column_info_dict['pk_column']
                 add_column_sql = ADD_COLUMN_SQL_TEMPLATE.format(table_name=table_name, column_info=column_info)
-                alter_table_sql += f"{add_column_sql}\n"
+                alter_table_sqls.append(add_column_sql)
                 if pk_column:
                     raise Exception("不支持带主键的自动alter")
-        self.executescript(alter_table_sql)
-        self.commit()
+                if column_info_dict['fts_column']:
+                    raise Exception("不支持带全文索引的自动alter")
+        # 逐条execute而不是executescript，executescript会先提交事务，在write_batch中会破坏事务的原子性
+        for add_column_sql in alter_table_sqls:
+            self.execute(add_column_sql)
+        self._load_db_tables(table_name)
 
     def _get_table_name_by_dict_keys(self, data: dict, insert_time: bool, update_time: bool, export: bool):
         """根据dict key值获取表名"""
@@ -809,12 +3000,15 @@ class DictToDb(object):
         """
         column_info_list = []
         pk_column_list = []
+        fts_column_list = []
         for key, value in data.items():
             column_info_dict = self._get_column_info_by_key_value(key, value)
             column_info, pk_column = column_info_dict['column_info'], column_info_dict['pk_column']
             column_info_list.append(column_info)
             if pk_column:
                 pk_column_list.append(pk_column)
+            if column_info_dict['fts_column']:
+                fts_column_list.append(column_info_dict['fts_column'])
         if insert_time and 'insert_time' not in data.keys():
             column_info_list.append("insert_time timestamp default (datetime('now','localtime'))")
         if update_time and 'update_time' not in data.keys():
@@ -826,8 +3020,17 @@ class DictToDb(object):
         column_info = ", ".join(column_info_list)
         create_table_sql = CREATE_TABLE_SQL_TEMPLATE.format(table_name=table_name, column_info=column_info)
         self.cursor.execute(create_table_sql)
-        self.db.commit()
-        self._load_db_tables()
+        self._created_indexes = {index for index in self._created_indexes if index[0] != table_name}  # 表被删除后重建
+        if fts_column_list:
+            create_fts_table_sql = CREATE_FTS_TABLE_SQL_TEMPLATE.format(
+                fts_table_name=FTS_TABLE_NAME_TEMPLATE.format(table_name=table_name), table_name=table_name,
+                columns=", ".join(fts_column_list), new_values=", ".join(f"new.{c}" for c in fts_column_list),
+                old_values=", ".join(f"old.{c}" for c in fts_column_list))
+            for fts_sql in create_fts_table_sql.splitlines():  # 每行一条语句，不使用会提前提交事务的executescript
+                self.cursor.execute(fts_sql)
+            create_table_sql = f"{create_table_sql}\n{create_fts_table_sql}"
+        # 不单独commit：没有未提交的事务时DDL会自动提交，有未提交的事务时和调用方的写入一起提交或回滚
+        self._load_db_tables(table_name)
         return create_table_sql
 
     def _get_column_info_by_key_value(self, key, value) -> dict:
@@ -836,11 +3039,12 @@ class DictToDb(object):
         :param key:字典的key
         :param value:字典的value
         :return:dict(column_info：column_info信息,pk_column：是否是主键字段，None则不是主键column,str则表示为主键column，
-                且主键名为该str,column_type 字段类型)
+                且主键名为该str,column_type 字段类型,fts_column：是否是全文索引字段，None则不是，str则为该字段名)
         """
         column_name = key
         column_desc = ""
         pk_column = None
+        fts_column = None
         if '@' in key:
             column_name = column_name.split("@")[0]
             column_type = "".join(re.findall(r'@(\w+)[#]*', key))
@@ -869,6 +3073,8 @@ class DictToDb(object):
                     raise Exception("column描述信息里面不应该包含字符';' ")
                 if c_desc == "pk" or self._re_pattern['pk'].match(c_desc):
                     pk_column = f"[{column_name}]"
+                elif c_desc == "fts":
+                    fts_column = f"[{column_name}]"
                 elif c_desc in TABLE_COLUMN_SHORTHAND:
                     column_desc_list.append(TABLE_COLUMN_SHORTHAND[c_desc])
                 else:
@@ -876,15 +3082,17 @@ class DictToDb(object):
             column_desc = " ".join(column_desc_list)
         column_name = f"[{column_name}]"
         column_info = " ".join([column_name, column_type, column_desc])
-        return {"column_info": column_info, "pk_column": pk_column, "column_type": column_type}
+        return {"column_info": column_info, "pk_column": pk_column, "column_type": column_type,
+                "fts_column": fts_column}
 
     def _get_insert_sql_by_dict(self, data: dict, table_name: str) -> str:
         """
         根据传入的字典和表名拼接 插入的SQL语句
         """
-        insert_sql_key = f"{'-'.join(data.keys())}_{table_name}"
-        if insert_sql_key in self._insert_sql:
-            return self._insert_sql[insert_sql_key]
+        insert_sql_key = ("insert", table_name, tuple(data))
+        insert_sql = self._sql_cache.get(insert_sql_key)
+        if insert_sql is not None:
+            return insert_sql
         insert_column_names = []
         for column in data.keys():
             if '@' in column:
@@ -896,16 +3104,17 @@ class DictToDb(object):
         columns = ", ".join(insert_column_names)
         values = ",".join(['?'] * len(insert_column_names))
         insert_sql = INSERT_SQL_TEMPLATE.format(table_name=table_name, columns=columns, values=values)
-        self._insert_sql[insert_sql_key] = insert_sql
+        self._sql_cache.set(insert_sql_key, insert_sql)
         return insert_sql
 
     def _get_insert_or_update_sql_by_dict(self, data: dict, table_name: str) -> str:
         """
         根据传入的字典，和表名，拼接不存在则插入，存在则更新的SQL
         """
-        insert_or_update_sql_key = f"{'-'.join(data.keys())}_{table_name}"
-        if insert_or_update_sql_key in self._insert_or_update_sql:
-            return self._insert_or_update_sql[insert_or_update_sql_key]
+        insert_or_update_sql_key = ("insert_or_update", table_name, tuple(data))
+        insert_or_update_sql = self._sql_cache.get(insert_or_update_sql_key)
+        if insert_or_update_sql is not None:
+            return insert_or_update_sql
         insert_column_names = []
         for column in data.keys():
             if '@' in column:
@@ -917,7 +3126,7 @@ class DictToDb(object):
         columns = ", ".join(insert_column_names)
         values = ",".join(['?'] * len(insert_column_names))
         insert_or_update_sql = INSERT_SQL_TEMPLATE.format(table_name=table_name, columns=columns, values=values)
-        self._insert_or_update_sql[insert_or_update_sql_key] = insert_or_update_sql
+        self._sql_cache.set(insert_or_update_sql_key, insert_or_update_sql)
         return insert_or_update_sql
 
     @staticmethod
@@ -935,13 +3144,28 @@ class DictToDb(object):
         where_data = {key: value for key, value in insert_column_data.items() if key in where_column}
         return update_data, where_data
 
+    def _get_insert_or_ignore_sql_by_dict(self, data: dict, table_name: str) -> str:
+        """
+        根据传入的字典和表名拼接 insert or ignore 的SQL语句
+        """
+        insert_sql_key = ("insert_or_ignore", table_name, tuple(data))
+        insert_sql = self._sql_cache.get(insert_sql_key)
+        if insert_sql is not None:
+            return insert_sql
+        columns = ", ".join(f"[{get_column_name_by_key(column)}]" for column in data)
+        values = ",".join(['?'] * len(data))
+        insert_sql = INSERT_OR_IGNORE_SQL_TEMPLATE.format(table_name=table_name, columns=columns, values=values)
+        self._sql_cache.set(insert_sql_key, insert_sql)
+        return insert_sql
+
     def _get_replace_sql_by_dict(self, data: dict, table_name: str) -> str:
         """
         根据传入的字典和表名拼接 插入的SQL语句
         """
-        replace_sql_key = f"{'-'.join(data.keys())}_{table_name}"
-        if replace_sql_key in self._replace_sql:
-            return self._replace_sql[replace_sql_key]
+        replace_sql_key = ("replace", table_name, tuple(data))
+        replace_sql = self._sql_cache.get(replace_sql_key)
+        if replace_sql is not None:
+            return replace_sql
         replace_column_names = []
         for column in data.keys():
             if '@' in column:
@@ -953,9 +3177,74 @@ class DictToDb(object):
         columns = ", ".join(replace_column_names)
         values = ",".join(['?'] * len(replace_column_names))
         replace_sql = REPLACE_SQL_TEMPLATE.format(table_name=table_name, columns=columns, values=values)
-        self._replace_sql[replace_sql_key] = replace_sql
+        self._sql_cache.set(replace_sql_key, replace_sql)
         return replace_sql
 
+    def _select_cursor(self, table_name: str, select: List[str] = None, where: dict = None, record_type: type = None,
+                       order_by: Union[str, List[str]] = None, group_by: Union[str, List[str]] = None,
+                       limit: int = None, offset: int = None):
+        """执行 select/select_iter 的查询，设置了record_type时按类的字段查询，且返回tuple格式的行"""
+        if record_type is not None:
+            select = list(get_record_fields(record_type))
+        select_sql, select_value = self._get_filter_select_sql(table_name, select, where, order_by, group_by, limit,
+                                                               offset)
+        if record_type is None:
+            return self.execute(select_sql, select_value)
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        return cursor.execute(select_sql, select_value)
+
+    def _insert_records(self, data, first_record, table_name: Union[str, None], insert_time: bool, update_time: bool,
+                        export: bool, auto_alter: bool):
+        """插入 dataclass，NamedTuple 或 __slots__ 对象，按类缓存的attrgetter读取字段值，不转换为dict"""
+        record_type = type(first_record)
+        columns = get_record_fields(record_type)
+        # 没有可用类型注解的字段不指定类型，和dict一样根据第一个对象的字段值推断字段类型
+        first_values = get_record_getter(record_type)(first_record)
+        table_data = {f"{name}@{column_type}" if column_type else name: value
+                      for (name, column_type), value in zip(columns.items(), first_values)}
+        if table_name is None:
+            table_name = self._get_table_name_by_dict_keys(table_data, insert_time, update_time, export)
+        if table_name not in self._tables.keys():
+            self._create_table_by_dict(table_data, table_name, insert_time, update_time, export)
+        elif auto_alter and any(name not in self._tables[table_name] for name in columns):
+            self._alter_table_add_column_by_dict(
+                {key: value for (key, value), name in zip(table_data.items(), columns)
+                 if name not in self._tables[table_name]}, table_name=table_name)
+        insert_sql = self._get_insert_sql_by_dict(columns, table_name)
+        if first_record is data:
+            data = [data]
+        elif isinstance(data, Generator):
+            data = chain([first_record], data)
+        self.executemany(insert_sql, self._adapt_record_values(data, record_type, table_name))
+
+    def _adapt_record_values(self, records: Iterable, record_type: type, table_name: str):
+        """采用生成器方式，将对象的字段值转为与SQLite交流的值，转换规则与_adapt_dict_value一致"""
+        getter = get_record_getter(record_type)
+        adapt_funcs = []
+        for index, name in enumerate(get_record_fields(record_type)):
+            column_type = self._tables[table_name][name]['type'].lower()
+            if column_type == "json_text":
+                adapt_funcs.append((index, partial(json.dumps, ensure_ascii=False)))
+            elif column_type in ['tuple_text', 'set_text']:
+                adapt_funcs.append((index, str))
+            elif column_type == "obj":
+                # obj字段读取时按pickle转换，字符串，数字等基础类型的值也需要pickle后保存
+                adapt_funcs.append((index, pickle.dumps))
+        basic_types = (str, int, float, bool, datetime.date, datetime.datetime)
+        obj_indexes = {index for index, adapt_func in adapt_funcs if adapt_func is pickle.dumps}
+        for record in records:
+            if type(record) is not record_type:
+                raise Exception(f"批量插入的对象类型必须一致：{record_type}，{type(record)}")
+            values = getter(record)
+            if adapt_funcs:
+                values = list(values)
+                for index, adapt_func in adapt_funcs:
+                    value = values[index]
+                    if value is not None and (index in obj_indexes or not isinstance(value, basic_types)):
+                        values[index] = adapt_func(value)
+            yield values
+
     def _execute_insert_sql(self, data, insert_data, insert_sql, table_name):
         """处理insert 函数SQL语句执行部分"""
         if isinstance(data, Generator):  # 处理生成器的情况，生成器需要单独保存第一次的状态
@@ -978,48 +3267,247 @@ class DictToDb(object):
 
     def _insert_or_update(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
                           commit: bool = None, insert_time: bool = None, update_time: bool = None, export: bool = None,
-                          auto_alter: bool = None, ignore_error=None):
-        """insert or update 函数的调用逻辑"""
+                          auto_alter: bool = None, ignore_error=None, skip_unchanged: bool = None) -> int:
+        """insert or update 函数的调用逻辑，返回插入或更新的数据条数"""
         try:
             self.insert(data, table_name=table_name, commit=commit, insert_time=insert_time,
                         update_time=update_time, export=export, auto_alter=auto_alter)
+            return 1
         except sqlite3.IntegrityError as e:
             if 'UNIQUE constraint failed' in str(e):
                 where_column = str(e).replace("UNIQUE constraint failed: ", "").replace(f"{table_name}.",
                                                                                         '').split(", ")
                 update_data, where_data = self._get_update_data_by_where_column(data, where_column)
-                self.update(update_data, where_data, table_name=table_name, commit=commit, update_time=update_time,
-                            auto_alter=auto_alter)
+                return self.update(update_data, where_data, table_name=table_name, commit=commit,
+                                   update_time=update_time, auto_alter=auto_alter, skip_unchanged=skip_unchanged)
             else:
                 raise e
         except Exception as e:
             if ignore_error and isinstance(e, ignore_error):
                 self.log.warning(e)
+                return 0
             else:
                 raise e
 
     def _update(self, update: Union[dict, List[dict], Tuple[dict]], where: Union[dict, List[dict], Tuple[dict]],
-                table_name: str, update_time: bool = None, auto_alter: bool = True):
+                table_name: str, update_time: bool = None, auto_alter: bool = True, skip_unchanged: bool = False) -> int:
         """update 函数的执行逻辑"""
-        update_sql = self._get_update_sql(update_data=update, where=where, table_name=table_name,
-                                          update_time=update_time)
-        update_values = self._get_update_column_and_where_values(update, where, update_time, table_name)
+        where_sql, where_values = self._compile_filter(table_name, where)
+        update_sql = self._get_update_sql(update_data=update, where_sql=where_sql, table_name=table_name,
+                                          update_time=update_time, skip_unchanged=skip_unchanged)
+        update_values = self._get_update_column_and_where_values(update, where_values, update_time, table_name,
+                                                                  skip_unchanged=skip_unchanged)
         try:
-            self.execute(update_sql, update_values)
+            return self.execute(update_sql, update_values).rowcount
         except sqlite3.OperationalError as e:
             if auto_alter and (str(e).startswith("no such column") or 'no column named' in str(e)):
-                self._alter_table_add_column_by_dict(update, table_name=table_name)
-                self.execute(update_sql, update_values)
+                self._alter_table_add_column_by_dict(self._get_alter_update_data(update, update_time),
+                                                     table_name=table_name)
+                return self.execute(update_sql, update_values).rowcount
             else:
                 raise e
 
-    def _get_update_sql(self, update_data: dict, where: dict, table_name: str, update_time: bool):
-        """根据传入的参数，拼接更新的SQL语句"""
-        update_sql_key = f'{"-".join(update_data.keys())}@{"-".join(where.keys())}_{table_name}'
-        if update_sql_key in self._update_sql.keys():
-            return self._update_sql[update_sql_key]
+    def _update_many(self, update_list: Union[List[dict], Tuple[dict]], where_list: Union[List[dict], Tuple[dict]],
+                     table_name: str, update_time: bool = None, auto_alter: bool = True,
+                     skip_unchanged: bool = False) -> int:
+        """批量update的执行逻辑，字段和查询条件结构相同的连续update/where合并为一次executemany，保持原有的执行顺序"""
+        now = datetime.datetime.now()
+        pairs = ((update, self._compile_filter(table_name, where)) for update, where in zip(update_list, where_list))
+        update_count = 0
+        for (_, where_sql), group in groupby(pairs, key=lambda pair: (tuple(pair[0]), pair[1][0])):
+            group = list(group)
+            update = group[0][0]
+            update_sql = self._get_update_sql(update_data=update, where_sql=where_sql, table_name=table_name,
+                                              update_time=update_time, skip_unchanged=skip_unchanged)
+            append_update_time = update_time and 'update_time' not in update.keys()
+            guard_indexes = self._get_unchanged_guard_indexes(update) if skip_unchanged else []
+            update_values = []
+            for _update, (_, where_values) in group:
+                values = self._adapt_dict_value(_update, table_name)
+                guard_values = [values[index] for index in guard_indexes]
+                if append_update_time:
+                    values.append(now)
+                update_values.append(values + where_values + guard_values)
+            try:
+                update_count += self.executemany(update_sql, update_values).rowcount
+            except sqlite3.OperationalError as e:
+                if auto_alter and (str(e).startswith("no such column") or 'no column named' in str(e)):
+                    self._alter_table_add_column_by_dict(self._get_alter_update_data(update, update_time),
+                                                         table_name=table_name)
+                    update_count += self.executemany(update_sql, update_values).rowcount
+                else:
+                    raise e
+        return update_count
+
+    def _delete_many(self, where_list: Union[List[dict], Tuple[dict]], table_name: str):
+        """批量delete的执行逻辑"""
+        where_groups = {}
+        for where in where_list:
+            where_sql, where_values = self._compile_filter(table_name, where)
+            where_groups.setdefault(where_sql, []).append(where_values)
+        for where_sql, values_list in where_groups.items():
+            match = SINGLE_EQUAL_FILTER_PATTERN.match(where_sql)
+            if match:  # 单个字段的等于条件，合并为 in 语句分批删除
+                column = match.group(1)
+                delete_values = [values[0] for values in values_list]
+                for start in range(0, len(delete_values), self._max_variable_number):
+                    chunk_values = delete_values[start:start + self._max_variable_number]
+                    self.execute(self._get_delete_in_sql(table_name, column, len(chunk_values)), chunk_values)
+            else:
+                self.executemany(self._get_delete_sql(table_name, where_sql), values_list)
+
+    def _get_delete_in_sql(self, table_name: str, column: str, value_count: int):
+        """拼接按单个字段 in 语句删除的SQL"""
+        delete_sql_key = ("delete_in", table_name, column, value_count)
+        delete_sql = self._sql_cache.get(delete_sql_key)
+        if delete_sql is None:
+            delete_sql = DELETE_SQL_TEMPLATE.format(table_name=table_name,
+                                                    where=f"{column} in ({','.join(['?'] * value_count)})")
+            self._sql_cache.set(delete_sql_key, delete_sql)
+        return delete_sql
+
+    def _execute_columns(self, sql: str, parameters: Iterable, column_types: Dict[str, str], chunk_size: int):
+        """
+        execute_columns 函数的执行逻辑，用tuple类型的游标分批读取数据并追加到每列中，
+        数值字段的空值用占位值代替，并在null_masks中记录空值的位置
+        :return: ({字段名: 该字段的所有值}, {字段名: 空值位置为1的array.array})
+        """
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        null_masks = {}
+        try:
+            self._timing_execute(cursor.execute, sql, parameters)
+            column_names = [d[0] for d in cursor.description]
+            columns = [None] * len(column_names)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for index, values in enumerate(zip(*rows)):
+                    column = columns[index]
+                    if column is None:
+                        column = self._new_column(column_types.get(column_names[index]), values)
+                    if isinstance(column, array.array):
+                        null_mask = null_masks.get(index)
+                        if null_mask is None and None in values:
+                            null_mask = null_masks[index] = array.array('b', bytes(len(column)))
+                        try:
+                            if null_mask is None:
+                                column.extend(array.array(column.typecode, values))
+                            else:
+                                null_value = ARRAY_TYPECODE_NULL_VALUE[column.typecode]
+                                column.extend(array.array(column.typecode, [
+                                    null_value if value is None else value for value in values]))
+                                null_mask.extend([value is None for value in values])
+                        except (TypeError, OverflowError):  # 存在与声明类型不一致的值，该列改为list
+                            column = column.tolist()
+                            if null_mask is not None:
+                                column = [None if null_mask[i] else value for i, value in enumerate(column)]
+                                del null_masks[index]
+                            column.extend(values)
+                    else:
+                        column.extend(values)
+                    columns[index] = column
+        finally:
+            cursor.close()
+        return ({name: column if column is not None else [] for name, column in zip(column_names, columns)},
+                {column_names[index]: null_mask for index, null_mask in null_masks.items()})
+
+    @staticmethod
+    def _new_column(column_type: Union[str, None], values: tuple) -> Union[array.array, list]:
+        """根据字段声明的类型或者第一个非空值的类型，创建存储该列数据的array.array 或 list"""
+        if column_type is None:
+            first_value = next((value for value in values if value is not None), None)
+            if isinstance(first_value, bool):
+                column_type = 'boolean'
+            elif isinstance(first_value, (int, float)):
+                column_type = TABLE_TYPE_INFO[type(first_value)]
+        typecode = COLUMN_ARRAY_TYPECODE.get(column_type.lower()) if column_type else None
+        if typecode:
+            return array.array(typecode)
+        return []
+
+    def _get_select_in_sql(self, table_name: str, select: Union[List[str], None], column: str, value_count: int):
+        """拼接按单个字段 in 语句查询的SQL"""
+        select_sql_key = ("select_in", table_name, tuple(select) if select else None, column, value_count)
+        select_sql = self._sql_cache.get(select_sql_key)
+        if select_sql is None:
+            select_column = f'[{"],[".join(select)}]' if select else "*"
+            select_sql = SELECT_SQL_TEMPLATE.format(select_column=select_column, table_name=table_name,
+                                                    where=f"[{column}] in ({','.join(['?'] * value_count)})")
+            self._sql_cache.set(select_sql_key, select_sql)
+        return select_sql
+
+    def _get_many_by_temp_table(self, table_name: str, key_columns: List[str], keys: list,
+                                select: Union[List[str], None], select_all: bool, result: dict):
+        """将联合key写入临时表，再与数据表join查询"""
+        key_table_name = f"dict_to_db_keys_{next(self._unique_count)}"
+        key_column_names = [f"k{i}" for i in range(len(key_columns))]
+        self.execute(CREATE_TEMP_KEY_TABLE_SQL_TEMPLATE.format(table_name=key_table_name,
+                                                               column_info=", ".join(key_column_names)))
+        try:
+            self.executemany(INSERT_SQL_TEMPLATE.format(table_name=key_table_name,
+                                                        columns=", ".join(key_column_names),
+                                                        values=",".join(['?'] * len(key_columns))), keys)
+            select_column = ",".join([f"t.[{column}]" for column in select]) if select else "t.*"
+            on = " and ".join([f"t.[{column}]=k.{key_column_names[i]}" for i, column in enumerate(key_columns)])
+            # 临时表名每次都不同，join查询的结果不会再次命中，不经过查询结果缓存
+            cursor = self._execute_without_result_cache(SELECT_JOIN_KEY_TABLE_SQL_TEMPLATE.format(
+                select_column=select_column, table_name=table_name, key_table_name=key_table_name, on=on))
+            self._group_rows_by_key(cursor.description, cursor.fetchall(), key_columns, True, select_all, result)
+        finally:
+            self.execute(DROP_TEMP_TABLE_SQL_TEMPLATE.format(table_name=key_table_name))
+
+    @staticmethod
+    def _group_rows_by_key(description, rows: list, key_columns: List[str], composite_key: bool, select_all: bool,
+                           result: dict):
+        """将查询结果按key值归类到result中，兼容dict,sqlite3.Row和tuple类型的查询结果"""
+        column_names = [d[0] for d in description]
+        key_indexes = [column_names.index(column) for column in key_columns]
+        for row in rows:
+            if isinstance(row, dict):
+                key = tuple(row[column] for column in key_columns)
+            else:
+                key = tuple(row[index] for index in key_indexes)
+            if not composite_key:
+                key = key[0]
+            if select_all:
+                result.setdefault(key, []).append(row)
+            elif key not in result:
+                result[key] = row
+
+    def _get_max_variable_number(self) -> int:
+        """获取单条SQL语句中可以使用的占位符参数个数上限"""
+        try:
+            return self.db.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        except AttributeError:
+            return DEFAULT_MAX_VARIABLE_NUMBER
+
+    @staticmethod
+    def _get_alter_update_data(update_data: dict, update_time: bool) -> dict:
+        """update 时自动alter表结构所需的字段，包含自动填写的update_time字段"""
+        if update_time and 'update_time' not in update_data.keys():
+            return dict(update_data, update_time=datetime.datetime.now())
+        return update_data
+
+    @staticmethod
+    def _get_unchanged_guard_indexes(update_data: dict) -> List[int]:
+        """跳过未变化数据时，需要比较是否变化的字段在update_data中的位置，update_time字段不参与比较"""
+        return [index for index, column in enumerate(update_data)
+                if get_column_name_by_key(column) != 'update_time']
+
+    def _get_update_sql(self, update_data: dict, where_sql: str, table_name: str, update_time: bool,
+                        skip_unchanged: bool = False):
+        """
+        根据传入的参数，拼接更新的SQL语句，skip_unchanged为True时在where中加入 [字段] is not ? 条件跳过未变化的数据
+        :param where_sql: _compile_filter 编译后的查询条件
+        """
+        update_sql_key = ("update", table_name, tuple(update_data), where_sql, bool(update_time),
+                          bool(skip_unchanged))
+        update_sql = self._sql_cache.get(update_sql_key)
+        if update_sql is not None:
+            return update_sql
         update_column_names = []
-        where_column_names = []
         for column in update_data.keys():
             if '@' in column:
                 update_column_names.append(f"[{column.split('@')[0]}]=?")
@@ -1029,42 +3517,129 @@ class DictToDb(object):
                 update_column_names.append(f"[{column}]=?")
         if update_time and 'update_time' not in update_data.keys():
             update_column_names.append("update_time=?")
-        for column in where.keys():
-            if '@' in column:
-                where_column_names.append(f"[{column.split('@')[0]}]=?")
-            elif '#' in column:
-                where_column_names.append(f"[{column.split('#')[0]}]=?")
-            else:
-                where_column_names.append(f"[{column}]=?")
+        if skip_unchanged:
+            columns = list(update_data)
+            guard_column_names = [f"[{get_column_name_by_key(columns[index])}] is not ?"
+                                  for index in self._get_unchanged_guard_indexes(update_data)]
+            if guard_column_names:
+                where_sql = f"{where_sql} and ({' or '.join(guard_column_names)})"
         update_sql = UPDATE_SQL_TEMPLATE.format(table_name=table_name,
                                                 update_column=",".join(update_column_names),
-                                                where=" and ".join(where_column_names))
-        self._update_sql[update_sql_key] = update_sql
+                                                where=where_sql)
+        self._sql_cache.set(update_sql_key, update_sql)
         return update_sql
 
     @staticmethod
-    def _get_select_sql(table_name: str, select: list, where: dict):
-        if isinstance(select, list):
-            select = f'[{"],[".join(select)}]'
+    def _get_select_sql(table_name: str, select: list, where: Union[dict, str, None],
+                        order_by: Union[str, List[str]] = None, group_by: Union[str, List[str]] = None,
+                        limit: bool = False, offset: bool = False):
+        """
+        拼接查询的SQL语句
+        :param where: 查询条件，dict按等于条件拼接，str为 _compile_filter 编译后的查询条件
+        :param limit: 是否加入 limit ? 占位符
+        :param offset: 是否加入 offset ? 占位符
+        """
+        if isinstance(select, (list, tuple)):
+            select = ",".join(get_select_column_sql(column) for column in select)
         elif select is None:
             select = "*"
         if isinstance(where, dict):
-            where = f"{'=?,'.join(where.keys())}=?"
+            where = " and ".join(f"[{get_column_name_by_key(column)}]=?" for column in where)
         elif where is None:
             where = "1=1"
+        if group_by:
+            group_by = [group_by] if isinstance(group_by, str) else group_by
+            where = f"{where} group by {','.join(f'[{column}]' for column in group_by)}"
+        if order_by:
+            where = f"{where} order by {get_order_by_sql(order_by)}"
+        if limit:
+            where = f"{where} limit ?"
+        elif offset:
+            where = f"{where} limit -1"
+        if offset:
+            where = f"{where} offset ?"
         select_sql = SELECT_SQL_TEMPLATE.format(select_column=select, table_name=table_name, where=where)
         return select_sql
 
+    def _get_filter_select_sql(self, table_name: str, select: List[str] = None, where: dict = None,
+                               order_by: Union[str, List[str]] = None, group_by: Union[str, List[str]] = None,
+                               limit: int = None, offset: int = None) -> Tuple[str, list]:
+        """编译查询条件并拼接查询的SQL语句，按查询结构缓存SQL，返回(SQL，占位符参数的值)"""
+        where_sql, values = self._compile_filter(table_name, where)
+        select_sql_key = ("select", table_name, tuple(select) if select is not None else None, where_sql,
+                          order_by if order_by is None or isinstance(order_by, str) else tuple(order_by),
+                          group_by if group_by is None or isinstance(group_by, str) else tuple(group_by),
+                          limit is not None, offset is not None)
+        select_sql = self._sql_cache.get(select_sql_key)
+        if select_sql is None:
+            select_sql = self._get_select_sql(table_name, select, where_sql, order_by, group_by, limit is not None,
+                                              offset is not None)
+            self._sql_cache.set(select_sql_key, select_sql)
+        if limit is not None:
+            values.append(limit)
+        if offset is not None:
+            values.append(offset)
+        return select_sql, values
+
+    def _compile_filter(self, table_name: str, where: Union[dict, None]) -> Tuple[str, list]:
+        """
+        将select/update/delete 的where参数编译为参数化的查询条件，相同结构(字段，运算符，参数个数)的查询条件只拼接一次
+        :return: (查询条件SQL，占位符参数的值list)
+        """
+        if not where:
+            return "1=1", []
+        table_columns = self._tables.get(table_name) or {}
+        items = []
+        for key, value in where.items():
+            if parse_filter_key(key)[1] is not None and get_column_name_by_key(key) in table_columns:
+                # 字段名本身与运算符写法相同(如字段名为 'a>')时按字段名处理
+                items.append((key, '=', (value,)))
+            else:
+                items.append(get_filter_item(key, value))
+        filter_key = ("filter", tuple((column, operator, len(operands)) for column, operator, operands in items))
+        where_sql = self._sql_cache.get(filter_key)
+        if where_sql is None:
+            conditions = []
+            for column, operator, operands in items:
+                column = f"[{get_column_name_by_key(column)}]"
+                if operator in ('in', 'not in'):
+                    if operands:
+                        conditions.append(f"{column} {operator} ({','.join(['?'] * len(operands))})")
+                    else:
+                        conditions.append("0" if operator == 'in' else "1")
+                elif operator.endswith('between'):
+                    conditions.append(f"{column} {operator} ? and ?")
+                elif operator in ('is null', 'is not null'):
+                    conditions.append(f"{column} {operator}")
+                elif operator in ('like', 'not like', 'glob', 'is', 'is not'):
+                    conditions.append(f"{column} {operator} ?")
+                else:
+                    conditions.append(f"{column}{operator}?")
+            where_sql = " and ".join(conditions)
+            self._sql_cache.set(filter_key, where_sql)
+        values = []
+        basic_types = (str, int, float, bool, datetime.date, datetime.datetime)
+        for column, _, operands in items:
+            for value in operands:
+                if value is None or isinstance(value, basic_types):
+                    values.append(value)
+                else:
+                    values.extend(self._adapt_dict_value({column: value}, table_name))
+        return where_sql, values
+
     @staticmethod
-    def _get_delete_sql(table_name: str, where: dict):
-        return DELETE_SQL_TEMPLATE.format(table_name=table_name, where=f"{'=? and '.join(where.keys())}=?")
+    def _get_delete_sql(table_name: str, where_sql: str):
+        return DELETE_SQL_TEMPLATE.format(table_name=table_name, where=where_sql)
 
-    def _get_update_column_and_where_values(self, update_data: dict, where: dict, update_time: bool, table_name: str):
-        if update_time and 'update_time' not in update_data.keys():
-            update_data['update_time'] = datetime.datetime.now()
+    def _get_update_column_and_where_values(self, update_data: dict, where_values: list, update_time: bool,
+                                            table_name: str, skip_unchanged: bool = False):
         update_values = self._adapt_dict_value(update_data, table_name)
-        where_values = self._adapt_dict_value(where, table_name)
-        result_values = update_values + where_values
+        guard_values = []
+        if skip_unchanged:
+            guard_values = [update_values[index] for index in self._get_unchanged_guard_indexes(update_data)]
+        if update_time and 'update_time' not in update_data.keys():
+            update_values.append(datetime.datetime.now())
+        result_values = update_values + where_values + guard_values
         return result_values
 
     @staticmethod
@@ -1155,7 +3730,7 @@ class DictToDb(object):
                     elif '#' in column:
                         column_name = column.split('#')[0]
                     try:
-                        column_type = self._tables[table_name][column_name]
+                        column_type = self._tables[table_name][column_name]['type']
                     except KeyError:  # 这里表明有表里不存在的字段
                         column_type = self._get_column_info_by_key_value(column, value)['column_type']
                 if column_type == "json_text":  # 这里会将字典里面的tuple值转为list
@@ -1164,8 +3739,43 @@ class DictToDb(object):
                     result_data.append(str(value))
                 elif column_type == "obj":
                     result_data.append(pickle.dumps(value))
+                else:  # blob等用户通过@指定类型的字段，由sqlite3直接转换
+                    result_data.append(value)
         return result_data
 
+    @staticmethod
+    def _to_python_values(values) -> list:
+        """将list，tuple，array.array，numpy数组等序列整体转为Python原生类型的list"""
+        if hasattr(values, 'tolist'):
+            return values.tolist()
+        return list(values)
+
+    @staticmethod
+    def _adapt_column_values(values: list, column_type: str) -> list:
+        """将一列的值按字段类型转为SQLite存储的值，与_adapt_dict_value的转换规则一致"""
+        if column_type == "json_text":
+            adapt_func = partial(json.dumps, ensure_ascii=False)
+        elif column_type in ['tuple_text', 'set_text']:
+            adapt_func = str
+        elif column_type == "obj":
+            adapt_func = pickle.dumps
+        else:
+            return values
+        return [value if value is None or isinstance(
+            value, (str, int, float, bool, datetime.date, datetime.datetime)) else adapt_func(value)
+                for value in values]
+
+    def _adapt_dict_values_with_hash(self, data_list: Iterable[dict], table_name: str):
+        """
+        采用生成器方式，将data_list里面的每一项转为与SQLite交流的值，并在最后加上内容的hash值
+        """
+        for data in data_list:
+            values = self._adapt_dict_value(data, table_name)
+            hash_values = map(canonical_hash_value, data.values(), values)
+            content = repr(sorted(zip(map(get_column_name_by_key, data), map(repr, hash_values))))
+            values.append(hashlib.blake2b(content.encode('utf8'), digest_size=16).hexdigest())
+            yield values
+
     def _adapt_dict_values(self, data_list: Iterable[dict], table_name: str):
         """
         采用生成器方式，将data_list里面的每一项转为与SQLite交流的值
@@ -0,0 +1,136 @@
+import threading
+from typing import List, Union, Iterable, Generator, Tuple
+
+from dict_to_db._sqlite import DictToDb
+
+
+class QueuedWriter(object):
+    def __init__(self, db: DictToDb, batch_size: int = 1000, flush_interval: float = None, max_retries: int = 10,
+                 base_delay: float = 0.01, max_delay: float = 1.0):
+        """
+        写入队列，insert/update/delete 等写操作先保存在本地队列中，达到batch_size条或每隔flush_interval秒时，
+        在一个 BEGIN IMMEDIATE 写事务(DictToDb.write_batch)中一次性写入，多进程写入同一个数据库文件时，
+        每个进程只需短暂持有写锁，遇到SQLITE_BUSY时按带随机抖动的指数退避时间重试
+        :param db: DictToDb实例，每个进程使用自己的DictToDb实例
+        :param batch_size: 队列中的数据条数达到该值时自动写入
+        :param flush_interval: 后台线程定时写入的间隔(秒)，默认为None 不启动后台线程，
+        设置时db需要使用 check_same_thread=False 创建
+        :param max_retries: 遇到SQLITE_BUSY时最多重试次数
+        :param base_delay: 第一次重试前等待的时间(秒)，之后每次翻倍
+        :param max_delay: 每次重试前最多等待的时间(秒)
+        """
+        if flush_interval and db._check_same_thread:
+            raise Exception("设置flush_interval时，DictToDb需要使用check_same_thread=False创建")
+        self.db = db
+        self._batch_size = batch_size
+        self._retry_kwargs = {"max_retries": max_retries, "base_delay": base_delay, "max_delay": max_delay}
+        self._queue = []
+        self._queue_row_count = 0
+        self._queue_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flush_thread = None
+        self.flush_count = 0
+        self.flush_row_count = 0
+        if flush_interval:
+            self._flush_thread = threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True)
+            self._flush_thread.start()
+
+    def insert(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
+               **kwargs):
+        """将数据加入写入队列，写入时调用 DictToDb.insert，参数同 DictToDb.insert"""
+        self._put("insert", data, table_name=table_name, **kwargs)
+
+    def insert_or_replace(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
+                          **kwargs):
+        """将数据加入写入队列，写入时调用 DictToDb.insert_or_replace，参数同 DictToDb.insert_or_replace"""
+        self._put("insert_or_replace", data, table_name=table_name, **kwargs)
+
+    def insert_or_update(self, data: Union[dict, Iterable[dict], Generator[dict, None, None]], table_name: str = None,
+                         **kwargs):
+        """将数据加入写入队列，写入时调用 DictToDb.insert_or_update，参数同 DictToDb.insert_or_update"""
+        self._put("insert_or_update", data, table_name=table_name, **kwargs)
+
+    def update(self, update: Union[dict, List[dict], Tuple[dict]], where: Union[dict, List[dict], Tuple[dict]],
+               table_name: str, **kwargs):
+        """将更新加入写入队列，写入时调用 DictToDb.update，参数同 DictToDb.update"""
+        self._put("update", update, where, table_name=table_name, **kwargs)
+
+    def delete(self, where: Union[dict, List[dict], Tuple[dict]], table_name: str, **kwargs):
+        """将删除加入写入队列，写入时调用 DictToDb.delete，参数同 DictToDb.delete"""
+        self._put("delete", where, table_name=table_name, **kwargs)
+
+    def flush(self) -> int:
+        """
+        将队列中的所有写操作在一个写事务中写入数据库
+        :return: 本次写入的数据条数
+        """
+        with self._flush_lock:
+            with self._queue_lock:
+                queue, row_count = self._queue, self._queue_row_count
+                self._queue, self._queue_row_count = [], 0
+            if not queue:
+                return 0
+            try:
+                self.db.write_batch(self._execute_queue, queue, **self._retry_kwargs)
+            except BaseException:  # 写入失败时将数据放回队列头部，下次flush时重新写入
+                with self._queue_lock:
+                    self._queue[:0] = queue
+                    self._queue_row_count += row_count
+                raise
+            self.flush_count += 1
+            self.flush_row_count += row_count
+            return row_count
+
+    def get_info(self) -> dict:
+        """
+        获取写入队列和写锁竞争的统计信息
+        :return: queue_size(队列中的数据条数)，flush_count(写入次数)，flush_row_count(已写入的数据条数)，
+        以及 DictToDb.get_write_contention_info 的所有统计
+        """
+        info = {"queue_size": self._queue_row_count, "flush_count": self.flush_count,
+                "flush_row_count": self.flush_row_count}
+        info.update(self.db.get_write_contention_info())
+        return info
+
+    def close(self):
+        """停止后台线程并写入队列中剩余的数据，不会关闭DictToDb的数据库连接"""
+        self._stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _put(self, execute_func: str, data, *args, **kwargs):
+        """将写操作加入队列，生成器会先转为list，以便写入失败重试时可以重复执行"""
+        if isinstance(data, dict):
+            row_count = 1
+        else:
+            data = list(data)
+            row_count = len(data)
+        kwargs['commit'] = False
+        with self._queue_lock:
+            self._queue.append((execute_func, (data,) + args, kwargs))
+            self._queue_row_count += row_count
+            full = self._queue_row_count >= self._batch_size
+        if full:
+            self.flush()
+
+    def _execute_queue(self, queue: list):
+        for execute_func, args, kwargs in queue:
+            getattr(self.db, execute_func)(*args, **kwargs)
+
+    def _flush_loop(self, flush_interval: float):
+        while not self._stop.wait(flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.db.log.error(f"写入队列数据失败：{e}")
+
+
+__all__ = ['QueuedWriter']
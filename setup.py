@@ -26,4 +26,7 @@ setuptools.setup(
     install_requires=[
         'openpyxl',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
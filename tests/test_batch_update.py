@@ -0,0 +1,48 @@
+from dict_to_db import DictToDb
+
+
+def new_db(count=10):
+    db = DictToDb(update_time=False)
+    db.insert([{"id#pk": i, "a": 0, "b": ""} for i in range(count)], table_name="t")
+    return db
+
+
+def test_update_list_returns_total_count_with_one_executemany_per_shape():
+    db = new_db()
+    updates = [{"a": i} for i in range(5)] + [{"b": "x"}, {"b": "y"}]
+    wheres = [{"id": i} for i in range(5)] + [{"id": 5}, {"id": 100}]
+    executemany_sqls = []
+    executemany = db.executemany
+    db.executemany = lambda sql, values: executemany_sqls.append(sql) or executemany(sql, values)
+    assert db.update(updates, wheres, table_name="t") == 6
+    assert len(executemany_sqls) == 2
+    assert [row["a"] for row in db.select("t", order_by="id")][:5] == [0, 1, 2, 3, 4]
+    assert db.select("t", where={"id": 5})[0]["b"] == "x"
+
+
+def test_update_list_length_mismatch_raises():
+    db = new_db()
+    try:
+        db.update([{"a": 1}], [{"id": 1}, {"id": 2}], table_name="t")
+        assert False
+    except Exception as e:
+        assert "不匹配" in str(e)
+
+
+def test_delete_list_of_single_key_conditions_uses_in_chunks():
+    db = new_db(3000)
+    db._max_variable_number = 999
+    statements = []
+    db.db.set_trace_callback(statements.append)
+    db.delete([{"id": i} for i in range(2500)], table_name="t")
+    db.db.set_trace_callback(None)
+    assert len([sql for sql in statements if sql.startswith("delete")]) == 3
+    assert db.select("t", ["count(*) as n"]) == [{"n": 500}]
+
+
+def test_delete_list_of_mixed_conditions():
+    db = new_db()
+    db.delete([{"id": 1}, {"id>=": 8}, {"id": 3, "a": 0}, {"id": 4, "a": 1}], table_name="t")
+    assert [row["id"] for row in db.select("t", order_by="id")] == [0, 2, 4, 5, 6, 7]
+    db.delete([], table_name="t")
+    assert len(db.select("t")) == 6
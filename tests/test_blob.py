@@ -0,0 +1,43 @@
+import io
+import sys
+
+import numpy
+import pytest
+
+from dict_to_db import DictToDb
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 11), reason="增量BLOB读写需要Python3.11")
+
+
+def new_db():
+    db = DictToDb(insert_time=False, update_time=False)
+    db.insert({"id#pk": 1, "content@blob": b"", "payload@obj": None}, table_name="t")
+    return db
+
+
+def test_write_and_read_blob_in_chunks():
+    db = new_db()
+    data = bytes(range(256)) * 100
+    db.write_blob("t", "content", {"id": 1}, data, chunk_size=1000)
+    assert b"".join(db.read_blob("t", "content", 1, chunk_size=4096)) == data
+    db.write_blob("t", "content", 1, io.BytesIO(b"abc"))
+    assert list(db.read_blob("t", "content", 1)) == [b"abc"]
+    with db.open_blob("t", "content", 1) as blob:
+        assert blob.read(2) == b"ab"
+
+
+def test_write_obj_is_readable_by_select_and_read_obj():
+    db = new_db()
+    obj = {"array": numpy.arange(100000, dtype="int64"), "buffer": bytearray(b"x" * 1000), "name": "snap"}
+    db.write_obj("t", "payload", {"id": 1}, obj, chunk_size=65536)
+    selected = db.select("t", where={"id": 1})[0]["payload"]
+    loaded = db.read_obj("t", "payload", 1)
+    for value in (selected, loaded):
+        assert value["name"] == "snap" and bytes(value["buffer"]) == b"x" * 1000
+        assert numpy.array_equal(value["array"], obj["array"])
+
+
+def test_blob_row_not_found():
+    db = new_db()
+    with pytest.raises(Exception):
+        list(db.read_blob("t", "content", {"id": 2}))
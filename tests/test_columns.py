@@ -0,0 +1,43 @@
+import math
+import array
+
+from dict_to_db import DictToDb
+import dict_to_db._sqlite as sqlite_module
+
+
+def test_select_columns_returns_numeric_arrays():
+    db = DictToDb()
+    db.insert([{"id": i, "score": i / 2, "name": f"n{i}"} for i in range(5)], table_name="t")
+    columns = db.select_columns("t", ["id", "score", "name"], chunk_size=2)
+    assert columns["id"].dtype == "int64" and columns["id"].tolist() == [0, 1, 2, 3, 4]
+    assert columns["score"].tolist() == [0, 0.5, 1, 1.5, 2]
+    assert columns["name"] == ["n0", "n1", "n2", "n3", "n4"]
+
+
+def test_select_columns_keeps_arrays_with_nulls():
+    db = DictToDb()
+    db.insert([{"id": 1, "score": 1.5}, {"id": 2, "score": 2.5}, {"id": None, "score": None},
+               {"id": 4, "score": 4.5}], table_name="t")
+    columns = db.select_columns("t", ["id", "score"], chunk_size=2)
+    assert columns["score"].dtype == "float64" and math.isnan(columns["score"][2])
+    assert columns["score"][3] == 4.5
+    assert columns["id"].dtype == "int64"
+    assert columns["id"].mask.tolist() == [False, False, True, False]
+    assert columns["id"].tolist() == [1, 2, None, 4]
+
+
+def test_select_columns_nulls_without_numpy(monkeypatch):
+    monkeypatch.setattr(sqlite_module, "import_numpy", lambda: None)
+    db = DictToDb()
+    db.insert([{"id": 1, "score": 1.5}, {"id": None, "score": None}], table_name="t")
+    columns = db.select_columns("t", ["id", "score"])
+    assert isinstance(columns["id"], array.array) and columns["id"].typecode == "d"
+    assert columns["id"][0] == 1 and math.isnan(columns["id"][1])
+    assert math.isnan(columns["score"][1])
+
+
+def test_execute_columns_falls_back_to_list_for_mixed_types():
+    db = DictToDb()
+    db.execute("create table t (v integer);")
+    db.executemany("insert into t values(?);", [(1,), (None,), ("x",)])
+    assert db.execute_columns("select v from t;", column_types={"v": "integer"}, chunk_size=2)["v"] == [1, None, "x"]
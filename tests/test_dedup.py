@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+
+from dict_to_db import DictToDb
+
+
+def test_dedup_creates_hash_index_once():
+    db = DictToDb()
+    rows = [{"a": i % 3, "b": "x"} for i in range(9)]
+    assert db.insert_dedup(rows, table_name="t", chunk_size=4) == {"insert_count": 3, "skip_count": 6, "conflict_count": 0}
+    statements = []
+    db.db.set_trace_callback(statements.append)
+    assert db.insert_dedup([{"a": 0, "b": "x"}, {"a": 3, "b": "x"}], table_name="t") == \
+           {"insert_count": 1, "skip_count": 1, "conflict_count": 0}
+    db.db.set_trace_callback(None)
+    assert not any("create unique index" in sql for sql in statements)
+    assert len(db.select("t")) == 4
+
+
+def test_dedup_reports_primary_key_conflicts_separately():
+    db = DictToDb()
+    assert db.insert_dedup({"id#pk": 1, "v": "a"}, table_name="t")["insert_count"] == 1
+    result = db.insert_dedup([{"id": 1, "v": "a"}, {"id": 1, "v": "b"}, {"id": 2, "v": "c"}], table_name="t")
+    assert result == {"insert_count": 1, "skip_count": 1, "conflict_count": 1}
+    assert [row["v"] for row in db.select("t")] == ["a", "c"]
+
+
+def test_dedup_hash_ignores_dict_order():
+    db = DictToDb()
+    db.insert_dedup({"d": {"x": 1, "y": 2}}, table_name="t")
+    result = db.insert_dedup({"d": {"y": 2, "x": 1}}, table_name="t")
+    assert result == {"insert_count": 0, "skip_count": 1, "conflict_count": 0}
+
+
+def test_dedup_hash_of_set_is_stable_across_processes():
+    code = "from dict_to_db import DictToDb; db = DictToDb(); " \
+           "db.insert_dedup({'s': {'a%d' % i for i in range(20)}}, table_name='t'); " \
+           "print(db.select('t')[0]['_content_hash'])"
+    hashes = {subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONHASHSEED=str(seed)),
+                             capture_output=True, text=True, check=True).stdout for seed in range(3)}
+    assert len(hashes) == 1
@@ -0,0 +1,73 @@
+from openpyxl import Workbook, load_workbook
+
+from dict_to_db import DictToDb
+
+
+def make_excel(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "users"
+    ws.append(["id", "name", "age"])
+    for i in range(1, 6):
+        ws.append([i, f"n{i}", 20 + i])
+    orders = wb.create_sheet("orders")
+    orders.append(["order_id", "amount"])
+    orders.append(["a1", 10])
+    orders.append(["a2", 20])
+    wb.save(path)
+    return path
+
+
+def test_patch_session_changes_many_sheets_and_saves_once(tmp_path, monkeypatch):
+    path = make_excel(str(tmp_path / "a.xlsx"))
+    db = DictToDb()
+    saves = []
+    save = Workbook.save
+    monkeypatch.setattr(Workbook, "save", lambda self, filename: saves.append(filename) or save(self, filename))
+    with db.excel_patch_session(path) as session:
+        assert session.change([{"id": 3, "age": 99}, {"id": 5, "name": "x", "C": 1}], "users", key_column="id") == 3
+        assert session.change({"excel_row_index": 3, "amount": 25}, "orders") == 1
+        assert session.change({"order_id": "a1", "B": 11}, "orders", key_column="order_id") == 1
+    assert saves == [path]
+    wb = load_workbook(path)
+    assert [cell.value for cell in wb["users"][4]] == [3, "n3", 99]
+    assert [cell.value for cell in wb["users"][6]] == [5, "x", 1]
+    assert [cell.value for cell in wb["orders"]["B"]] == ["amount", 11, 25]
+
+
+def test_patch_session_missing_key_does_not_save(tmp_path):
+    path = make_excel(str(tmp_path / "a.xlsx"))
+    db = DictToDb()
+    try:
+        with db.excel_patch_session(path) as session:
+            session.change({"id": 1, "age": 0}, "users", key_column="id")
+            session.change({"id": 100, "age": 0}, "users", key_column="id")
+        assert False
+    except Exception as e:
+        assert "100" in str(e)
+    assert load_workbook(path)["users"]["C2"].value == 21
+
+
+def test_change_excel_data_by_row_index(tmp_path):
+    path = make_excel(str(tmp_path / "a.xlsx"))
+    DictToDb().change_excel_data(path, [{"excel_row_index": 2, "name": "changed"}], "users")
+    assert load_workbook(path)["users"]["B2"].value == "changed"
+
+
+def test_excel_to_dict_list_projection_and_row_range(tmp_path):
+    path = make_excel(str(tmp_path / "a.xlsx"))
+    db = DictToDb()
+    rows = list(db.excel_to_dict_list(path, columns=["name", "C"], export_sheet=["users"]))
+    assert rows[0] == {"name": "n1", "age": "21", "from_sheet": "users", "excel_row_index": 2}
+    rows = list(db.excel_to_dict_list(path, row_range=(3, 4), export_sheet=["users"], transform_string=False))
+    assert [(row["excel_row_index"], row["id"]) for row in rows] == [(3, 2), (4, 3)]
+    # 一列都不存在的sheet不返回数据
+    assert [row["from_sheet"] for row in db.excel_to_dict_list(path, columns=["amount"])] == ["orders", "orders"]
+
+
+def test_excel_to_dict_list_limit_and_predicate(tmp_path):
+    path = make_excel(str(tmp_path / "a.xlsx"))
+    db = DictToDb()
+    assert [row["id"] for row in db.excel_to_dict_list(path, limit=3)] == ["1", "2", "3"]
+    rows = list(db.excel_to_dict_list(path, predicate=lambda row: row.get("age") == "24" or "amount" in row, limit=2))
+    assert [row.get("id", row.get("order_id")) for row in rows] == ["4", "a1"]
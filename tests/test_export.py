@@ -0,0 +1,25 @@
+import csv
+import gzip
+import json
+
+from dict_to_db import DictToDb
+
+
+def test_empty_result_writes_header_only_csv_and_empty_jsonl(tmp_path):
+    db = DictToDb()
+    db.insert({"id": 1, "name": "a"}, table_name="t")
+    csv_path, jsonl_path = tmp_path / "t.csv", tmp_path / "t.jsonl"
+    assert db.select_to_csv("select id, name from t where id=?", str(csv_path), [2]) == 0
+    assert db.select_to_jsonl("select id, name from t where id=?", str(jsonl_path), [2]) == 0
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        assert list(csv.reader(f)) == [["id", "name"]]
+    assert jsonl_path.read_text(encoding="utf-8") == ""
+
+
+def test_export_rows_from_other_thread_connection(tmp_path):
+    db = DictToDb(check_same_thread=False)
+    db.insert([{"id": i, "tags": [i]} for i in range(3)], table_name="t")
+    path = tmp_path / "t.jsonl.gz"
+    assert db.select_to_jsonl("select * from t", str(path), chunk_size=2, not_save_column=["insert_time"]) == 3
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["tags"] for line in f] == [[0], [1], [2]]
@@ -0,0 +1,44 @@
+from dict_to_db import DictToDb
+
+
+def new_db():
+    db = DictToDb()
+    db.insert([{"id#pk": 1, "age": 18, "name": "张三"}, {"id": 2, "age": 25, "name": "李四"},
+               {"id": 3, "age": 30, "name": "张五"}, {"id": 4, "age": None, "name": "王六"}], table_name="t")
+    return db
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_operators_in_keys_and_values():
+    db = new_db()
+    assert ids(db.select("t", where={"age>": 18, "name like": "张%"})) == [3]
+    assert ids(db.select("t", where={"age": ("between", 18, 25)})) == [1, 2]
+    assert ids(db.select("t", where={"id in": [1, 3], "age>=": 18})) == [1, 3]
+    assert ids(db.select("t", where={"id not in": []})) == [1, 2, 3, 4]
+    assert db.select("t", where={"id in": []}) == []
+    assert ids(db.select("t", where={"age is null": False})) == [1, 2, 3]
+    assert db.select("t", ["count(*) as n", "sum(age)"], where={"age<": 30}) == [{"n": 2, "sum(age)": 43}]
+    assert ids(db.select("t", order_by="-age", limit=2, where={"age is not null": True})) == [3, 2]
+
+
+def test_none_value_matches_nothing_unless_explicit():
+    db = new_db()
+    assert db.select("t", where={"age": None}) == []
+    db.delete({"age": None}, table_name="t")
+    assert len(db.select("t")) == 4
+    assert ids(db.select("t", where={"age": ("is", None)})) == [4]
+    assert ids(db.select("t", where={"age is not": None})) == [1, 2, 3]
+    db.update({"age": 40}, {"age is": None}, table_name="t")
+    db.delete({"age is null": True}, table_name="t")
+    assert db.select("t", where={"id": 4})[0]["age"] == 40
+
+
+def test_same_filter_shape_compiles_once():
+    db = new_db()
+    where_sql, values = db._compile_filter("t", {"age>": 18, "id in": [1, 2]})
+    assert where_sql == "[age]>? and [id] in (?,?)" and values == [18, 1, 2]
+    cached_sql, values = db._compile_filter("t", {"age>": 20, "id in": [3, 4]})
+    assert cached_sql is where_sql and values == [20, 3, 4]
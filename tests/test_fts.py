@@ -0,0 +1,15 @@
+from dict_to_db import DictToDb
+
+
+def test_fts_virtual_and_shadow_tables_are_not_data_tables(tmp_path):
+    path = str(tmp_path / "fts.db")
+    db = DictToDb(path)
+    db.insert({"title#fts": "python sqlite", "n": 1}, table_name="doc")
+    db.close()
+
+    db = DictToDb(path)
+    assert set(db._tables) == {"doc"}
+    assert [row["n"] for row in db.search("doc", "sqlite")] == [1]
+    # 和FTS5影子表结构相同的dict不能匹配到影子表
+    db.insert({"k": "x", "v": 1})
+    assert "t1" in db._tables
@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+
+from dict_to_db import DictToDb
+
+
+def new_db():
+    db = DictToDb(insert_time=False, update_time=False)
+    db.insert([{"k": i % 3, "v": i} for i in range(9)], table_name="t")
+    return db
+
+
+def test_memoized_function_caches_repeated_arguments():
+    db = new_db()
+    calls = []
+    db.create_function("double", 1, lambda x: calls.append(x) or x * 2, deterministic=True, memoize=2)
+    assert [row["d"] for row in db.execute("select double(k) as d from t order by v;").fetchall()] == \
+           [0, 2, 4] * 3
+    info = db.get_function_cache_info("double")
+    assert info["max_size"] == 2 and info["hits"] + info["misses"] == 9 and len(calls) == info["misses"]
+    assert db.get_function_cache_info() == {"double": info}
+    with pytest.raises(Exception):
+        db.create_function("f", 1, abs, memoize=10)
+
+
+class Total(object):
+    def __init__(self):
+        self.total = 0
+
+    def step(self, value):
+        self.total += value
+
+    def value(self):
+        return self.total
+
+    def inverse(self, value):
+        self.total -= value
+
+    def finalize(self):
+        return self.total
+
+
+def test_create_aggregate():
+    db = new_db()
+    db.create_aggregate("total", 1, Total)
+    rows = db.execute("select k, total(v) as s from t group by k order by k;").fetchall()
+    assert rows == [{"k": 0, "s": 9}, {"k": 1, "s": 12}, {"k": 2, "s": 15}]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="create_window_function 需要Python 3.11")
+def test_create_window_function():
+    db = new_db()
+    db.create_window_function("total", 1, Total)
+    rows = db.execute("select total(v) over (order by v rows between 1 preceding and current row) as s "
+                      "from t order by v limit 4;").fetchall()
+    assert [row["s"] for row in rows] == [0, 1, 3, 5]
@@ -0,0 +1,34 @@
+from dict_to_db import DictToDb
+
+
+def new_db():
+    db = DictToDb(insert_time=False, update_time=False)
+    db.insert([{"id": i, "group": i % 3, "name": f"n{i}"} for i in range(2000)], table_name="t")
+    return db
+
+
+def test_get_many_by_single_key_in_chunks():
+    db = new_db()
+    db._max_variable_number = 500
+    statements = []
+    db.db.set_trace_callback(statements.append)
+    result = db.get_many("t", "id", list(range(1200)) + [5, 99999])
+    db.db.set_trace_callback(None)
+    assert len(result) == 1200 and 99999 not in result
+    assert result[7] == {"id": 7, "group": 1, "name": "n7"}
+    assert len([sql for sql in statements if sql.startswith("select")]) == 3
+
+
+def test_get_many_select_all_and_projection():
+    db = new_db()
+    result = db.get_many("t", "group", [0, 1], select=["name"], select_all=True)
+    assert len(result[0]) == 667 and len(result[1]) == 667
+    assert result[1][0] == {"name": "n1", "group": 1}
+    assert db.get_many("t", "id", []) == {}
+
+
+def test_get_many_by_composite_key():
+    db = new_db()
+    result = db.get_many("t", ["group", "id"], [(1, 1), (2, 5), (0, 1)], select=["name"])
+    assert result == {(1, 1): {"name": "n1", "group": 1, "id": 1}, (2, 5): {"name": "n5", "group": 2, "id": 5}}
+    assert db.execute("select name from sqlite_temp_master where type='table';").fetchall() == []
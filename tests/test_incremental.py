@@ -0,0 +1,52 @@
+from dict_to_db import DictToDb
+
+
+def test_update_then_insert_in_same_second_is_not_lost():
+    db = DictToDb()
+    db.insert([{"id#pk": i, "v": i} for i in range(3)], table_name="t")
+    db.enable_incremental("t")
+    assert [row["id"] for row in db.select_incremental("t", "c")] == [0, 1, 2]
+    # update_time 带微秒，insert_time 只到秒，同一秒内先更新再新增的数据不能被水位跳过
+    db.update({"v": 10}, {"id": 1}, table_name="t")
+    assert [row["id"] for row in db.select_incremental("t", "c")] == [1]
+    db.insert({"id": 3, "v": 3}, table_name="t")
+    assert [row["id"] for row in db.select_incremental("t", "c")] == [3]
+    assert db.select_incremental("t", "c") == []
+
+
+def test_insert_time_watermark_ignores_primary_key_order():
+    db = DictToDb()
+    db.insert([{"id#pk": 10, "v": 1}], table_name="t")
+    db.enable_incremental("t")
+    assert [row["id"] for row in db.select_incremental("t", "c", "insert_time")] == [10]
+    db.insert({"id": 5, "v": 2}, table_name="t")
+    db.update({"v": 3}, {"id": 10}, table_name="t")
+    assert [row["id"] for row in db.select_incremental("t", "c", "insert_time")] == [5]
+
+
+def test_limit_pages_through_all_rows():
+    db = DictToDb()
+    db.insert([{"id#pk": i} for i in range(7)], table_name="t")
+    db.enable_incremental("t")
+    pages = [[row["id"] for row in db.select_incremental("t", "c", limit=3)] for _ in range(4)]
+    assert pages == [[0, 1, 2], [3, 4, 5], [6], []]
+    db.insert({"id": 7}, table_name="t")
+    assert [row["id"] for row in db.select_incremental("t", "c")] == [7]
+
+
+def test_select_incremental_never_changes_source_table():
+    db = DictToDb()
+    db.insert([{"id#pk": i, "v": i} for i in range(3)], table_name="t")
+    columns = list(db.select("t")[0].keys())
+    try:
+        db.select_incremental("t", "c")
+        assert False
+    except Exception as e:
+        assert "enable_incremental" in str(e)
+    db.enable_incremental("t")
+    db.enable_incremental("t")
+    assert len(db.select_incremental("t", "c")) == 3
+    db.update({"v": 10}, {"id": 1}, table_name="t")
+    db.delete({"id": 2}, table_name="t")
+    assert [row["id"] for row in db.select_incremental("t", "c")] == [1]
+    assert list(db.select("t")[0].keys()) == columns
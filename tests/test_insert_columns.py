@@ -0,0 +1,30 @@
+import array
+
+import numpy
+
+from dict_to_db import DictToDb
+
+
+def test_insert_columns_from_numpy_lists_and_arrays():
+    db = DictToDb(insert_time=False, update_time=False)
+    count = db.insert_columns({"id#pk": numpy.arange(5), "score": numpy.linspace(0, 1, 5),
+                               "flag": array.array('b', [1, 0, 1, 0, 1]), "name": ("a", "b", "c", "d", "e"),
+                               "tags": [[i] for i in range(5)]}, table_name="t", chunk_size=2)
+    assert count == 5
+    assert db._tables["t"]["id"]["type"].lower() == "integer" and db._tables["t"]["score"]["type"] == "double"
+    rows = db.select("t", order_by="id")
+    assert rows[4] == {"id": 4, "score": 1.0, "flag": 1, "name": "e", "tags": [4]}
+    assert db.execute("select count(*) as n from t where id is not null;").fetchone() == {"n": 5}
+
+
+def test_insert_columns_key_syntax_and_edge_cases():
+    db = DictToDb(insert_time=False, update_time=False)
+    db.insert_columns({"code@text#编码": [1, 2]}, table_name="t")
+    assert db._tables["t"]["code"]["type"].startswith("text")
+    assert [row["code"] for row in db.select("t")] == ["1", "2"]
+    assert db.insert_columns({"code": []}, table_name="t") == 0
+    try:
+        db.insert_columns({"code": [1, 2], "other": [1]}, table_name="t")
+        assert False
+    except Exception as e:
+        assert "长度" in str(e)
@@ -0,0 +1,56 @@
+import datetime
+
+from dict_to_db import DictToDb
+
+
+def test_insert_partitioned_without_commit_can_be_rolled_back():
+    db = DictToDb()
+    day = datetime.datetime(2021, 1, 1, 12)
+    db.insert_partitioned({"v": 1, "insert_time": day}, table_name="log")
+    db.insert_partitioned({"v": 2, "insert_time": day + datetime.timedelta(days=1)}, table_name="log",
+                          commit=False)
+    assert db.db.in_transaction
+    assert len(db.execute("select * from log").fetchall()) == 2
+    db.rollback()
+    assert [row["v"] for row in db.execute("select v from log").fetchall()] == [1]
+    db.insert_partitioned({"v": 3, "insert_time": day + datetime.timedelta(days=1)}, table_name="log")
+    assert [row["v"] for row in db.execute("select v from log").fetchall()] == [1, 3]
+
+
+def test_drop_partitions_keeps_latest():
+    db = DictToDb()
+    start = datetime.datetime(2021, 1, 1)
+    db.insert_partitioned([{"v": i, "insert_time": start + datetime.timedelta(days=i)} for i in range(5)],
+                          table_name="log")
+    assert db.drop_partitions("log", keep=2) == ["log_p20210101", "log_p20210102", "log_p20210103"]
+    assert [row["v"] for row in db.execute("select v from log").fetchall()] == [3, 4]
+    assert db.drop_partitions("log", before=datetime.date(2021, 1, 1)) == []
+
+
+def test_partition_periods_and_view_fills_missing_columns():
+    db = DictToDb()
+    db.insert_partitioned([{"v": 1, "insert_time": datetime.datetime(2021, 1, 4)},
+                           {"v": 2, "insert_time": datetime.datetime(2021, 1, 10)},
+                           {"v": 3, "extra": "x", "insert_time": datetime.datetime(2021, 1, 11)}],
+                          table_name="log", period="week")
+    assert db.get_partitions("log") == ["log_p2021w01", "log_p2021w02"]
+    rows = db.execute("select v, extra from log order by v").fetchall()
+    assert rows == [{"v": 1, "extra": None}, {"v": 2, "extra": None}, {"v": 3, "extra": "x"}]
+    db.insert_partitioned({"v": 4, "insert_time": datetime.datetime(2021, 2, 1)}, table_name="m", period="month")
+    assert db.get_partitions("m") == ["m_p202102"]
+    try:
+        db.insert_partitioned({"v": 5}, table_name="log", period="year")
+        assert False
+    except Exception as e:
+        assert "year" in str(e)
+
+
+def test_drop_partitions_before_and_all():
+    db = DictToDb()
+    start = datetime.datetime(2021, 1, 1)
+    db.insert_partitioned([{"v": i, "insert_time": start + datetime.timedelta(days=i)} for i in range(3)],
+                          table_name="log")
+    assert db.drop_partitions("log", before=datetime.datetime(2021, 1, 2, 8)) == ["log_p20210101"]
+    assert db.drop_partitions("log", keep=0) == ["log_p20210102", "log_p20210103"]
+    assert db.get_partitions("log") == []
+    assert db.execute("select name from sqlite_master where name='log'").fetchall() == []
@@ -0,0 +1,43 @@
+import dataclasses
+from typing import Any, NamedTuple, Optional
+
+from dict_to_db import DictToDb
+
+
+class SlotsPoint:
+    __slots__ = ("name", "x", "tags")
+
+    def __init__(self, name, x, tags):
+        self.name = name
+        self.x = x
+        self.tags = tags
+
+
+@dataclasses.dataclass
+class Item:
+    id: int
+    payload: Any
+    note: Optional[str] = None
+
+
+class Pair(NamedTuple):
+    key: str
+    value: object
+
+
+def test_unannotated_slots_round_trip():
+    db = DictToDb()
+    db.insert([SlotsPoint("a", 1, ["x"]), SlotsPoint("b", 2.5, ["y", "z"])], table_name="p")
+    assert db._tables["p"]["name"]["type"].lower() == "text"
+    rows = db.select("p", record_type=SlotsPoint)
+    assert [(r.name, r.x, r.tags) for r in rows] == [("a", 1, ["x"]), ("b", 2.5, ["y", "z"])]
+
+
+def test_any_and_object_fields_round_trip():
+    db = DictToDb()
+    db.insert([Item(1, "text"), Item(2, {"a": (1, 2)}), Item(3, None, "n")], table_name="i")
+    assert [dataclasses.astuple(r) for r in db.select("i", record_type=Item)] == \
+           [(1, "text", None), (2, {"a": (1, 2)}, None), (3, None, "n")]
+    db.insert([Pair("a", 1), Pair("b", "s"), Pair("c", [1])], table_name="pair")
+    assert db._tables["pair"]["value"]["type"].lower() == "obj"
+    assert db.select("pair", record_type=Pair) == [Pair("a", 1), Pair("b", "s"), Pair("c", [1])]
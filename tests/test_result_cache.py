@@ -0,0 +1,64 @@
+from dict_to_db import DictToDb
+
+
+def test_cte_write_invalidates_cache():
+    db = DictToDb(result_cache_size=10)
+    db.insert([{"id#pk": 1}], table_name="t")
+    assert len(db.select("t")) == 1
+    db.execute("with v(id) as (select 2) insert into t(id) select id from v;")
+    assert len(db.select("t")) == 2
+
+
+def test_trigger_write_invalidates_cache():
+    db = DictToDb(result_cache_size=10)
+    db.insert({"id#pk": 1}, table_name="t")
+    db.insert({"count": 0}, table_name="stats")
+    db.execute("create trigger t_ai after insert on t begin update stats set count=count+1; end;")
+    assert db.select("stats")[0]["count"] == 0
+    db.insert({"id": 2}, table_name="t")
+    assert db.select("stats")[0]["count"] == 1
+
+
+def test_rollback_invalidates_cache():
+    db = DictToDb(result_cache_size=10)
+    db.insert([{"id#pk": i} for i in range(3)], table_name="t")
+    db.insert({"id": 3}, table_name="t", commit=False)
+    assert len(db.select("t")) == 4
+    db.db.rollback()
+    assert len(db.select("t")) == 3
+    db.insert({"id": 3}, table_name="t", commit=False)
+    assert len(db.select("t")) == 4
+    db.rollback()
+    assert len(db.select("t")) == 3
+
+
+def test_other_connection_write_invalidates_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    db = DictToDb(path, result_cache_size=10)
+    db.insert({"id#pk": 1}, table_name="t")
+    assert len(db.select("t")) == 1
+    other = DictToDb(path)
+    other.insert({"id": 2}, table_name="t")
+    assert len(db.select("t")) == 2
+
+
+def test_cache_hit_does_not_share_mutable_values():
+    db = DictToDb(result_cache_size=10)
+    db.insert({"id#pk": 1, "tags": [1, 2]}, table_name="t")
+    rows = db.select("t")
+    rows[0]["tags"].append(99)
+    assert db.select("t")[0]["tags"] == [1, 2]
+    db.select("t")[0]["tags"].append(99)
+    assert db.select("t")[0]["tags"] == [1, 2]
+
+
+def test_composite_get_many_keeps_other_cached_results():
+    db = DictToDb(result_cache_size=10)
+    db.insert([{"a": i, "b": i, "v": i} for i in range(5)], table_name="t")
+    db.insert({"x": 1}, table_name="o")
+    db.select("o")
+    assert set(db.get_many("t", ["a", "b"], [(1, 1), (2, 2)])) == {(1, 1), (2, 2)}
+    misses = db.get_result_cache_info()["misses"]
+    db.select("o")
+    assert db.get_result_cache_info()["misses"] == misses
+    assert db.get_result_cache_info()["size"] == 1
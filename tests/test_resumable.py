@@ -0,0 +1,37 @@
+import pytest
+
+from dict_to_db import DictToDb
+
+
+def rows(fail_at=None):
+    for i in range(25):
+        if i == fail_at:
+            raise RuntimeError("interrupted")
+        # 第二个chunk开始出现新字段，需要先alter表结构再写入
+        yield {"id#pk": i, "v": i} if i < 10 else {"id#pk": i, "v": i, "extra": str(i)}
+
+
+def test_failed_chunk_is_rolled_back_and_resumed(tmp_path):
+    path = str(tmp_path / "resume.db")
+    db = DictToDb(path)
+    with pytest.raises(RuntimeError):
+        db.insert_resumable(rows(fail_at=15), table_name="t", job_name="job", chunk_size=10)
+    assert db.get_checkpoint("job")["row_count"] == 10
+    db.close()
+
+    db = DictToDb(path)
+    assert db.execute("select count(*) as c from t").fetchone()["c"] == 10
+    result = db.insert_resumable(rows(), table_name="t", job_name="job", chunk_size=10)
+    assert result["row_count"] == 25 and result["insert_count"] == 15
+    assert [row["id"] for row in db.select("t", order_by="id")] == list(range(25))
+    assert db.get_checkpoint("job")["finished"]
+
+
+def test_failed_insert_rolls_back_pending_rows():
+    db = DictToDb()
+    db.insert_resumable([{"id#pk": 1}], table_name="t", job_name="job")
+    with pytest.raises(Exception):
+        # 第二条数据主键重复，第一条数据不能留在未提交的事务中
+        db.insert_resumable([{"id": 2}, {"id": 1}], table_name="t", job_name="job", resume=False)
+    assert not db.db.in_transaction
+    assert [row["id"] for row in db.select("t")] == [1]
@@ -0,0 +1,21 @@
+import pytest
+
+from dict_to_db import ShardedDictToDb
+
+
+def test_equal_shard_key_values_route_to_same_shard(tmp_path):
+    db = ShardedDictToDb([str(tmp_path / f"s{i}.db") for i in range(4)], shard_key="uid")
+    db.insert([{"uid": i, "v": i} for i in range(20)], table_name="t")
+    assert [row["v"] for row in db.select("t", where={"uid": 7.0})] == [7]
+    assert db.update({"v": 70}, {"uid": 7.0}, table_name="t") == 1
+    assert [row["v"] for row in db.select("t", where={"uid": 7})] == [70]
+
+
+def test_update_rejects_moving_row_to_other_shard(tmp_path):
+    db = ShardedDictToDb([str(tmp_path / f"s{i}.db") for i in range(4)], shard_key="uid")
+    db.insert([{"uid": i, "v": i} for i in range(20)], table_name="t")
+    other = next(i for i in range(20) if db._hash_shard_value(i) != db._hash_shard_value(1))
+    with pytest.raises(Exception):
+        db.update({"uid": other}, {"uid": 1}, table_name="t")
+    assert db.update({"uid": 1.0, "v": 10}, {"uid": 1}, table_name="t") == 1
+    assert [row["v"] for row in db.select("t", where={"uid": 1})] == [10]
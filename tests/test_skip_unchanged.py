@@ -0,0 +1,33 @@
+from dict_to_db import DictToDb
+
+
+def new_db(**kwargs):
+    db = DictToDb(update_time=True, **kwargs)
+    db.insert([{"id#pk": 1, "name": "a", "tags": [1]}, {"id": 2, "name": None, "tags": [2]}], table_name="t")
+    db.update({"name": "a"}, {"id": 1}, table_name="t")
+    return db
+
+
+def update_times(db):
+    return [row["update_time"] for row in db.select("t", order_by="id")]
+
+
+def test_update_skip_unchanged_returns_zero_and_keeps_update_time():
+    db = new_db()
+    before = update_times(db)
+    assert db.update({"name": "a", "tags": [1]}, {"id": 1}, table_name="t", skip_unchanged=True) == 0
+    assert db.update({"name": None}, {"id": 2}, table_name="t", skip_unchanged=True) == 0
+    assert update_times(db) == before
+    assert db.update([{"name": "a"}, {"name": "b"}], [{"id": 1}, {"id": 2}], table_name="t", skip_unchanged=True) == 1
+    times = update_times(db)
+    assert times[0] == before[0] and times[1] != before[1]
+    assert db.update({"name": "a"}, {"id": 1}, table_name="t") == 1
+
+
+def test_insert_or_update_skip_unchanged_from_global_setting():
+    db = new_db(skip_unchanged=True)
+    before = update_times(db)
+    assert db.insert_or_update([{"id": 1, "name": "a", "tags": [1]}, {"id": 3, "name": "c"}], table_name="t") == 1
+    assert update_times(db)[0] == before[0]
+    assert db.insert_or_update({"id": 1, "name": "z"}, table_name="t") == 1
+    assert db.select("t", where={"id": 1})[0]["name"] == "z"
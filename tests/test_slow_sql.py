@@ -0,0 +1,27 @@
+from dict_to_db import DictToDb
+
+
+def test_slow_sql_log_records_normalized_sql_and_query_plan():
+    db = DictToDb(slow_sql_threshold=0)
+    db.insert([{"id": i, "name": f"n{i}"} for i in range(10)], table_name="t")
+    db.get_slow_sql_log(clear=True)
+    db.execute("select * from t where name = 'n1' and id > 3;").fetchall()
+    db.execute("select * from t where id = ?;", [2]).fetchall()
+    log = db.get_slow_sql_log(clear=True)
+    assert [entry["sql"] for entry in log] == ["select * from t where name = ? and id > ?;",
+                                                "select * from t where id = ?;"]
+    assert [entry["param_count"] for entry in log] == [0, 1]
+    assert all(entry["duration"] >= 0 for entry in log)
+    assert "SCAN" in log[1]["query_plan"][0]
+    assert db.get_slow_sql_log() == []
+
+
+def test_slow_sql_log_is_bounded_and_off_by_default():
+    db = DictToDb(slow_sql_threshold=0, slow_sql_log_size=3, slow_sql_explain=False)
+    for i in range(5):
+        db.execute(f"select {i};").fetchall()
+    log = db.get_slow_sql_log()
+    assert len(log) == 3 and all(entry["query_plan"] is None for entry in log)
+    db = DictToDb()
+    db.execute("select 1;").fetchall()
+    assert db.get_slow_sql_log() == []
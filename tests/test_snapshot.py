@@ -0,0 +1,37 @@
+import threading
+
+from dict_to_db import DictToDb
+
+
+def test_snapshot_commits_open_write(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    db = DictToDb(snapshot=path)
+    db.insert({"a": 1}, table_name="t", commit=False)
+    assert db.snapshot(commit=False) is False
+    assert db.snapshot() is True
+    db.close()
+    assert [row["a"] for row in DictToDb(snapshot=path).select("t")] == [1]
+
+
+def test_snapshot_thread_skips_open_write_and_close_saves(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    db = DictToDb(snapshot=path, snapshot_interval=0.01)
+    db.insert({"a": 1}, table_name="t", commit=False)
+    threading.Event().wait(0.1)  # 后台线程遇到未提交的写入时不能卡住
+    db.insert({"a": 2}, table_name="t", commit=False)
+    db.close()
+    assert not db._snapshot_thread.is_alive()
+    assert [row["a"] for row in DictToDb(snapshot=path).select("t")] == [1, 2]
+
+
+def test_snapshot_skipped_inside_write_batch(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    db = DictToDb(snapshot=path)
+
+    def write():
+        db.insert({"a": 1}, table_name="t")
+        return db.snapshot()
+
+    assert db.write_batch(write) is False
+    assert db.snapshot() is True
+    db.close()
@@ -0,0 +1,20 @@
+from dict_to_db import DictToDb
+
+
+def test_insert_sql_is_cached_by_key_tuple():
+    db = DictToDb(cached_statements=10)
+    db.insert([{"a-b": 1, "c": 2}, {"a-b": 3, "c": 4}], table_name="t")
+    db.insert({"a": 1, "b-c": 2}, table_name="u")
+    info = db.get_sql_cache_info()
+    assert info["max_size"] == 10 and info["kinds"]["insert"]["size"] == 2
+
+
+def test_filter_shapes_do_not_evict_insert_sql():
+    db = DictToDb(cached_statements=10)
+    db.insert({"a": 1, "b": 2}, table_name="t")
+    insert_sql = db._get_insert_sql_by_dict({"a": 1, "b": 2}, "t")
+    for i in range(30):
+        assert len(db.select("t", where={"a in": list(range(1, i + 2))})) == 1
+    info = db.get_sql_cache_info()
+    assert info["kinds"]["filter"]["size"] == 10 and info["kinds"]["select"]["size"] == 10
+    assert db._get_insert_sql_by_dict({"a": 1, "b": 2}, "t") is insert_sql
@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+
+from dict_to_db import DictToDb
+
+
+def test_import_does_not_load_openpyxl():
+    code = "import sys, dict_to_db; print('openpyxl' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
+
+
+def test_table_info_loads_on_first_use(tmp_path):
+    path = os.path.join(tmp_path, "test.db")
+    db = DictToDb(path)
+    for i in range(5):
+        db.insert({"id": i, "name": "x"}, table_name=f"t{i}")
+    db.close()
+    statements = []
+    db = DictToDb(path)
+    assert set(db._tables.keys()) >= {f"t{i}" for i in range(5)}
+    assert dict.__len__(db._tables) == 0
+    db.db.set_trace_callback(statements.append)
+    assert db.select("t3", where={"id": 3})[0]["name"] == "x"
+    assert [sql for sql in statements if sql.startswith("PRAGMA table_info")] == ["PRAGMA table_info([t3]);"]
+    assert dict.__len__(db._tables) == 1
+    try:
+        db._tables["missing"]
+        assert False
+    except KeyError:
+        pass
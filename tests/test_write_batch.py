@@ -0,0 +1,70 @@
+import multiprocessing
+import time
+
+import pytest
+
+from dict_to_db import DictToDb, QueuedWriter
+
+
+def write_rows(path, worker, row_count):
+    db = DictToDb(path, timeout=0.01)
+    with QueuedWriter(db, batch_size=7, base_delay=0.001, max_retries=1000) as writer:
+        for i in range(row_count):
+            # 第二批开始出现新字段，各进程在写事务中自动alter
+            data = {"worker": worker, "i": i}
+            if i >= 7:
+                data["extra"] = i
+            writer.insert(data, table_name="t")
+    db.close()
+
+
+def test_processes_write_exact_count(tmp_path):
+    path = str(tmp_path / "batch.db")
+    processes = [multiprocessing.get_context("spawn").Process(target=write_rows, args=(path, worker, 50))
+                 for worker in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    db = DictToDb(path)
+    assert db.execute("select count(*) as c from t").fetchone()["c"] == 100
+    assert db.execute("select count(distinct worker || '-' || i) as c from t").fetchone()["c"] == 100
+
+
+def test_failed_batch_rolls_back_created_table():
+    db = DictToDb()
+
+    def write():
+        db.insert({"a": 1}, table_name="t")
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        db.write_batch(write)
+    assert "t" not in db._tables
+    db.write_batch(db.insert, {"a": 2}, table_name="t")
+    assert [row["a"] for row in db.select("t")] == [2]
+
+
+def test_write_batch_refuses_pending_transaction():
+    db = DictToDb()
+    db.insert({"a": 1}, table_name="t", commit=False)
+    with pytest.raises(Exception):
+        db.write_batch(db.insert, {"a": 2}, table_name="t")
+    db.rollback()
+    assert "t" not in db._tables or db.select("t") == []
+
+
+def test_write_batch_retries_without_connection_busy_timeout(tmp_path):
+    path = str(tmp_path / "busy.db")
+    db = DictToDb(path, timeout=5)
+    db.insert({"a": 1}, table_name="t")
+    other = DictToDb(path)
+    other.execute("begin immediate;")
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        db.write_batch(db.insert, {"a": 2}, table_name="t", max_retries=2, base_delay=0.01, max_delay=0.01)
+    assert time.perf_counter() - start < 1
+    assert db.get_write_contention_info()["retries"] == 2
+    assert db.db.execute("PRAGMA busy_timeout;").fetchone()["timeout"] == 5000
+    other.db.rollback()